@@ -0,0 +1,189 @@
+from datetime import date, datetime
+import numpy as np
+from report_engine import parse_amount, parse_payment_date
+
+# Sheet columns read by the analytics, by position in the header row
+STUDENT_ID, STUDENT_NAME, STUDENT_SUBJECT, STUDENT_TIMESTAMP = 0, 2, 4, 5
+ATTENDANCE_TIMESTAMP, ATTENDANCE_STUDENT_ID = 3, 4
+PAYMENT_STUDENT_ID, PAYMENT_DATE, PAYMENT_AMOUNT = 1, 2, 3
+
+def column(rows, index):
+    """Return one column of sheet rows as strings, '' where a row is too short."""
+    return [str(row[index]).strip() if len(row) > index else "" for row in rows]
+
+def encode(values):
+    """Categorical-encode a column.
+
+    Returns:
+        tuple: The distinct values in first-seen order and an int32 array
+        holding each value's position among them
+    """
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int32, count=len(values))
+    return list(index), codes
+
+def parse_day(text):
+    """Parse the ``YYYY-MM-DD`` start of a row timestamp, None if it has none."""
+    try:
+        return datetime.strptime(text[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+def decode_days(categories, parse):
+    """Parse each distinct date once into a datetime64[D] array, NaT where unparseable."""
+    return np.array([parse(value) for value in categories], dtype="datetime64[D]")
+
+class AnalyticsFrame:
+    """Columnar copy of the three worksheets for whole-history statistics.
+
+    Every column is categorical-encoded on load, so dates and amounts are
+    parsed once per distinct value instead of once per row, and student
+    IDs and subjects become small integers. Statistics are then computed
+    with NumPy group-bys (``bincount``, ``unique``, ``maximum.at``) over
+    the code arrays, without a Python loop per row.
+    """
+
+    def __init__(self, students, attendance, payments):
+        """Encode the rows of each worksheet.
+
+        Args:
+            students (list): Student rows in sheet column order
+            attendance (list): Attendance rows in sheet column order
+            payments (list): Payment rows in sheet column order
+        """
+        self.student_ids = column(students, STUDENT_ID)
+        self.student_names = column(students, STUDENT_NAME)
+        self.subjects, self.student_subject = encode(column(students, STUDENT_SUBJECT))
+        self.student_registered = np.array(
+            [parse_day(value) for value in column(students, STUDENT_TIMESTAMP)], dtype="datetime64[D]"
+        )
+        # Later rows win, as in the report
+        positions = {student_id: position for position, student_id in enumerate(self.student_ids) if student_id}
+
+        # Self check-ins have no student and stay out of the per-subject numbers
+        keys, key_codes = encode(column(attendance, ATTENDANCE_STUDENT_ID))
+        self.attendance_student = np.array([positions.get(key, -1) for key in keys], dtype=np.int32)[key_codes]
+        days, day_codes = encode([value[:10] for value in column(attendance, ATTENDANCE_TIMESTAMP)])
+        self.attendance_day = decode_days(days, parse_day)[day_codes]
+
+        ids, id_codes = encode(column(payments, PAYMENT_STUDENT_ID))
+        self.payment_student = np.array([positions.get(key, -1) for key in ids], dtype=np.int32)[id_codes]
+        dates, date_codes = encode(column(payments, PAYMENT_DATE))
+        self.payment_date = decode_days(dates, parse_payment_date)[date_codes]
+        amounts, amount_codes = encode(column(payments, PAYMENT_AMOUNT))
+        parsed = [parse_amount(value) for value in amounts]
+        self.payment_amount = np.array([value or 0 for value in parsed], dtype=np.int64)[amount_codes]
+        self.payment_valid = np.array([value is not None for value in parsed], dtype=bool)[amount_codes]
+
+    def monthly_attendance(self):
+        """Return the attendance rate of every subject in every month.
+
+        The rate is the marks recorded divided by the marks possible: the
+        students of the subject registered by the end of the month times the
+        days the subject had at least one mark.
+
+        Returns:
+            list: ``(month, subject, marks, lesson_days, students, rate)``
+            tuples ordered by month and subject; ``month`` is ``YYYY-MM``
+        """
+        student = self.attendance_student
+        valid = (student >= 0) & ~np.isnat(self.attendance_day)
+        if not valid.any():
+            return []
+        subject = self.student_subject[student[valid]].astype(np.int64)
+        day = self.attendance_day[valid]
+        months, month_index = np.unique(day.astype("datetime64[M]"), return_inverse=True)
+        width = len(self.subjects)
+        cells = len(months) * width
+
+        marks = np.bincount(month_index * width + subject, minlength=cells)
+
+        # Distinct (day, subject) pairs are the lessons held
+        lessons = np.unique(day.astype(np.int64) * width + subject)
+        lesson_subject = lessons % width
+        lesson_month = (lessons // width).astype("datetime64[D]").astype("datetime64[M]")
+        lesson_days = np.bincount(np.searchsorted(months, lesson_month) * width + lesson_subject, minlength=cells)
+
+        # Students count from their registration month; undated ones always count
+        registered = np.searchsorted(months, self.student_registered.astype("datetime64[M]"))
+        registered[np.isnat(self.student_registered)] = 0
+        joined = np.bincount(registered * width + self.student_subject, minlength=cells + width)
+        enrolled = joined.reshape(len(months) + 1, width)[:-1].cumsum(axis=0).ravel()
+
+        possible = enrolled * lesson_days
+        rate = np.divide(marks, possible, out=np.zeros(cells), where=possible > 0)
+        return sorted(
+            (str(months[cell // width]), self.subjects[cell % width], int(marks[cell]),
+             int(lesson_days[cell]), int(enrolled[cell]), float(rate[cell]))
+            for cell in np.flatnonzero(marks)
+        )
+
+    def monthly_revenue(self):
+        """Return the payments received in every month.
+
+        Payments are counted in the month of their Payment Date; rows with an
+        unparseable date or amount are left out.
+
+        Returns:
+            list: ``(month, payments, total)`` tuples, oldest month first
+        """
+        valid = ~np.isnat(self.payment_date) & self.payment_valid
+        if not valid.any():
+            return []
+        months, month_index = np.unique(self.payment_date[valid].astype("datetime64[M]"), return_inverse=True)
+        counts = np.bincount(month_index)
+        # Float sums are exact far beyond any real revenue
+        totals = np.bincount(month_index, weights=self.payment_amount[valid]).astype(np.int64)
+        return [(str(month), int(count), int(total)) for month, count, total in zip(months, counts, totals)]
+
+    def unpaid_students(self, days=30, today=None):
+        """Return the students without a payment dated in the last ``days`` days.
+
+        Students registered within that window are not due yet and are left
+        out. Payments with an unparseable date do not count.
+
+        Args:
+            days (int): Length of the window
+            today (date): End of the window, today by default
+
+        Returns:
+            list: Dicts with ``id``, ``name``, ``subject`` and ``last_payment``
+            (``YYYY-MM-DD`` or None), longest unpaid first
+        """
+        cutoff = np.datetime64(today or date.today(), "D") - np.timedelta64(days, "D")
+        # NaT is the smallest int64, so it is the identity of maximum
+        latest = np.full(len(self.student_ids), np.datetime64("NaT", "D")).view(np.int64)
+        valid = (self.payment_student >= 0) & ~np.isnat(self.payment_date)
+        np.maximum.at(latest, self.payment_student[valid], self.payment_date[valid].view(np.int64))
+        latest = latest.view("datetime64[D]")
+
+        due = np.isnat(latest) | (latest < cutoff)
+        due &= ~(self.student_registered > cutoff)
+        due &= np.array([bool(student_id) for student_id in self.student_ids], dtype=bool)
+        positions = np.flatnonzero(due)
+        positions = positions[np.argsort(latest[positions].view(np.int64), kind="stable")]
+        return [
+            {
+                'id': self.student_ids[position],
+                'name': self.student_names[position],
+                'subject': self.subjects[self.student_subject[position]],
+                'last_payment': None if np.isnat(latest[position]) else str(latest[position]),
+            }
+            for position in positions
+        ]
+
+def compute_statistics(students, attendance, payments):
+    """Monthly attendance rates per subject and revenue per month.
+
+    A module-level function so it can run in a worker process.
+
+    Returns:
+        dict: ``attendance`` from :meth:`AnalyticsFrame.monthly_attendance`
+        and ``revenue`` from :meth:`AnalyticsFrame.monthly_revenue`
+    """
+    frame = AnalyticsFrame(students, attendance, payments)
+    return {"attendance": frame.monthly_attendance(), "revenue": frame.monthly_revenue()}
+
+def find_unpaid_students(students, payments, days=30, today=None):
+    """Students without a payment in the last ``days`` days; see :meth:`AnalyticsFrame.unpaid_students`."""
+    return AnalyticsFrame(students, [], payments).unpaid_students(days, today)
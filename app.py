@@ -1,4 +1,7 @@
-from flask import Flask
+from flask import Flask, Response, abort, jsonify, request
+from config import PROFILER_ENABLED
+from metrics import profiler, render_metrics
+from storage import storage_warm_up
 
 app = Flask(__name__)
 
@@ -27,6 +30,7 @@ def index():
                             <ul>
                                 <li><code>/start</code> - botni boshlash va asosiy menyu</li>
                                 <li><code>/davomat</code> - o'quvchining darsga kelganini belgilash</li>
+                                <li><code>/guruh</code> - butun guruh davomatini bitta ro'yxatda belgilash</li>
                                 <li><code>/royxat</code> - yangi o'quvchi ma'lumotlarini kiritish</li>
                                 <li><code>/tolov</code> - to'lov ma'lumotlarini kiritish</li>
                                 <li><code>/hisobot</code> - o'quvchilar bo'yicha hisobot olish</li>
@@ -43,5 +47,25 @@ def index():
     </html>
     """
 
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once storage is warmed up, 503 before."""
+    status = storage_warm_up.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/metrics')
+def metrics():
+    """Expose the bot's metrics in Prometheus text format."""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/debug/profile')
+def profile():
+    """Sample every thread for ?seconds=N (default 10) and return folded stacks."""
+    if not PROFILER_ENABLED:
+        abort(404)
+    seconds = min(request.args.get('seconds', 10, type=float), 120)
+    return Response(profiler.run(seconds), content_type='text/plain; charset=utf-8')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
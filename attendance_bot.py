@@ -1,34 +1,97 @@
 import logging
 import os
 from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import (
+    Update,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
+    InlineQueryHandler,
     MessageHandler,
     ConversationHandler,
     filters,
     ContextTypes,
 )
-from sheets_manager import GoogleSheetsManager
-from config import TELEGRAM_TOKEN
+from storage import get_storage, DuplicateSubmissionError, StorageUnavailableError
+from report_engine import format_amount
+from report_export import export_report_file
+from report_scheduler import SUBSCRIBERS_KEY, get_snapshot, report_scheduler
+from tenants import tenant_router
+from update_processor import ChatOrderedUpdateProcessor
+from persistence import SQLitePersistence
+from metrics import monitor_event_loop, register_application, timed_handler
+from workers import run_cpu_bound
+from config import ADMIN_IDS, TELEGRAM_TOKEN, UPDATE_CONCURRENCY
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Initialize Google Sheets manager
-sheets_manager = GoogleSheetsManager()
-
 # Conversation states
 NAME, PHONE, SUBJECT = range(3)
 STUDENT_ID, DATE, AMOUNT = range(3, 6)
 
+# Shown when the storage backend fails fast because Google Sheets is degraded
+UNAVAILABLE_MESSAGE = "⚠️ Google Sheets hozir ishlamayapti. Iltimos, bir necha daqiqadan so'ng qayta urinib ko'ring."
+
+# Students shown on one page of /hisobot, well under Telegram's 4096 characters
+REPORT_PAGE_SIZE = 10
+
+# Students shown on one page of the /guruh checklist, two buttons per row
+GROUP_PAGE_SIZE = 10
+
+# Students offered by inline search and by "did you mean" suggestions
+SEARCH_RESULTS_LIMIT = 20
+SUGGESTIONS_LIMIT = 5
+
+# Button that opens inline student search in the current chat
+SEARCH_BUTTON_TEXT = "🔍 O'quvchini qidirish"
+
+# Shown when a /guruh keyboard is pressed after its selection was cleared
+GROUP_EXPIRED_MESSAGE = "⚠️ Tanlov eskirgan. /guruh buyrug'ini qayta yuboring."
+
+# Shown when someone outside ADMIN_IDS sends an admin command
+ADMIN_ONLY_MESSAGE = "⛔ Bu buyruq faqat administratorlar uchun."
+
+# Months shown by /statistika: attendance rates and revenue
+STATISTICS_MONTHS = 3
+REVENUE_MONTHS = 12
+
+# Days without a payment after which /qarzdorlar lists a student, and most students listed
+UNPAID_DAYS = 30
+UNPAID_LIST_LIMIT = 50
+
+# Longest message text sent, under Telegram's 4096 characters
+MESSAGE_LIMIT = 4000
+
+# /hisobot arguments that return a precomputed summary instead of the student report
+SNAPSHOT_ARGS = {"kun": "daily", "hafta": "weekly"}
+
+def update_tenant(update):
+    """Return the tenant an update's chat or user belongs to, None for the default one."""
+    chat = update.effective_chat
+    user = update.effective_user
+    return tenant_router.resolve(chat.id if chat else None, user.id if user else None)
+
+def storage_for(update):
+    """Return the storage backend of the learning center an update comes from."""
+    return get_storage(update_tenant(update))
+
+@timed_handler
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a welcome message when the command /start is issued."""
     user = update.effective_user
     keyboard = [
         ["/royxat", "/davomat"],
-        ["/tolov", "/hisobot"]
+        ["/guruh", "/tolov"],
+        ["/hisobot"]
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
@@ -37,27 +100,234 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         f"Bo'limlardan birini tanlang:\n"
         f"• /royxat – o'quvchi ma'lumotlarini kiritish\n"
         f"• /davomat – o'quvchining darsga kelganini belgisi\n"
+        f"• /guruh – butun guruh davomatini belgilash\n"
         f"• /tolov – to'lov sanasi va summasi yozish\n"
         f"• /hisobot – o'quvchilar hisoboti",
         reply_markup=reply_markup
     )
     logger.info(f"User {user.id} ({user.username}) started the bot")
 
+@timed_handler
 async def attendance_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Record attendance when the command /davomat is issued."""
+    """Record attendance when the command /davomat is issued.
+    
+    ``/davomat`` marks the sender, ``/davomat <ID>`` marks the student with
+    that ID; an ID that is not in the roster is rejected, not recorded.
+    """
     user = update.effective_user
     username = user.username or user.first_name or "NoName"
     date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    student_id = context.args[0].strip() if context.args else ""
     
     try:
+        storage = storage_for(update)
+        if student_id and await storage.get_student_async(student_id) is None:
+            await update.message.reply_text(
+                f"⚠️ {student_id} ID raqamli o'quvchi topilmadi. ID raqamini tekshirib, qayta yuboring."
+            )
+            return
         # Record attendance in Google Sheets
-        sheets_manager.record_attendance(str(user.id), username, "Davomat", date_str)
-        await update.message.reply_text("✅ Davomatingiz yozildi!")
+        await storage.record_attendance_async(str(user.id), username, "Davomat", date_str, student_id)
+        if student_id:
+            await update.message.reply_text(f"✅ {student_id}-ID o'quvchining davomati yozildi!")
+        else:
+            await update.message.reply_text("✅ Davomatingiz yozildi!")
         logger.info(f"Recorded attendance for user {user.id} ({username})")
+    except DuplicateSubmissionError:
+        if student_id:
+            await update.message.reply_text(f"ℹ️ {student_id}-ID o'quvchining bugungi davomati allaqachon yozilgan.")
+        else:
+            await update.message.reply_text("ℹ️ Bugungi davomatingiz allaqachon yozilgan.")
+    except StorageUnavailableError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
     except Exception as e:
         logger.error(f"Failed to record attendance: {e}")
         await update.message.reply_text("❌ Davomatingizni yozishda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
 
+def render_group_page(selection):
+    """Render the current page of a group checklist with its keyboard.
+    
+    Args:
+        selection (dict): The ``group`` entry of ``user_data``
+    
+    Returns:
+        tuple: The message text and its inline keyboard
+    """
+    students = selection["students"]
+    present = selection["present"]
+    total_pages = max(1, -(-len(students) // GROUP_PAGE_SIZE))
+    page = selection["page"] = min(max(selection["page"], 0), total_pages - 1)
+    start = page * GROUP_PAGE_SIZE
+    
+    buttons = [
+        InlineKeyboardButton(
+            f"{'✅' if student_id in present else '⬜'} {name[:30]}",
+            callback_data=f"group:toggle:{student_id}",
+        )
+        for student_id, name in students[start:start + GROUP_PAGE_SIZE]
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Oldingi", callback_data=f"group:page:{page - 1}"))
+    navigation.append(InlineKeyboardButton("☑️ Sahifani belgilash", callback_data="group:all"))
+    if page < total_pages - 1:
+        navigation.append(InlineKeyboardButton("Keyingi ▶️", callback_data=f"group:page:{page + 1}"))
+    keyboard.append(navigation)
+    keyboard.append([
+        InlineKeyboardButton(f"💾 Saqlash ({len(present)})", callback_data="group:save"),
+        InlineKeyboardButton("❌ Bekor qilish", callback_data="group:cancel"),
+    ])
+    
+    text = (
+        f"👥 {selection['subject']}: darsga kelgan o'quvchilarni belgilang ({page + 1}/{total_pages}).\n"
+        f"Belgilangan: {len(present)}/{len(students)}"
+    )
+    return text, InlineKeyboardMarkup(keyboard)
+
+@timed_handler
+async def group_attendance_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Start group attendance by asking for the subject whose roster to mark."""
+    try:
+        report_data = await storage_for(update).get_student_report_async()
+    except StorageUnavailableError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
+        return
+    except Exception as e:
+        logger.error(f"Failed to load the student roster: {e}")
+        await update.message.reply_text("❌ O'quvchilar ro'yxatini olishda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
+        return
+    
+    rosters = {}
+    for student in report_data:
+        rosters.setdefault(student["subject"] or "—", []).append((str(student["id"]), student["name"]))
+    if not rosters:
+        await update.message.reply_text("⚠️ Hali birorta o'quvchi ro'yxatga olinmagan.")
+        return
+    
+    subjects = sorted(rosters)
+    context.user_data["group_rosters"] = [(subject, rosters[subject]) for subject in subjects]
+    buttons = [
+        InlineKeyboardButton(f"{subject} ({len(rosters[subject])})", callback_data=f"group:subject:{index}")
+        for index, subject in enumerate(subjects)
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    await update.message.reply_text("👥 Guruh davomati. Fanni tanlang:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+@timed_handler
+async def group_subject_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Open the checklist of the chosen subject."""
+    query = update.callback_query
+    await query.answer()
+    rosters = context.user_data.get("group_rosters")
+    index = int(query.data.rsplit(":", 1)[1])
+    if not rosters or index >= len(rosters):
+        await query.edit_message_text(GROUP_EXPIRED_MESSAGE)
+        return
+    
+    subject, students = rosters[index]
+    selection = context.user_data["group"] = {"subject": subject, "students": students, "present": set(), "page": 0}
+    del context.user_data["group_rosters"]
+    text, reply_markup = render_group_page(selection)
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+@timed_handler
+async def group_checklist_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tick or untick students and move between checklist pages."""
+    query = update.callback_query
+    selection = context.user_data.get("group")
+    if selection is None:
+        await query.answer()
+        await query.edit_message_text(GROUP_EXPIRED_MESSAGE)
+        return
+    
+    _, action, *value = query.data.split(":", 2)
+    present = selection["present"]
+    if action == "toggle":
+        student_id = value[0]
+        if student_id in present:
+            present.discard(student_id)
+        else:
+            present.add(student_id)
+    elif action == "all":
+        start = selection["page"] * GROUP_PAGE_SIZE
+        page_ids = {student_id for student_id, _ in selection["students"][start:start + GROUP_PAGE_SIZE]}
+        if page_ids <= present:
+            present -= page_ids
+        else:
+            present |= page_ids
+    elif action == "page":
+        selection["page"] = int(value[0])
+    await query.answer()
+    text, reply_markup = render_group_page(selection)
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+@timed_handler
+async def group_finish_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Save the ticked students with one batched write, or cancel."""
+    query = update.callback_query
+    selection = context.user_data.get("group")
+    if selection is None:
+        await query.answer()
+        await query.edit_message_text(GROUP_EXPIRED_MESSAGE)
+        return
+    
+    if query.data == "group:cancel":
+        await query.answer()
+        del context.user_data["group"]
+        await query.edit_message_text("Guruh davomati bekor qilindi.")
+        return
+    
+    if not selection["present"]:
+        await query.answer("Hech kim belgilanmagan", show_alert=True)
+        return
+    
+    await query.answer()
+    user = update.effective_user
+    username = user.username or user.first_name or "NoName"
+    date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # Keep the roster order in the sheet
+    student_ids = [student_id for student_id, _ in selection["students"] if student_id in selection["present"]]
+    
+    try:
+        recorded = await storage_for(update).record_group_attendance_async(
+            str(user.id), username, "Davomat", date_str, student_ids
+        )
+        del context.user_data["group"]
+        text = f"✅ {selection['subject']}: {len(recorded)} ta o'quvchining davomati yozildi!"
+        if len(recorded) < len(student_ids):
+            text += f"\nℹ️ {len(student_ids) - len(recorded)} ta o'quvchi bugun allaqachon belgilangan edi."
+        await query.edit_message_text(text)
+        logger.info(f"User {user.id} recorded group attendance for {len(recorded)} students")
+    except StorageUnavailableError:
+        await query.message.reply_text(UNAVAILABLE_MESSAGE)
+    except Exception as e:
+        logger.error(f"Failed to record group attendance: {e}")
+        await query.message.reply_text("❌ Davomatni yozishda xatolik yuz berdi. Iltimos, qayta urinib ko'ring.")
+
+@timed_handler
+async def student_search_inline(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer an inline query with matching students; choosing one sends its ID."""
+    query = update.inline_query
+    try:
+        students = await storage_for(update).search_students_async(query.query, SEARCH_RESULTS_LIMIT)
+    except Exception as e:
+        logger.error(f"Failed to search students for inline query: {e}")
+        students = []
+    results = [
+        InlineQueryResultArticle(
+            id=student["id"],
+            title=f"{student['name']} (ID: {student['id']})",
+            description=student["subject"],
+            input_message_content=InputTextMessageContent(student["id"]),
+        )
+        for student in students
+    ]
+    # Results differ per teacher only by what they typed; keep them fresh
+    await query.answer(results, cache_time=5, is_personal=True)
+
+@timed_handler
 async def register_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the student registration process."""
     await update.message.reply_text(
@@ -66,6 +336,7 @@ async def register_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     )
     return NAME
 
+@timed_handler
 async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Get the student's name and ask for phone number."""
     context.user_data["name"] = update.message.text
@@ -74,6 +345,7 @@ async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     return PHONE
 
+@timed_handler
 async def get_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Get the student's phone and ask for subject."""
     context.user_data["phone"] = update.message.text
@@ -98,6 +370,7 @@ async def get_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     return SUBJECT
 
+@timed_handler
 async def get_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Get the student's subject and save all data."""
     user = update.effective_user
@@ -115,7 +388,7 @@ async def get_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     
     try:
         # Save student information to Google Sheets
-        sheets_manager.record_student(
+        student_id = await storage_for(update).record_student_async(
             str(user.id), 
             context.user_data["name"], 
             context.user_data["phone"], 
@@ -125,11 +398,14 @@ async def get_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         
         await update.message.reply_text(
             f"✅ O'quvchi ma'lumotlari saqlandi:\n"
+            f"ID: {student_id}\n"
             f"Ism: {context.user_data['name']}\n"
             f"Telefon: {context.user_data['phone']}\n"
             f"Fan: {context.user_data['subject']}"
         )
         logger.info(f"User {user.id} registered student {context.user_data['name']}")
+    except StorageUnavailableError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
     except Exception as e:
         logger.error(f"Failed to register student: {e}")
         await update.message.reply_text("❌ O'quvchi ma'lumotlarini saqlashda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
@@ -138,21 +414,57 @@ async def get_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     context.user_data.clear()
     return ConversationHandler.END
 
+@timed_handler
 async def payment_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the payment recording process."""
+    search = InlineKeyboardMarkup([[InlineKeyboardButton(SEARCH_BUTTON_TEXT, switch_inline_query_current_chat="")]])
     await update.message.reply_text(
-        "To'lov ma'lumotlarini kiritish uchun, avval o'quvchi ID raqamini kiriting:"
+        "To'lov ma'lumotlarini kiritish uchun, avval o'quvchi ID raqamini kiriting "
+        "yoki ismini yozib qidiring:",
+        reply_markup=search
     )
     return STUDENT_ID
 
+@timed_handler
 async def get_student_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Get the student ID and ask for payment date."""
-    context.user_data["student_id"] = update.message.text
+    """Check the student ID against the roster and ask for payment date.
+    
+    Anything that is not a known ID is treated as a name search and answered
+    with suggestions, staying in this step.
+    """
+    text = update.message.text.strip()
+    try:
+        student = await storage_for(update).get_student_async(text)
+        suggestions = [] if student else await storage_for(update).search_students_async(text, SUGGESTIONS_LIMIT)
+    except Exception as e:
+        # Without the roster, accept the ID as typed rather than block payments
+        logger.error(f"Failed to look up student {text}: {e}")
+        student = {"id": text, "name": "?", "subject": "?"}
+    
+    if student is None:
+        search = InlineKeyboardMarkup([[InlineKeyboardButton(SEARCH_BUTTON_TEXT, switch_inline_query_current_chat=text)]])
+        if suggestions:
+            lines = "\n".join(f"• {s['id']} – {s['name']} ({s['subject']})" for s in suggestions)
+            await update.message.reply_text(
+                f"⚠️ {text} ID raqamli o'quvchi topilmadi. Balki quyidagilardan biri?\n{lines}\n\n"
+                "O'quvchi ID raqamini kiriting:",
+                reply_markup=search
+            )
+        else:
+            await update.message.reply_text(
+                f"⚠️ {text} bo'yicha o'quvchi topilmadi. ID raqamini tekshirib, qayta kiriting:",
+                reply_markup=search
+            )
+        return STUDENT_ID
+    
+    context.user_data["student_id"] = student["id"]
     await update.message.reply_text(
+        f"O'quvchi: {student['name']} ({student['subject']})\n"
         "To'lov sanasini kiriting (kun.oy.yil formatida, masalan: 15.05.2025):"
     )
     return DATE
 
+@timed_handler
 async def get_payment_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Get the payment date and ask for amount."""
     context.user_data["date"] = update.message.text
@@ -161,6 +473,7 @@ async def get_payment_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     )
     return AMOUNT
 
+@timed_handler
 async def get_payment_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Get the payment amount and save all data."""
     user = update.effective_user
@@ -169,7 +482,7 @@ async def get_payment_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     try:
         # Save payment information to Google Sheets
-        sheets_manager.record_payment(
+        await storage_for(update).record_payment_async(
             str(user.id),
             context.user_data["student_id"],
             context.user_data["date"],
@@ -184,6 +497,10 @@ async def get_payment_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"Miqdor: {context.user_data['amount']} so'm"
         )
         logger.info(f"User {user.id} recorded payment for student {context.user_data['student_id']}")
+    except DuplicateSubmissionError:
+        await update.message.reply_text("ℹ️ Bu to'lov allaqachon yozilgan, qayta saqlanmadi.")
+    except StorageUnavailableError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
     except Exception as e:
         logger.error(f"Failed to record payment: {e}")
         await update.message.reply_text("❌ To'lov ma'lumotlarini saqlashda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
@@ -192,35 +509,226 @@ async def get_payment_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data.clear()
     return ConversationHandler.END
 
+def iter_report_entries(report_data):
+    """Yield the formatted report text of each student."""
+    for student in report_data:
+        yield (
+            f"ID: {student['id']}\n"
+            f"Ism: {student['name']}\n"
+            f"Fan: {student['subject']}\n"
+            f"Davomatlar soni: {student['attendance_count']}\n"
+            f"So'ngi to'lov: {student['last_payment']} so'm\n"
+            f"To'lov sanasi: {student['payment_date']}\n"
+            "------------------------\n"
+        )
+
+def render_report_page(report_data, page):
+    """Render one page of the report with its navigation keyboard.
+    
+    Args:
+        report_data (list): Report rows from ``get_student_report``
+        page (int): Zero-based page number, clamped to the available pages
+    
+    Returns:
+        tuple: The message text and its inline keyboard
+    """
+    total_pages = max(1, -(-len(report_data) // REPORT_PAGE_SIZE))
+    page = min(max(page, 0), total_pages - 1)
+    start = page * REPORT_PAGE_SIZE
+    # Only this page's entries are formatted
+    entries = iter_report_entries(report_data[start:start + REPORT_PAGE_SIZE])
+    text = f"📊 O'quvchilar hisoboti ({page + 1}/{total_pages}):\n\n" + "".join(entries)
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Oldingi", callback_data=f"report:page:{page - 1}"))
+    if page < total_pages - 1:
+        navigation.append(InlineKeyboardButton("Keyingi ▶️", callback_data=f"report:page:{page + 1}"))
+    export = [
+        InlineKeyboardButton("📄 CSV", callback_data="report:export:csv"),
+        InlineKeyboardButton("📊 XLSX", callback_data="report:export:xlsx"),
+    ]
+    keyboard = [navigation, export] if navigation else [export]
+    return text, InlineKeyboardMarkup(keyboard)
+
+@timed_handler
 async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Generate and send a report for students."""
+    """Generate and send the first page of the student report.
+    
+    ``/hisobot kun`` and ``/hisobot hafta`` send the precomputed daily and
+    weekly summaries instead, without touching storage.
+    """
     user = update.effective_user
     
+    if context.args and context.args[0].lower() in SNAPSHOT_ARGS:
+        snapshot = get_snapshot(context.bot_data, SNAPSHOT_ARGS[context.args[0].lower()], update_tenant(update))
+        await update.message.reply_text(snapshot or "⏳ Hisobot hali tayyorlanmagan. Iltimos, keyinroq qayta urinib ko'ring.")
+        return
+    
     try:
         # Get report from Google Sheets
-        report_data = sheets_manager.get_student_report()
+        report_data = await storage_for(update).get_student_report_async()
         
         if not report_data:
             await update.message.reply_text("⚠️ Hisobot uchun ma'lumotlar topilmadi.")
             return
         
-        # Format report message
-        report_message = "📊 O'quvchilar hisoboti:\n\n"
-        for student in report_data:
-            report_message += f"ID: {student['id']}\n"
-            report_message += f"Ism: {student['name']}\n"
-            report_message += f"Fan: {student['subject']}\n"
-            report_message += f"Davomatlar soni: {student['attendance_count']}\n"
-            report_message += f"So'ngi to'lov: {student['last_payment']} so'm\n"
-            report_message += f"To'lov sanasi: {student['payment_date']}\n"
-            report_message += "------------------------\n"
-        
-        await update.message.reply_text(report_message)
+        text, reply_markup = render_report_page(report_data, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
         logger.info(f"User {user.id} requested student report")
+    except StorageUnavailableError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
     except Exception as e:
         logger.error(f"Failed to generate report: {e}")
         await update.message.reply_text("❌ Hisobotni yaratishda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
 
+@timed_handler
+async def report_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show another page of the report when a navigation button is pressed."""
+    query = update.callback_query
+    await query.answer()
+    page = int(query.data.rsplit(":", 1)[1])
+    
+    try:
+        report_data = await storage_for(update).get_student_report_async()
+        text, reply_markup = render_report_page(report_data, page)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except StorageUnavailableError:
+        await query.message.reply_text(UNAVAILABLE_MESSAGE)
+    except Exception as e:
+        logger.error(f"Failed to show report page {page}: {e}")
+        await query.message.reply_text("❌ Hisobotni yaratishda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
+
+@timed_handler
+async def report_export_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send the whole report as a CSV or XLSX document."""
+    query = update.callback_query
+    await query.answer()
+    file_format = query.data.rsplit(":", 1)[1]
+    
+    try:
+        report_data = await storage_for(update).get_student_report_async()
+        # Building the file is CPU work, keep it off the event loop
+        path = await run_cpu_bound(export_report_file, file_format, report_data)
+        try:
+            with open(path, "rb") as document:
+                await query.message.reply_document(document=document, filename=f"hisobot.{file_format}")
+        finally:
+            os.unlink(path)
+        logger.info(f"User {query.from_user.id} exported the report as {file_format}")
+    except ImportError:
+        await query.message.reply_text("❌ XLSX formati serverda mavjud emas, CSV formatidan foydalaning.")
+    except StorageUnavailableError:
+        await query.message.reply_text(UNAVAILABLE_MESSAGE)
+    except Exception as e:
+        logger.error(f"Failed to export report: {e}")
+        await query.message.reply_text("❌ Hisobotni yaratishda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
+
+def is_admin(user):
+    """Return True if ``user`` may use the admin commands; nobody may when ADMIN_IDS is empty."""
+    return user.id in ADMIN_IDS
+
+def truncate_message(text):
+    """Cut ``text`` at a line break so it fits in one message."""
+    if len(text) <= MESSAGE_LIMIT:
+        return text
+    return text[:text.rfind("\n", 0, MESSAGE_LIMIT - 2)] + "\n…"
+
+def render_statistics(statistics):
+    """Render the result of ``analytics.compute_statistics`` as message text."""
+    months = sorted({row[0] for row in statistics["attendance"]})[-STATISTICS_MONTHS:]
+    lines = ["📈 Oylik davomat (fanlar bo'yicha):"]
+    for month, subject, marks, lesson_days, students, rate in statistics["attendance"]:
+        if month in months:
+            lines.append(f"{month} {subject}: {rate:.0%} ({marks} ta belgi, {lesson_days} dars kuni, {students} o'quvchi)")
+    if not months:
+        lines.append("Ma'lumot yo'q")
+    
+    lines += ["", "💰 Oylik tushum:"]
+    for month, count, total in statistics["revenue"][-REVENUE_MONTHS:]:
+        lines.append(f"{month}: {format_amount(total)} so'm ({count} ta to'lov)")
+    if not statistics["revenue"]:
+        lines.append("Ma'lumot yo'q")
+    return truncate_message("\n".join(lines))
+
+def render_unpaid_students(students):
+    """Render the result of ``analytics.find_unpaid_students`` as message text."""
+    if not students:
+        return f"✅ Oxirgi {UNPAID_DAYS} kunda barcha o'quvchilar to'lov qilgan."
+    lines = [f"💸 Oxirgi {UNPAID_DAYS} kunda to'lov qilmagan o'quvchilar ({len(students)} ta):"]
+    for student in students[:UNPAID_LIST_LIMIT]:
+        last_payment = f"so'ngi to'lov {student['last_payment']}" if student['last_payment'] else "to'lov qilmagan"
+        lines.append(f"• {student['id']} – {student['name']} ({student['subject']}): {last_payment}")
+    if len(students) > UNPAID_LIST_LIMIT:
+        lines.append(f"… va yana {len(students) - UNPAID_LIST_LIMIT} ta")
+    return truncate_message("\n".join(lines))
+
+@timed_handler
+async def statistics_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send monthly attendance rates per subject and revenue per month (admins only)."""
+    if not is_admin(update.effective_user):
+        await update.message.reply_text(ADMIN_ONLY_MESSAGE)
+        return
+    
+    try:
+        # NumPy is only loaded once an admin asks for statistics
+        import analytics
+        storage = storage_for(update)
+        students, attendance, payments = [
+            await storage.export_rows_async(name) for name in ("students", "attendance", "payments")
+        ]
+        statistics = await run_cpu_bound(analytics.compute_statistics, students, attendance, payments)
+        await update.message.reply_text(render_statistics(statistics))
+        logger.info(f"User {update.effective_user.id} requested statistics")
+    except ImportError:
+        await update.message.reply_text("❌ Statistika uchun serverda NumPy o'rnatilmagan.")
+    except StorageUnavailableError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
+    except Exception as e:
+        logger.error(f"Failed to compute statistics: {e}")
+        await update.message.reply_text("❌ Statistikani hisoblashda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
+
+@timed_handler
+async def unpaid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """List students with no payment in the last UNPAID_DAYS days (admins only)."""
+    if not is_admin(update.effective_user):
+        await update.message.reply_text(ADMIN_ONLY_MESSAGE)
+        return
+    
+    try:
+        import analytics
+        storage = storage_for(update)
+        students = await storage.export_rows_async("students")
+        payments = await storage.export_rows_async("payments")
+        unpaid = await run_cpu_bound(analytics.find_unpaid_students, students, payments, UNPAID_DAYS)
+        await update.message.reply_text(render_unpaid_students(unpaid))
+        logger.info(f"User {update.effective_user.id} requested unpaid students")
+    except ImportError:
+        await update.message.reply_text("❌ Statistika uchun serverda NumPy o'rnatilmagan.")
+    except StorageUnavailableError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
+    except Exception as e:
+        logger.error(f"Failed to find unpaid students: {e}")
+        await update.message.reply_text("❌ Statistikani hisoblashda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
+
+@timed_handler
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Turn the scheduled daily and weekly reports for this chat on or off (admins only)."""
+    if not is_admin(update.effective_user):
+        await update.message.reply_text(ADMIN_ONLY_MESSAGE)
+        return
+    
+    subscribers = context.bot_data.setdefault(SUBSCRIBERS_KEY, {})
+    chat_id = update.effective_chat.id
+    if chat_id in subscribers:
+        del subscribers[chat_id]
+        await update.message.reply_text("🔕 Kunlik va haftalik hisobotlar endi yuborilmaydi.")
+    else:
+        # The chat gets the reports of the center it belongs to now
+        subscribers[chat_id] = update_tenant(update)
+        await update.message.reply_text("🔔 Kunlik va haftalik hisobotlar har kuni ertalab shu chatga yuboriladi.")
+
+@timed_handler
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the conversation."""
     await update.message.reply_text(
@@ -236,15 +744,59 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     if update and update.effective_message:
         await update.effective_message.reply_text("Botda xatolik yuz berdi. Iltimos, keyinroq qayta urinib ko'ring.")
 
-def setup_bot():
-    """Set up the bot with handlers and start polling."""
+async def start_monitoring(application: Application) -> None:
+    """Start the event-loop lag probe and expose the update queue depth.
+    
+    Call once the application has been started.
+    """
+    register_application(application)
+    application.create_task(monitor_event_loop())
+
+async def start_scheduled_jobs(application: Application) -> None:
+    """Start precomputing and pushing the daily and weekly reports.
+    
+    Call once the application has been started, in the update consumer only.
+    """
+    application.create_task(report_scheduler.run(application))
+
+def setup_bot(request=None):
+    """Set up the bot with handlers and start polling.
+    
+    Args:
+        request (BaseRequest): Bot API transport to use instead of HTTP,
+            e.g. the in-process fake used by the benchmarks
+    """
     # Create the Application
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Updates from different chats run concurrently, each chat stays in order
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY))
+        # Half-finished /royxat and /tolov flows, report subscriptions and
+        # precomputed reports survive restarts
+        .persistence(SQLitePersistence())
+    )
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
+
+    if not ADMIN_IDS:
+        logger.warning("ADMIN_IDS is not set, /statistika, /qarzdorlar and /obuna are disabled for everyone")
 
     # Add command handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("davomat", attendance_command))
+    application.add_handler(CommandHandler("guruh", group_attendance_command))
     application.add_handler(CommandHandler("hisobot", report_command))
+    application.add_handler(CommandHandler("statistika", statistics_command))
+    application.add_handler(CommandHandler("qarzdorlar", unpaid_command))
+    application.add_handler(CommandHandler("obuna", subscribe_command))
+    application.add_handler(InlineQueryHandler(student_search_inline))
+    application.add_handler(CallbackQueryHandler(group_subject_callback, pattern=r"^group:subject:\d+$"))
+    application.add_handler(CallbackQueryHandler(group_checklist_callback, pattern=r"^group:(toggle:.+|all|page:\d+)$"))
+    application.add_handler(CallbackQueryHandler(group_finish_callback, pattern=r"^group:(save|cancel)$"))
+    application.add_handler(CallbackQueryHandler(report_page_callback, pattern=r"^report:page:\d+$"))
+    application.add_handler(CallbackQueryHandler(report_export_callback, pattern=r"^report:export:(csv|xlsx)$"))
     
     # Add conversation handlers for student registration
     register_conv_handler = ConversationHandler(
@@ -255,6 +807,8 @@ def setup_bot():
             SUBJECT: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_subject)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="register",
+        persistent=True,
     )
     application.add_handler(register_conv_handler)
     
@@ -267,6 +821,8 @@ def setup_bot():
             AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_payment_amount)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="payment",
+        persistent=True,
     )
     application.add_handler(payment_conv_handler)
     
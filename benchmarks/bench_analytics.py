@@ -0,0 +1,140 @@
+"""Benchmark the NumPy analytics engine against per-row dict loops.
+
+Generates sheet rows shaped like ``get_all_values()`` output, then times
+monthly attendance rates per subject, revenue per month and students with
+no payment in 30 days, once with AnalyticsFrame and once with the dict
+loops the report used to need, and checks both agree. Requires NumPy.
+Run from the repository root:
+
+    python -m benchmarks.bench_analytics
+    python -m benchmarks.bench_analytics --attendance 100000 --payments 20000
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from analytics import AnalyticsFrame
+from report_engine import parse_amount, parse_payment_date
+
+SUBJECTS = ["Matematika", "Fizika", "Ingliz tili", "Rus tili", "Kimyo", "Biologiya", "Informatika", "Tarix"]
+HEADERS = {
+    "attendance": ["User ID", "Username", "Action", "Timestamp", "Student ID"],
+    "students": ["ID", "Registered By", "Name", "Phone", "Subject", "Timestamp"],
+    "payments": ["Recorded By", "Student ID", "Payment Date", "Amount", "Timestamp"],
+}
+
+def make_rows(students, attendance, payments, days=730, seed=0):
+    """Generate two years of rows, values as strings like the sheet returns them."""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    # Most students are registered before the first lesson
+    student_rows = [
+        [str(i), "1000", f"Student {i}", "+998900000000", rng.choice(SUBJECTS),
+         f"{start + timedelta(days=rng.randrange(-days, days)):%Y-%m-%d} 09:00:00"]
+        for i in range(1, students + 1)
+    ]
+    attendance_rows = [
+        ["1000", "teacher", "Davomat", f"{start + timedelta(days=rng.randrange(days)):%Y-%m-%d} 09:00:00",
+         str(rng.randint(1, students))]
+        for _ in range(attendance)
+    ]
+    payment_rows = []
+    for _ in range(payments):
+        day = start + timedelta(days=rng.randrange(days))
+        payment_rows.append(["1000", str(rng.randint(1, students)), f"{day:%d.%m.%Y}",
+                             str(rng.randrange(100000, 1000000, 10000)), f"{day:%Y-%m-%d} 09:00:00"])
+    return student_rows, attendance_rows, payment_rows
+
+def dict_loop_statistics(student_data, attendance_data, payment_data, today):
+    """The same statistics as per-row loops over ``get_all_records()`` dicts."""
+    students = {}
+    enrolled = {}
+    for student in student_data:
+        registered = datetime.strptime(student['Timestamp'][:10], "%Y-%m-%d").date()
+        students[student['ID']] = (student['Subject'], registered)
+
+    marks = {}
+    lessons = set()
+    for record in attendance_data:
+        student = students.get(record['Student ID'])
+        if student is None:
+            continue
+        day = datetime.strptime(record['Timestamp'][:10], "%Y-%m-%d").date()
+        key = (f"{day:%Y-%m}", student[0])
+        marks[key] = marks.get(key, 0) + 1
+        lessons.add((day, student[0]))
+    lesson_days = {}
+    for day, subject in lessons:
+        key = (f"{day:%Y-%m}", subject)
+        lesson_days[key] = lesson_days.get(key, 0) + 1
+    attendance = []
+    for month, subject in sorted(marks):
+        if (month, subject) not in enrolled:
+            enrolled[month, subject] = sum(
+                1 for s, registered in students.values() if s == subject and f"{registered:%Y-%m}" <= month
+            )
+        possible = enrolled[month, subject] * lesson_days[month, subject]
+        attendance.append((month, subject, marks[month, subject], lesson_days[month, subject],
+                           enrolled[month, subject], marks[month, subject] / possible if possible else 0.0))
+
+    revenue = {}
+    latest = {}
+    for payment in payment_data:
+        parsed = parse_payment_date(payment['Payment Date'])
+        amount = parse_amount(payment['Amount'])
+        if parsed is None:
+            continue
+        if payment['Student ID'] in students:
+            latest[payment['Student ID']] = max(latest.get(payment['Student ID'], parsed), parsed)
+        if amount is None:
+            continue
+        count, total = revenue.get(f"{parsed:%Y-%m}", (0, 0))
+        revenue[f"{parsed:%Y-%m}"] = (count + 1, total + amount)
+
+    cutoff = datetime.combine(today - timedelta(days=30), datetime.min.time())
+    unpaid = [
+        student_id for student_id, (_, registered) in students.items()
+        if registered <= cutoff.date() and (student_id not in latest or latest[student_id] < cutoff)
+    ]
+    return attendance, sorted((month, count, total) for month, (count, total) in revenue.items()), unpaid
+
+def to_records(name, rows):
+    return [dict(zip(HEADERS[name], row)) for row in rows]
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--attendance", type=int, default=1_000_000)
+    parser.add_argument("--payments", type=int, default=200_000)
+    args = parser.parse_args()
+
+    student_rows, attendance_rows, payment_rows = make_rows(args.students, args.attendance, args.payments)
+    today = date(2026, 1, 1)
+    print(f"students={args.students} attendance={args.attendance} payments={args.payments}")
+
+    frame, load = timed(AnalyticsFrame, student_rows, attendance_rows, payment_rows)
+    attendance, attendance_time = timed(frame.monthly_attendance)
+    revenue, revenue_time = timed(frame.monthly_revenue)
+    unpaid, unpaid_time = timed(frame.unpaid_students, 30, today)
+    print(f"numpy:     load {load:.3f}s, attendance {attendance_time:.3f}s, "
+          f"revenue {revenue_time:.3f}s, unpaid {unpaid_time:.3f}s, "
+          f"total {load + attendance_time + revenue_time + unpaid_time:.3f}s")
+
+    records = [to_records(name, rows) for name, rows in
+               (("students", student_rows), ("attendance", attendance_rows), ("payments", payment_rows))]
+    expected, loop_time = timed(dict_loop_statistics, *records, today)
+    print(f"dict loop: total {loop_time:.3f}s")
+
+    assert attendance == expected[0], "attendance rates differ"
+    assert revenue == expected[1], "revenue differs"
+    assert sorted(student["id"] for student in unpaid) == sorted(expected[2]), "unpaid students differ"
+    print("results match")
+
+if __name__ == "__main__":
+    main()
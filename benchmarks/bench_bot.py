@@ -0,0 +1,210 @@
+"""Load-test the bot end to end against fake Telegram and Sheets backends.
+
+Builds the real Application from ``setup_bot()`` with an in-process Bot API
+transport and a GoogleSheetsManager on the fake spreadsheet from
+``benchmarks.fake_sheets``, then feeds it synthetic updates from many
+teachers at a chosen rate. Each teacher cycles through /davomat, a full
+/royxat and /tolov conversation and /hisobot. Reports throughput, p50/p99
+latency from enqueue to handled, and API calls per update. No network
+access is needed. Run from the repository root:
+
+    python -m benchmarks.bench_bot
+    python -m benchmarks.bench_bot --updates 5000 --rate 200 --sheets-latency 0.3 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import tempfile
+import time
+
+# The bot reads its configuration at import time
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:benchmark")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench_bot_"))
+os.environ["STORAGE_BACKEND"] = "sheets"
+os.environ["REPORT_RECONCILE_INTERVAL"] = "0"
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+
+import attendance_bot
+from benchmarks.fake_sheets import FakeBackend
+from sheets_manager import HEADERS, GoogleSheetsManager, SheetsScheduler
+from storage import set_storage
+
+# (kind, text) steps every synthetic teacher repeats in order
+SCRIPT = [
+    ("davomat", "/davomat {student}"),
+    ("royxat", "/royxat"),
+    ("royxat:name", "Student {user}"),
+    ("royxat:phone", "+998901234567"),
+    ("royxat:subject", "Matematika"),
+    ("tolov", "/tolov"),
+    ("tolov:id", "{student}"),
+    ("tolov:date", "15.05.2025"),
+    ("tolov:amount", "300000"),
+    ("hisobot", "/hisobot"),
+]
+
+class FakeBotApi(BaseRequest):
+    """Bot API transport that answers every method locally."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = collections.Counter()
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        name = url.rsplit("/", 1)[-1]
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        parameters = request_data.parameters if request_data else {}
+        if name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif name.startswith(("send", "edit")):
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(parameters.get("chat_id", 0)), "type": "private"},
+                "text": parameters.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+def make_update(update_id, user_id, text, bot):
+    """Build a private-chat text message update."""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Teacher", "username": f"teacher{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+def seed_spreadsheet(backend, students):
+    """Pre-fill the fake spreadsheet with registered students."""
+    rows = [HEADERS["students"]]
+    rows += [[str(i), "1000", f"Student {i}", "+998900000000", "Matematika", "2025-01-01 09:00:00"]
+             for i in range(1, students + 1)]
+    backend.spreadsheet.load("students", rows)
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+async def run(args):
+    backend = FakeBackend(args.sheets_latency, args.quota, args.failure_rate)
+    seed_spreadsheet(backend, args.students)
+    manager = GoogleSheetsManager(
+        journal_path=os.path.join(os.environ["DATA_DIR"], "bench_journal.jsonl"),
+        id_sequence_path=os.path.join(os.environ["DATA_DIR"], "bench_student_id.seq"),
+        reconcile_interval=0,
+        scheduler=SheetsScheduler(rate_per_minute=args.quota, burst=args.quota // 6 or 1, base_delay=0.1),
+        session=backend.session(),
+    )
+    set_storage(manager)
+    bot_api = FakeBotApi(args.telegram_latency)
+    application = attendance_bot.setup_bot(request=bot_api)
+
+    enqueued = {}
+    latencies = collections.defaultdict(list)
+    kinds = {}
+    done = asyncio.Event()
+
+    async def finished(update, context):
+        kind = kinds.pop(update.update_id)
+        latencies[kind].append(time.perf_counter() - enqueued.pop(update.update_id))
+        if not kinds and sent_all:
+            done.set()
+
+    # Runs after the bot's own handler for the update has returned
+    application.add_handler(TypeHandler(Update, finished), group=1000)
+
+    await application.initialize()
+    await application.start()
+    sheets_calls_before = backend.total_calls
+    bot_calls_before = sum(bot_api.calls.values())
+
+    sent_all = False
+    started = time.perf_counter()
+    for update_id in range(1, args.updates + 1):
+        if args.rate:
+            delay = started + update_id / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        index = update_id - 1
+        user = 10_000 + index % args.users
+        kind, template = SCRIPT[(index // args.users) % len(SCRIPT)]
+        text = template.format(user=user, student=1 + index % args.students)
+        update = make_update(update_id, user, text, application.bot)
+        kinds[update_id] = kind
+        enqueued[update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+    sent_all = True
+    if kinds:
+        await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    elapsed = time.perf_counter() - started
+
+    # Count the write-behind flush that the handled updates still owe
+    await asyncio.to_thread(manager._buffer.flush)
+    await application.stop()
+    await application.shutdown()
+    manager._buffer.close()
+    return {
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "sheets_calls": backend.total_calls - sheets_calls_before,
+        "bot_calls": sum(bot_api.calls.values()) - bot_calls_before,
+        "rejected": backend.rejected,
+        "failed": backend.failed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100, help="concurrent teachers")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=0, help="updates per second, 0 for as fast as possible")
+    parser.add_argument("--sheets-latency", type=float, default=0.1, help="seconds per Sheets API call")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="seconds per Bot API call")
+    parser.add_argument("--quota", type=int, default=60, help="Sheets API calls per minute")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of Sheets calls failing with 503")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the last update")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    samples = sorted(value for values in result["latencies"].values() for value in values)
+    print(f"updates={args.updates} teachers={args.users} rate={args.rate or 'max'} "
+          f"sheets latency={args.sheets_latency}s quota={args.quota}/min failure rate={args.failure_rate}")
+    print(f"throughput: {len(samples) / result['elapsed']:.1f} updates/s over {result['elapsed']:.2f}s")
+    print(f"sheets API calls/update: {result['sheets_calls'] / args.updates:.3f} "
+          f"(429 rejected {result['rejected']}, injected failures {result['failed']})")
+    print(f"bot API calls/update: {result['bot_calls'] / args.updates:.3f}")
+    print(f"{'kind':>15} {'count':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for kind, _ in SCRIPT:
+        values = sorted(result["latencies"].get(kind, []))
+        print(f"{kind:>15} {len(values):>6} {percentile(values, 0.5) * 1000:>8.1f} {percentile(values, 0.99) * 1000:>8.1f}")
+    print(f"{'all':>15} {len(samples):>6} {percentile(samples, 0.5) * 1000:>8.1f} {percentile(samples, 0.99) * 1000:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark the memory and parse time of loaded attendance rows.
+
+Generates attendance values shaped like ``get_all_values()`` output and
+loads them three ways: as header-keyed dicts (the old
+``get_all_records()`` shape), as a list of typed slot records and into a
+ColumnStore. For each it reports the parse time, the memory the loaded
+rows hold and the time :func:`report_engine.index_attendance` takes over
+them. No network access is needed. Run from the repository root:
+
+    python -m benchmarks.bench_records
+    python -m benchmarks.bench_records --rows 200000 --students 2000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from records import AttendanceRecord, ColumnStore
+from report_engine import index_attendance
+
+class DictRow(dict):
+    """A header-keyed row readable through the record attributes."""
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return self[{"user_id": "User ID", "student_id": "Student ID"}[name]]
+
+def make_values(rows, students, teachers, seed=0):
+    """Generate one month of attendance values, header row first."""
+    rng = random.Random(seed)
+    values = [AttendanceRecord.columns()]
+    for i in range(rows):
+        day = 1 + i * 28 // rows
+        values.append([
+            str(1000 + rng.randrange(teachers)), "teacher", "Davomat",
+            f"2025-05-{day:02d} {9 + rng.randrange(8):02d}:00:00", str(rng.randint(1, students)),
+        ])
+    return values
+
+def load_dicts(values):
+    header = values[0]
+    return [DictRow(zip(header, row)) for row in values[1:]]
+
+def load_records(values):
+    return list(ColumnStore.from_values(AttendanceRecord, values))
+
+def load_store(values):
+    return ColumnStore.from_values(AttendanceRecord, values)
+
+def measure(load, values):
+    """Return parse seconds, held bytes and index seconds of one loader."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    loaded = load(values)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.perf_counter()
+    index_attendance(loaded)
+    return elapsed, held, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--teachers", type=int, default=50)
+    args = parser.parse_args()
+
+    values = make_values(args.rows, args.students, args.teachers)
+    print(f"rows={args.rows} students={args.students} teachers={args.teachers}")
+    for label, load in (("dicts", load_dicts), ("slot records", load_records), ("column store", load_store)):
+        # Timed without tracemalloc, which slows allocation down
+        started = time.perf_counter()
+        load(values)
+        parse = time.perf_counter() - started
+        _, held, index = measure(load, values)
+        print(f"{label:>12}: parse {parse:.2f}s, held {held / 2 ** 20:.1f} MiB, "
+              f"{held / max(args.rows, 1):.0f} B/row, index {index:.2f}s")
+
+if __name__ == "__main__":
+    main()
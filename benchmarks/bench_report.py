@@ -0,0 +1,86 @@
+"""Benchmark the student report engine on synthetic sheets.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_report
+    python -m benchmarks.bench_report --students 1000 --attendance 50000 --legacy
+"""
+import argparse
+import random
+import time
+
+from records import AttendanceRecord, ColumnStore, PaymentRecord, StudentRecord
+from report_engine import build_student_report
+
+def make_sheets(students, attendance, payments, seed=0):
+    """Generate worksheet values shaped like ``get_all_values()`` output, header row first."""
+    rng = random.Random(seed)
+    student_values = [StudentRecord.columns()] + [
+        [str(i), str(1000 + i % 50), f"Student {i}", "+998900000000", "Matematika", "2025-01-01 09:00:00"]
+        for i in range(1, students + 1)
+    ]
+    attendance_values = [AttendanceRecord.columns()] + [
+        [str(1000 + i % 50), "teacher", "Davomat", "2025-01-01 09:00:00", str(rng.randint(1, students))]
+        for i in range(attendance)
+    ]
+    payment_values = [PaymentRecord.columns()] + [
+        ["1000", str(rng.randint(1, students)), f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2025",
+         str(rng.randrange(100000, 1000000, 10000)), "2025-01-01 09:00:00"]
+        for _ in range(payments)
+    ]
+    return student_values, attendance_values, payment_values
+
+def load_sheets(student_values, attendance_values, payment_values):
+    """Parse the values into column stores, as GoogleSheetsManager does."""
+    return (
+        ColumnStore.from_values(StudentRecord, student_values),
+        ColumnStore.from_values(AttendanceRecord, attendance_values),
+        ColumnStore.from_values(PaymentRecord, payment_values),
+    )
+
+def to_dicts(values):
+    return [dict(zip(values[0], row)) for row in values[1:]]
+
+def legacy_report(student_data, attendance_data, payment_data):
+    """The nested-loop report that ``get_student_report`` used to run."""
+    report = []
+    for student in student_data:
+        student_id = student.get('ID')
+        attendance_count = 0
+        for record in attendance_data:
+            if record.get('User ID') == student.get('Registered By'):
+                attendance_count += 1
+        latest_payment = None
+        payment_date = "N/A"
+        for payment in payment_data:
+            if payment.get('Student ID') == student_id:
+                latest_payment = payment.get('Amount')
+                payment_date = payment.get('Payment Date')
+        report.append((student_id, attendance_count, latest_payment, payment_date))
+    return report
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--attendance", type=int, default=1_000_000)
+    parser.add_argument("--payments", type=int, default=50_000)
+    parser.add_argument("--legacy", action="store_true",
+                        help="also time the old nested-loop report (keep the sizes small)")
+    args = parser.parse_args()
+
+    values = make_sheets(args.students, args.attendance, args.payments)
+    print(f"students={args.students} attendance={args.attendance} payments={args.payments}")
+    started = time.perf_counter()
+    sheets = load_sheets(*values)
+    print(f"parse:          {time.perf_counter() - started:.3f}s")
+    print(f"indexed report: {timed(build_student_report, *sheets):.3f}s")
+    if args.legacy:
+        print(f"legacy report:  {timed(legacy_report, *(to_dicts(sheet) for sheet in values)):.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Measure cold-start cost: module import time and storage warm-up time.
+
+Imports ``attendance_bot`` in fresh interpreters with ``-X importtime`` and
+prints the wall time and the slowest top-level imports, confirming that the
+Sheets client libraries are no longer loaded at import. Then warms up a
+GoogleSheetsManager on the fake spreadsheet from ``benchmarks.fake_sheets``
+and reports the time and Sheets calls the first update no longer pays.
+Run from the repository root:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --sheets-latency 0.3 --students 5000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_sheets import FakeBackend
+
+HEAVY_MODULES = ("gspread", "google.auth", "sheets_manager", "openpyxl", "numpy")
+
+def import_profile(module, env):
+    """Import ``module`` in a fresh interpreter and return (seconds, {module: cumulative us})."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative[parts[2].strip()] = int(parts[1])
+    return float(result.stdout.strip()), cumulative
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports to list")
+    parser.add_argument("--sheets-latency", type=float, default=0.2, help="seconds per Sheets API call")
+    parser.add_argument("--students", type=int, default=1000)
+    args = parser.parse_args()
+
+    env = dict(os.environ, TELEGRAM_TOKEN="123456:benchmark", DATA_DIR=tempfile.mkdtemp(prefix="bench_startup_"))
+    times = []
+    for _ in range(args.runs):
+        seconds, cumulative = import_profile("attendance_bot", env)
+        times.append(seconds)
+    print(f"import attendance_bot: median {statistics.median(times) * 1000:.0f} ms over {args.runs} runs")
+    loaded = [name for name in HEAVY_MODULES if name in cumulative]
+    print(f"heavy modules loaded at import: {', '.join(loaded) or 'none'}")
+    print("slowest imports (cumulative):")
+    top_level = {name: us for name, us in cumulative.items() if "." not in name}
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<24} {us / 1000:>8.1f} ms")
+
+    os.environ.update(env)
+    started = time.perf_counter()
+    from sheets_manager import HEADERS, GoogleSheetsManager
+    print(f"import sheets_manager (deferred to warm-up): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    backend = FakeBackend(latency=args.sheets_latency)
+    rows = [HEADERS["students"]] + [[str(i), "1000", f"Student {i}", "+998900000000", "Matematika", ""]
+                                    for i in range(1, args.students + 1)]
+    backend.spreadsheet.load("students", rows)
+    manager = GoogleSheetsManager(
+        journal_path=os.path.join(env["DATA_DIR"], "journal.jsonl"),
+        id_sequence_path=os.path.join(env["DATA_DIR"], "student_id.seq"),
+        reconcile_interval=0,
+        session=backend.session(),
+    )
+    started = time.perf_counter()
+    manager.warm_up()
+    print(f"storage warm-up: {time.perf_counter() - started:.2f}s, {backend.total_calls} Sheets calls "
+          f"at {args.sheets_latency}s each, moved off the first update")
+    calls = backend.total_calls
+    started = time.perf_counter()
+    manager.record_student("1000", "New Student", "+998900000000", "Fizika", "")
+    manager.get_student_report()
+    print(f"first /royxat + /hisobot after warm-up: {(time.perf_counter() - started) * 1000:.1f} ms, "
+          f"{backend.total_calls - calls} Sheets calls")
+    manager._buffer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark serving many learning centers from one process.
+
+Memory: opens a GoogleSheetsManager per tenant through a TenantPool on fake
+spreadsheets, records attendance and builds the report for every tenant
+in turn, and reports the memory held with the pool bounded and with every
+tenant kept open. Fairness: one tenant floods the shared quota scheduler
+from many threads while another makes occasional calls, and the quiet
+tenant's wait is reported with per-tenant turns and with one shared queue.
+No network access is needed. Run from the repository root:
+
+    python -m benchmarks.bench_tenants
+    python -m benchmarks.bench_tenants --tenants 500 --students 300 --pool 16
+"""
+import argparse
+import gc
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench_tenants_"))
+
+from benchmarks.fake_sheets import FakeBackend
+from sheets_manager import HEADERS, PRIORITY_READ, GoogleSheetsManager, SheetsScheduler
+from tenants import TenantPool
+
+def seed_tenants(backend, tenants, students):
+    for tenant in range(tenants):
+        rows = [HEADERS["students"]]
+        rows += [[str(i), "1000", f"Student {tenant}-{i}", "+998900000000", "Matematika", "2025-01-01 09:00:00"]
+                 for i in range(1, students + 1)]
+        backend.spreadsheet_for(f"https://sheets.test/{tenant}").load("students", rows)
+
+def run_tenants(args, pool_size):
+    """Touch every tenant ``args.passes`` times; return seconds, held memory and open backends."""
+    backend = FakeBackend()
+    seed_tenants(backend, args.tenants, args.students)
+    directory = tempfile.mkdtemp(dir=os.environ["DATA_DIR"])
+    default = GoogleSheetsManager(
+        journal_path=os.path.join(directory, "journal.jsonl"),
+        id_sequence_path=os.path.join(directory, "student_id.seq"),
+        reconcile_interval=0,
+        scheduler=SheetsScheduler(rate_per_minute=10 ** 9, burst=10 ** 6),
+        session=backend.session(),
+    )
+    pool = TenantPool(
+        lambda tenant: default.tenant_manager(
+            tenant, f"https://sheets.test/{tenant}", os.path.join(directory, tenant),
+            cache_max_cells=args.cache_cells // pool_size,
+        ),
+        max_size=pool_size, grace=0,
+    )
+
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    for run in range(args.passes):
+        for tenant in range(args.tenants):
+            manager = pool.get(str(tenant))
+            manager.record_attendance("1000", "teacher", "Davomat", f"2025-05-{run + 1:02d} 09:00:00", "1")
+            manager.get_student_report()
+    elapsed = time.perf_counter() - started
+    # Let the evicted managers finish closing before measuring
+    while pool.stats()["closing"]:
+        time.sleep(0.05)
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, held, peak, pool.stats()["open"]
+
+def run_fairness(args, per_tenant):
+    """Return the quiet tenant's mean wait per call while the noisy tenant floods the scheduler."""
+    scheduler = SheetsScheduler(rate_per_minute=args.quota, burst=1)
+    stop = threading.Event()
+
+    def api_call():
+        time.sleep(0.001)
+
+    def noisy():
+        while not stop.is_set():
+            scheduler.call_for("noisy" if per_tenant else None, PRIORITY_READ, api_call)
+
+    threads = [threading.Thread(target=noisy, daemon=True) for _ in range(args.noisy_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    waits = []
+    for _ in range(args.quiet_calls):
+        started = time.perf_counter()
+        scheduler.call_for("quiet" if per_tenant else None, PRIORITY_READ, api_call)
+        waits.append(time.perf_counter() - started)
+    stop.set()
+    return sum(waits) / len(waits)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--students", type=int, default=200, help="students per tenant")
+    parser.add_argument("--passes", type=int, default=2, help="times every tenant is touched")
+    parser.add_argument("--pool", type=int, default=8, help="tenant backends kept open")
+    parser.add_argument("--cache-cells", type=int, default=2_000_000, help="row cache cells shared by open tenants")
+    parser.add_argument("--quota", type=int, default=1200, help="scheduler calls per minute in the fairness run")
+    parser.add_argument("--noisy-threads", type=int, default=16)
+    parser.add_argument("--quiet-calls", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"tenants={args.tenants} students/tenant={args.students} passes={args.passes}")
+    for label, size in ((f"pool of {args.pool}", args.pool), ("every tenant open", args.tenants)):
+        elapsed, held, peak, open_backends = run_tenants(args, size)
+        print(f"{label:>18}: {elapsed:.2f}s, {open_backends} backends open, "
+              f"held {held / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB")
+
+    print(f"quota={args.quota}/min noisy threads={args.noisy_threads}")
+    for label, per_tenant in (("per-tenant turns", True), ("one shared queue", False)):
+        print(f"{label:>18}: quiet tenant waits {run_fairness(args, per_tenant) * 1000:.0f} ms per call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Load-test the per-chat ordered update processor.
+
+Drives ChatOrderedUpdateProcessor with synthetic updates from many chats,
+each handler sleeping like a slow Sheets call, and reports throughput for
+several concurrency limits. It also checks that no chat saw its updates
+applied out of order. Run from the repository root:
+
+    python -m benchmarks.bench_update_processor
+    python -m benchmarks.bench_update_processor --chats 50 --per-chat 20 --latency 0.02
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from update_processor import ChatOrderedUpdateProcessor
+
+def make_update(chat_id, sequence):
+    """Build the minimal update shape the processor keys on."""
+    chat = SimpleNamespace(id=chat_id)
+    user = SimpleNamespace(id=chat_id)
+    return SimpleNamespace(effective_chat=chat, effective_user=user, sequence=sequence)
+
+async def run(limit, chats, per_chat, latency):
+    processor = ChatOrderedUpdateProcessor(limit)
+    applied = {chat_id: [] for chat_id in range(chats)}
+    peak_waiting = 0
+
+    async def handle(update):
+        await asyncio.sleep(latency)
+        applied[update.effective_chat.id].append(update.sequence)
+
+    # Interleave chats the way updates arrive from Telegram
+    updates = [make_update(chat_id, sequence) for sequence in range(per_chat) for chat_id in range(chats)]
+
+    started = time.perf_counter()
+    tasks = []
+    for update in updates:
+        tasks.append(asyncio.create_task(processor.process_update(update, handle(update))))
+        await asyncio.sleep(0)
+        peak_waiting = max(peak_waiting, processor.metrics()["waiting"])
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    reordered = sum(1 for sequence in applied.values() if sequence != sorted(sequence))
+    return len(updates) / elapsed, peak_waiting, reordered
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--per-chat", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per handler")
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 4, 16, 64, 256])
+    args = parser.parse_args()
+
+    print(f"chats={args.chats} updates/chat={args.per_chat} handler latency={args.latency}s")
+    print(f"{'limit':>6} {'updates/s':>10} {'peak waiting':>13} {'reordered chats':>16}")
+    for limit in args.limits:
+        throughput, peak_waiting, reordered = await run(limit, args.chats, args.per_chat, args.latency)
+        print(f"{limit:>6} {throughput:>10.1f} {peak_waiting:>13} {reordered:>16}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,224 @@
+"""In-process fake of the gspread surface the bot uses.
+
+FakeSpreadsheet and FakeWorksheet implement the calls GoogleSheetsManager
+makes (``worksheet``, ``worksheets``, ``add_worksheet``, ``append_row``,
+``append_rows``, ``get_all_values``, ``get_all_records``, ``row_values``,
+``update_cell``, ``update``, ``resize`` and ``get_lastUpdateTime``) on plain lists, with a configurable latency per
+call, a per-minute quota that answers 429 like Google does, and random
+failure injection. FakeSession plugs the fake into GoogleSheetsManager in
+place of SheetsSession:
+
+    backend = FakeBackend(latency=0.2, quota_per_minute=60)
+    manager = GoogleSheetsManager(session=backend.session(), ...)
+
+Every spreadsheet URL opens its own FakeSpreadsheet, all under the one
+quota; ``backend.spreadsheet`` is the one behind GOOGLE_SHEETS_URL.
+"""
+import collections
+import json
+import random
+import threading
+import time
+
+import gspread
+import requests
+
+from config import GOOGLE_SHEETS_URL
+
+def api_error(status, message):
+    """Build the gspread APIError Google would send with this status."""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(
+        {"error": {"code": status, "message": message, "status": "FAKE"}}
+    ).encode()
+    return gspread.exceptions.APIError(response)
+
+class FakeBackend:
+    """Shared state of the fake spreadsheets: latency, quota, failures, counts."""
+
+    def __init__(self, latency=0.0, quota_per_minute=None, failure_rate=0.0, seed=0):
+        """Create the backend.
+
+        Args:
+            latency (float): Seconds every API call takes
+            quota_per_minute (int): Calls allowed in any 60 second window,
+                None for no limit
+            failure_rate (float): Probability that a call fails with a 503
+            seed (int): Seed of the failure injection
+        """
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.failure_rate = failure_rate
+        self.calls = collections.Counter()
+        self.rejected = 0
+        self.failed = 0
+        self._recent = collections.deque()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.spreadsheets = {}
+        self.spreadsheet = self.spreadsheet_for(GOOGLE_SHEETS_URL)
+
+    def spreadsheet_for(self, url):
+        """Return the fake spreadsheet opened by ``url``, creating it on first use."""
+        with self._lock:
+            if url not in self.spreadsheets:
+                self.spreadsheets[url] = FakeSpreadsheet(self)
+            return self.spreadsheets[url]
+
+    def api_call(self, name):
+        """Account for one API call; sleep, and raise a quota or injected error."""
+        with self._lock:
+            self.calls[name] += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.quota_per_minute is not None and len(self._recent) >= self.quota_per_minute:
+                self.rejected += 1
+                raise api_error(429, "Quota exceeded for quota metric 'Write requests'")
+            self._recent.append(now)
+            fail = self._rng.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            with self._lock:
+                self.failed += 1
+            raise api_error(503, "The service is currently unavailable.")
+
+    @property
+    def total_calls(self):
+        """API calls made so far, rejected and failed ones included."""
+        return sum(self.calls.values())
+
+    def session(self):
+        """Return a SheetsSession stand-in that opens this spreadsheet."""
+        return FakeSession(self)
+
+class FakeSpreadsheet:
+    """The spreadsheet-level calls of ``gspread.Spreadsheet``."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._worksheets = {}
+        self._revision = 0
+
+    def touch(self):
+        self._revision += 1
+
+    def load(self, name, values):
+        """Fill a worksheet with rows, header included, without making API calls."""
+        worksheet = self._worksheets.setdefault(name, FakeWorksheet(self._backend, self, name))
+        worksheet.values = [list(row) for row in values]
+        worksheet.row_count = max(worksheet.row_count, len(values))
+        self.touch()
+        return worksheet
+
+    def worksheet(self, name):
+        self._backend.api_call("worksheet")
+        try:
+            return self._worksheets[name]
+        except KeyError:
+            raise gspread.exceptions.WorksheetNotFound(name)
+
+    def worksheets(self):
+        self._backend.api_call("worksheets")
+        return list(self._worksheets.values())
+
+    def add_worksheet(self, title, rows=100, cols=20):
+        self._backend.api_call("add_worksheet")
+        worksheet = self._worksheets[title] = FakeWorksheet(self._backend, self, title, rows)
+        self.touch()
+        return worksheet
+
+    def get_lastUpdateTime(self):
+        self._backend.api_call("get_lastUpdateTime")
+        return f"revision-{self._revision}"
+
+class FakeWorksheet:
+    """The worksheet-level calls of ``gspread.Worksheet``."""
+
+    def __init__(self, backend, spreadsheet, title, rows=100):
+        self._backend = backend
+        self._spreadsheet = spreadsheet
+        self.title = title
+        self.row_count = rows
+        self.values = []
+
+    def append_row(self, row):
+        self._backend.api_call("append_row")
+        self.values.append([str(value) for value in row])
+        self._spreadsheet.touch()
+
+    def append_rows(self, rows):
+        self._backend.api_call("append_rows")
+        self.values.extend([str(value) for value in row] for row in rows)
+        self._spreadsheet.touch()
+
+    def get_all_values(self):
+        self._backend.api_call("get_all_values")
+        return [list(row) for row in self.values]
+
+    def get_all_records(self):
+        self._backend.api_call("get_all_records")
+        if not self.values:
+            return []
+        header = self.values[0]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in self.values[1:]]
+
+    def row_values(self, row):
+        self._backend.api_call("row_values")
+        return list(self.values[row - 1]) if row <= len(self.values) else []
+
+    def update_cell(self, row, col, value):
+        self._backend.api_call("update_cell")
+        while len(self.values) < row:
+            self.values.append([])
+        cells = self.values[row - 1]
+        cells.extend([""] * (col - len(cells)))
+        cells[col - 1] = str(value)
+        self._spreadsheet.touch()
+
+    def update(self, range_name, values):
+        """Overwrite rows from the top; only ``A1`` ranges are supported."""
+        self._backend.api_call("update")
+        if range_name != "A1":
+            raise ValueError(f"Unsupported range: {range_name}")
+        if len(values) > self.row_count:
+            raise api_error(400, "Range exceeds grid limits")
+        rows = [[str(value) for value in row] for row in values]
+        self.values[:len(rows)] = rows
+        self._spreadsheet.touch()
+
+    def resize(self, rows=None, cols=None):
+        self._backend.api_call("resize")
+        if rows is not None:
+            self.row_count = rows
+            del self.values[rows:]
+
+class FakeClient:
+    """The ``open_by_url`` call of ``gspread.Client``."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def open_by_url(self, url):
+        self._backend.api_call("open_by_url")
+        return self._backend.spreadsheet_for(url)
+
+class FakeSession:
+    """Drop-in for SheetsSession that needs no credentials."""
+
+    def __init__(self, backend):
+        self._client = FakeClient(backend)
+
+    def client(self):
+        return self._client
+
+    def ensure_fresh(self):
+        pass
+
+    def refresh_token(self):
+        pass
+
+    def reset_connections(self):
+        pass
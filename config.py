@@ -6,3 +6,94 @@ TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN", "8119704543:AAHkdNIpUrhcCK6bNO
 # Google Sheets ma'lumotlari
 GOOGLE_SHEETS_URL = os.environ.get("GOOGLE_SHEETS_URL", "https://docs.google.com/spreadsheets/d/16S4Zt09ZamU5vf3SW_Ah2nS-WdO7zmz-idjOYHCD3PA")
 GOOGLE_SHEETS_CREDENTIALS = os.environ.get("GOOGLE_SHEETS_CREDENTIALS")
+
+# Google Sheets so'rovlari uchun oqimlar soni va bitta so'rovning vaqt chegarasi (soniya)
+SHEETS_MAX_WORKERS = int(os.environ.get("SHEETS_MAX_WORKERS", "8"))
+SHEETS_CALL_TIMEOUT = float(os.environ.get("SHEETS_CALL_TIMEOUT", "30"))
+
+# Mahalliy ma'lumotlar (jurnal va boshqa fayllar) saqlanadigan papka
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+
+# Yozuvlarni to'plab yuborish: jurnal fayli, to'plam hajmi va yuborish oralig'i (soniya)
+SHEETS_JOURNAL_PATH = os.environ.get("SHEETS_JOURNAL_PATH", os.path.join(DATA_DIR, "sheets_journal.jsonl"))
+SHEETS_BATCH_SIZE = int(os.environ.get("SHEETS_BATCH_SIZE", "50"))
+SHEETS_FLUSH_INTERVAL = float(os.environ.get("SHEETS_FLUSH_INTERVAL", "5"))
+
+# O'quvchi ID raqamlari hisoblagichi saqlanadigan fayl
+STUDENT_ID_SEQUENCE_PATH = os.environ.get("STUDENT_ID_SEQUENCE_PATH", os.path.join(DATA_DIR, "student_id.seq"))
+
+# Hisobot ko'rinishini jadval bilan solishtirish oralig'i (soniya), 0 - o'chirilgan
+REPORT_RECONCILE_INTERVAL = float(os.environ.get("REPORT_RECONCILE_INTERVAL", "600"))
+
+# Jadval qatorlari keshi: yangilikni tekshirish oralig'i (soniya) va eng ko'p katakchalar soni
+SHEETS_CACHE_TTL = float(os.environ.get("SHEETS_CACHE_TTL", "60"))
+SHEETS_CACHE_MAX_CELLS = int(os.environ.get("SHEETS_CACHE_MAX_CELLS", "2000000"))
+
+# Ma'lumotlar ombori: "sheets" - faqat Google Sheets, "sqlite" - mahalliy SQLite va Google Sheets bilan sinxronlash
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sheets")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join(DATA_DIR, "bot.sqlite3"))
+
+# Ishga tushishda ombor tayyorlanmasa, qayta urinish oralig'i (soniya)
+WARM_UP_RETRY_INTERVAL = float(os.environ.get("WARM_UP_RETRY_INTERVAL", "10"))
+
+# Takroriy davomat va to'lovlarni aniqlash: yozuv necha soniya eslab qolinadi va eng ko'p yozuvlar soni
+DEDUP_TTL = float(os.environ.get("DEDUP_TTL", "86400"))
+DEDUP_MAX_ENTRIES = int(os.environ.get("DEDUP_MAX_ENTRIES", "100000"))
+
+# SQLite -> Google Sheets sinxronlash: yuborish va qo'lda kiritilgan o'zgarishlarni olish oralig'i (soniya)
+SYNC_PUSH_INTERVAL = float(os.environ.get("SYNC_PUSH_INTERVAL", "5"))
+SYNC_PULL_INTERVAL = float(os.environ.get("SYNC_PULL_INTERVAL", "300"))
+SYNC_BATCH_SIZE = int(os.environ.get("SYNC_BATCH_SIZE", "500"))
+
+# Webhook rejimi: tashqi manzil, maxfiy kalit va qabul qilingan, hali tugamagan yangilanishlar chegarasi
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", "1000"))
+PORT = int(os.environ.get("PORT", "5000"))
+
+# Bir vaqtda ishlanadigan yangilanishlar soni (bitta chat ichida tartib saqlanadi)
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "16"))
+
+# Suhbat holatlari va foydalanuvchi ma'lumotlari saqlanadigan SQLite fayli
+PERSISTENCE_PATH = os.environ.get("PERSISTENCE_PATH", os.path.join(DATA_DIR, "bot_state.sqlite3"))
+# O'zgargan suhbat holatlari necha soniyada bir yoziladi
+PERSISTENCE_UPDATE_INTERVAL = float(os.environ.get("PERSISTENCE_UPDATE_INTERVAL", "2"))
+
+# Google Sheets kvotasi: daqiqasiga so'rovlar, bir zumda ruxsat etilgan so'rovlar,
+# 429 xatosida qayta urinishlar va ketma-ket xatolardan keyin so'rovlarni to'xtatib turish (soniya)
+SHEETS_QUOTA_PER_MINUTE = float(os.environ.get("SHEETS_QUOTA_PER_MINUTE", "60"))
+SHEETS_QUOTA_BURST = int(os.environ.get("SHEETS_QUOTA_BURST", "10"))
+SHEETS_MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", "5"))
+SHEETS_BREAKER_THRESHOLD = int(os.environ.get("SHEETS_BREAKER_THRESHOLD", "5"))
+SHEETS_BREAKER_COOLDOWN = float(os.environ.get("SHEETS_BREAKER_COOLDOWN", "60"))
+
+# Kirish tokenini muddati tugashidan necha soniya oldin yangilash
+SHEETS_TOKEN_REFRESH_MARGIN = float(os.environ.get("SHEETS_TOKEN_REFRESH_MARGIN", "300"))
+
+# /debug/profile namunaviy profilerini yoqish (faqat ichki tarmoqda yoqing)
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "") == "1"
+
+# Jarayon vazifasi: "all" - veb va (yetakchi bo'lsa) bot, "web" - faqat veb, "consumer" - faqat bot
+PROCESS_ROLE = os.environ.get("PROCESS_ROLE", "all")
+# Yagona yangilanish iste'molchisini saylash uchun qulf fayli (barcha jarayonlar uchun umumiy bo'lishi kerak)
+LEADER_LOCK_PATH = os.environ.get("LEADER_LOCK_PATH", os.path.join(DATA_DIR, "consumer.lock"))
+LEADER_RETRY_INTERVAL = float(os.environ.get("LEADER_RETRY_INTERVAL", "5"))
+# Og'ir hisob-kitoblar uchun ishchi jarayonlar soni, 0 - oqimda bajariladi
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "0"))
+
+# Kunlik va haftalik hisobotlar tayyorlanib yuboriladigan soat (0-23) va jadvalni tekshirish oralig'i (soniya)
+REPORT_SCHEDULE_HOUR = int(os.environ.get("REPORT_SCHEDULE_HOUR", "3"))
+REPORT_SCHEDULE_CHECK_INTERVAL = float(os.environ.get("REPORT_SCHEDULE_CHECK_INTERVAL", "60"))
+# Ketma-ket markazlar hisobotlarini tayyorlash orasidagi tanaffus (soniya), Google Sheets so'rovlarini yoyish uchun
+REPORT_SCHEDULE_SPACING = float(os.environ.get("REPORT_SCHEDULE_SPACING", "5"))
+
+# Bir nechta o'quv markazlari: chat va foydalanuvchilarni markaz jadvaliga bog'lovchi JSON fayli,
+# fayl bo'lmasa - bitta markaz (GOOGLE_SHEETS_URL)
+TENANTS_PATH = os.environ.get("TENANTS_PATH", os.path.join(DATA_DIR, "tenants.json"))
+# Xotirada bir vaqtda ochiq turadigan markazlar soni va ishlatilmagan markaz yopiladigan vaqt (soniya)
+TENANT_POOL_SIZE = int(os.environ.get("TENANT_POOL_SIZE", "32"))
+TENANT_IDLE_TTL = float(os.environ.get("TENANT_IDLE_TTL", "1800"))
+
+# Statistika buyruqlaridan (/statistika, /qarzdorlar, /obuna) foydalana oladigan Telegram foydalanuvchi
+# ID raqamlari (vergul bilan). Bu buyruqlar uchun majburiy: bo'sh bo'lsa - hech kim foydalana olmaydi
+ADMIN_IDS = {int(user_id) for user_id in os.environ.get("ADMIN_IDS", "").split(",") if user_id.strip()}
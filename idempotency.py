@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+from config import DEDUP_TTL, DEDUP_MAX_ENTRIES
+from records import AttendanceRecord, parse_id
+from report_engine import attendance_key, parse_amount
+
+def attendance_dedup_key(user_id, student_id, timestamp):
+    """Key of an attendance row: who was marked present, and on which day.
+
+    IDs are parsed as they are when the row is read back, so raw and
+    parsed values give the same key.
+
+    Args:
+        user_id: The Telegram user ID who sent the command
+        student_id: The student marked present, empty for a self check-in
+        timestamp: The row timestamp, starting with ``YYYY-MM-DD``
+    """
+    marked = attendance_key(AttendanceRecord(parse_id(user_id), "", "", None, parse_id(student_id)))
+    return ("attendance", marked, str(timestamp)[:10])
+
+def payment_dedup_key(student_id, payment_date, amount):
+    """Key of a payment row: a hash of the student, payment date and amount, raw or parsed."""
+    return ("payment", hash((parse_id(student_id), str(payment_date).strip(), parse_amount(amount))))
+
+class IdempotencyIndex:
+    """Bounded in-memory set of recent submissions with time-based expiry.
+
+    :meth:`add` is an atomic check-and-insert, so of two identical
+    submissions racing each other exactly one gets through. Entries expire
+    ``ttl`` seconds after insertion and the oldest are dropped beyond
+    ``max_entries``; a dropped entry only means a repeat is no longer
+    caught, never that a new submission is refused.
+    """
+
+    def __init__(self, ttl=DEDUP_TTL, max_entries=DEDUP_MAX_ENTRIES):
+        """Create an empty index.
+
+        Args:
+            ttl (float): Seconds an entry is remembered
+            max_entries (int): Most entries kept
+        """
+        self._ttl = ttl
+        self._max_entries = max_entries
+        # key -> expiry time; insertion order is expiry order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._entries:
+            key, expires = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self._max_entries:
+                break
+            del self._entries[key]
+
+    def add(self, key):
+        """Remember ``key``.
+
+        Returns:
+            bool: False if ``key`` was already present, i.e. a duplicate
+        """
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires > now:
+                return False
+            self._entries.pop(key, None)
+            self._entries[key] = now + self._ttl
+            self._evict(now)
+            return True
+
+    def discard(self, key):
+        """Forget ``key``, e.g. after the write it guarded failed."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,88 @@
+import fcntl
+import logging
+import os
+import threading
+from config import LEADER_LOCK_PATH, LEADER_RETRY_INTERVAL
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+class LeaderLock:
+    """Elects the single process that consumes Telegram updates.
+
+    Every process that may consume tries to take an exclusive ``flock`` on
+    the same file; the one that gets it is the leader. The kernel releases
+    the lock when the leader exits or crashes, so there is no lease to renew
+    and a waiting process takes over within ``retry_interval`` seconds.
+    All contenders must see the same file: one host, or a volume shared by
+    every instance.
+    """
+
+    def __init__(self, path=LEADER_LOCK_PATH, retry_interval=LEADER_RETRY_INTERVAL):
+        """Create the lock; nothing is locked until :meth:`acquire`.
+
+        Args:
+            path (str): Lock file shared by every contender
+            retry_interval (float): Seconds between attempts while another process leads
+        """
+        self._path = path
+        self._retry_interval = retry_interval
+        self._file = None
+        self._stopped = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def is_leader(self):
+        """Whether this process holds the lock."""
+        return self._file is not None
+
+    def try_acquire(self):
+        """Take the lock if it is free.
+
+        Returns:
+            bool: True if this process is now the leader
+        """
+        if self._file is not None:
+            return True
+        lock_file = open(self._path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        # Record the holder for whoever inspects the file
+        lock_file.truncate(0)
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        logger.info(f"Process {os.getpid()} is now the update consumer")
+        return True
+
+    def acquire(self):
+        """Block until this process is the leader or :meth:`stop` is called.
+
+        Returns:
+            bool: True if the lock was acquired
+        """
+        waiting_logged = False
+        while not self._stopped.is_set():
+            if self.try_acquire():
+                return True
+            if not waiting_logged:
+                logger.info(f"Another process consumes updates, standing by on {self._path}")
+                waiting_logged = True
+            self._stopped.wait(self._retry_interval)
+        return False
+
+    def stop(self):
+        """Stop waiting in :meth:`acquire`."""
+        self._stopped.set()
+
+    def release(self):
+        """Give up leadership."""
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
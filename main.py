@@ -1,8 +1,17 @@
+import time
+_started = time.perf_counter()
+
 import logging
 import asyncio
 import threading
 from app import app as flask_app
-from attendance_bot import setup_bot
+from attendance_bot import setup_bot, start_monitoring, start_scheduled_jobs
+from config import LEADER_RETRY_INTERVAL, PROCESS_ROLE
+from leader import LeaderLock
+from metrics import observe_startup
+from storage import storage_warm_up
+
+observe_startup("import", time.perf_counter() - _started)
 
 # Configure logging
 logging.basicConfig(
@@ -10,42 +19,79 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+# Only the process holding this lock polls Telegram
+leader = LeaderLock()
+
 def run_bot():
-    """Start the Telegram bot in a separate thread with proper async handling."""
+    """Start the Telegram bot in a separate thread with proper async handling.
+    
+    Returns only if the bot failed to start or stopped.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         # Start the bot
         bot_app = setup_bot()
         loop.run_until_complete(bot_app.initialize())
         loop.run_until_complete(bot_app.start())
+        loop.run_until_complete(start_monitoring(bot_app))
+        loop.run_until_complete(start_scheduled_jobs(bot_app))
         loop.run_until_complete(bot_app.updater.start_polling())
         
-        logging.info("Bot started successfully in polling mode")
+        observe_startup("bot", time.perf_counter() - _started)
+        logging.info(f"Bot started successfully in polling mode {time.perf_counter() - _started:.2f}s after launch")
         loop.run_forever()
     except Exception as e:
         logging.error(f"Error starting bot: {e}")
+    finally:
+        loop.close()
 
-def main():
-    """Main function to run the bot and web server."""
-    # Start the Telegram bot in a background thread
-    bot_thread = threading.Thread(target=run_bot)
+def consume():
+    """Wait to be elected the single update consumer, then run the bot.
+    
+    Every gunicorn worker and every instance may call this; the others keep
+    waiting and take over if the consumer dies. A consumer whose bot fails
+    or stops gives up the role, so a standby takes over, and contends again
+    after standing back for a while.
+    """
+    while leader.acquire():
+        # Connect to storage while the bot starts; /ready reports when done
+        storage_warm_up.start()
+        try:
+            run_bot()
+        finally:
+            leader.release()
+        logging.warning("Update consumer stopped, handing the role to a standby")
+        # Standbys retry every LEADER_RETRY_INTERVAL, give them the first chance
+        time.sleep(2 * LEADER_RETRY_INTERVAL)
+
+def start_consumer():
+    """Run :func:`consume` in a background thread."""
+    bot_thread = threading.Thread(target=consume, name="update-consumer")
     bot_thread.daemon = True
     bot_thread.start()
+
+def main():
+    """Main function to run the bot and web server.
+    
+    ``PROCESS_ROLE=web`` serves only the web app, so the web tier can run
+    any number of workers; ``all`` also contends for the consumer role.
+    """
+    if PROCESS_ROLE != "web":
+        start_consumer()
     
     # Export the Flask app for Gunicorn
     return flask_app
 
 # For direct execution (not through Gunicorn)
 if __name__ == '__main__':
-    # Create a separate thread for the bot
-    bot_thread = threading.Thread(target=run_bot)
-    bot_thread.daemon = True
-    bot_thread.start()
-    
-    # Start Flask app for development
-    flask_app.run(host='0.0.0.0', port=5000, debug=True)
-
-# Export the Flask app for Gunicorn
-app = main()
+    if PROCESS_ROLE == "consumer":
+        # A dedicated consumer: no web server, the bot runs in this thread
+        consume()
+    else:
+        main()
+        # Start Flask app for development
+        flask_app.run(host='0.0.0.0', port=5000, debug=True)
+else:
+    # Export the Flask app for Gunicorn
+    app = main()
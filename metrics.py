@@ -0,0 +1,170 @@
+import asyncio
+import collections
+import functools
+import sys
+import threading
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Every metric lives in the default registry, served by one /metrics route
+HANDLER_LATENCY = Histogram(
+    "bot_handler_seconds", "Time spent in a Telegram update handler", ["handler"],
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Handler calls that raised an exception", ["handler"],
+)
+SHEETS_CALLS = Counter(
+    "sheets_calls_total", "Google Sheets API call attempts", ["operation", "outcome"],
+)
+SHEETS_LATENCY = Histogram(
+    "sheets_call_seconds", "Latency of one Google Sheets API call attempt", ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+SHEETS_RECOVERIES = Counter(
+    "sheets_recoveries_total", "Connection recoveries after a failed Sheets call", ["action"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "bot_event_loop_lag_seconds", "How late the bot's event loop woke a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+UPDATE_QUEUE = Gauge(
+    "bot_update_queue_depth", "Updates received but not yet handed to the update processor",
+)
+UPDATES_PENDING = Gauge(
+    "bot_updates_pending", "Updates admitted by the update processor, by state", ["state"],
+)
+JOB_LATENCY = Histogram(
+    "bot_job_seconds", "Run time of a background job", ["job"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+JOB_RUNS = Counter(
+    "bot_job_runs_total", "Background job runs", ["job", "outcome"],
+)
+JOB_LAST_SUCCESS = Gauge(
+    "bot_job_last_success_timestamp_seconds", "Unix time a background job last succeeded", ["job"],
+)
+TENANT_BACKENDS = Gauge(
+    "bot_tenant_backends", "Per-tenant storage backends held in memory",
+)
+TENANT_EVICTIONS = Counter(
+    "bot_tenant_evictions_total", "Per-tenant storage backends closed to bound memory",
+)
+STARTUP_SECONDS = Gauge(
+    "bot_startup_seconds", "Seconds from process start to the end of each startup phase", ["phase"],
+)
+
+def timed_handler(handler):
+    """Decorate an async handler to record its latency and errors."""
+    name = handler.__name__
+    latency = HANDLER_LATENCY.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+    return wrapper
+
+def observe_sheets_call(operation, seconds, outcome):
+    """Record one Sheets API call attempt."""
+    SHEETS_CALLS.labels(operation, outcome).inc()
+    SHEETS_LATENCY.labels(operation).observe(seconds)
+
+def observe_recovery(action):
+    """Record a connection recovery of the given kind."""
+    SHEETS_RECOVERIES.labels(action).inc()
+
+def observe_job(job, seconds, outcome):
+    """Record one run of a background job."""
+    JOB_RUNS.labels(job, outcome).inc()
+    JOB_LATENCY.labels(job).observe(seconds)
+    if outcome == "ok":
+        JOB_LAST_SUCCESS.labels(job).set(time.time())
+
+def observe_tenant_pool(size, evicted=0):
+    """Record the number of open tenant backends and how many were just closed."""
+    TENANT_BACKENDS.set(size)
+    TENANT_EVICTIONS.inc(evicted)
+
+def observe_startup(phase, seconds):
+    """Record how long a startup phase took."""
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+async def monitor_event_loop(interval=1.0):
+    """Measure event-loop lag forever; run as a task on the bot's loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+def register_application(application):
+    """Expose the queue depth of a PTB Application as gauges.
+
+    The gauges are read at scrape time, from whichever thread serves
+    ``/metrics``.
+    """
+    UPDATE_QUEUE.set_function(application.update_queue.qsize)
+    processor = application.update_processor
+    if hasattr(processor, "metrics"):
+        def reader(state):
+            return lambda: processor.metrics()[state]
+        for state in ("pending", "waiting", "running"):
+            UPDATES_PENDING.labels(state).set_function(reader(state))
+
+def render_metrics():
+    """Return the exposition body and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack.
+
+    While :meth:`run` is active, the calling thread records the stack of
+    every other thread ``rate`` times per second. The result is in folded-stack format,
+    one ``frame;frame;frame count`` line per distinct stack, which flame
+    graph tools read directly. Nothing is sampled, and nothing costs, until
+    :meth:`run` is called.
+    """
+
+    def __init__(self, rate=100, max_depth=64):
+        """Create the profiler.
+
+        Args:
+            rate (int): Samples per second
+            max_depth (int): Innermost frames kept per stack
+        """
+        self._interval = 1.0 / rate
+        self._max_depth = max_depth
+        self._lock = threading.Lock()
+
+    def _stack(self, frame):
+        frames = []
+        while frame is not None and len(frames) < self._max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def run(self, seconds):
+        """Sample for ``seconds`` and return the folded stacks, hottest first.
+
+        Only one profile runs at a time; a second caller waits for the first.
+        """
+        counts = collections.Counter()
+        with self._lock:
+            own = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != own:
+                        counts[self._stack(frame)] += 1
+                time.sleep(self._interval)
+        return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+
+profiler = SamplingProfiler()
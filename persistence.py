@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from telegram.ext import BasePersistence, PersistenceInput
+from config import PERSISTENCE_PATH, PERSISTENCE_UPDATE_INTERVAL
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS data (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+"""
+
+# Key under which the single bot_data and callback_data values are stored
+SINGLETON_KEY = ""
+
+class SQLitePersistence(BasePersistence):
+    """Conversation states and user data kept in SQLite across restarts.
+
+    Every user, chat and conversation key is its own row, so a flush writes
+    only the keys touched since the previous one, and a key whose pickled
+    value did not change is skipped entirely. The database runs in WAL mode
+    and startup reads each table with one query.
+    """
+
+    def __init__(self, path=PERSISTENCE_PATH, update_interval=PERSISTENCE_UPDATE_INTERVAL,
+                 store_data=None):
+        """Open the database.
+
+        Args:
+            path (str): Path of the SQLite database file
+            update_interval (float): Seconds between flushes of changed data
+            store_data (PersistenceInput): Which kinds of data to persist;
+                user data, bot data and conversations by default
+        """
+        if store_data is None:
+            store_data = PersistenceInput(bot_data=True, chat_data=False, user_data=True, callback_data=False)
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        # (table, kind or name, key) -> last pickled value written
+        self._written = {}
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(key)
+
+    @staticmethod
+    def _decode_key(key):
+        key = json.loads(key)
+        return tuple(key) if isinstance(key, list) else key
+
+    def _load(self, kind):
+        with self._db_lock:
+            rows = self._db.execute("SELECT key, value FROM data WHERE kind = ?", (kind,)).fetchall()
+        result = {}
+        for key, value in rows:
+            self._written[("data", kind, key)] = value
+            result[self._decode_key(key)] = pickle.loads(value)
+        return result
+
+    def _write(self, table, kind, key, blob):
+        """Upsert one pickled row, or delete it when ``blob`` is None."""
+        column = "kind" if table == "data" else "name"
+        value_column = "value" if table == "data" else "state"
+        with self._db_lock:
+            if blob is None:
+                self._db.execute(f"DELETE FROM {table} WHERE {column} = ? AND key = ?", (kind, key))
+            else:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {table} ({column}, key, {value_column}) VALUES (?, ?, ?)",
+                    (kind, key, blob),
+                )
+
+    async def _write_async(self, table, kind, key, value):
+        """Store one value, or delete it when ``value`` is None; skip unchanged values.
+
+        The value is pickled here, on the event loop, because handlers keep
+        mutating it there; only the bytes go to the thread doing the
+        single-row upsert.
+        """
+        key = self._encode_key(key)
+        blob = None if value is None else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        marker = (table, kind, key)
+        if self._written.get(marker) == blob:
+            return
+        await asyncio.to_thread(self._write, table, kind, key, blob)
+        if blob is None:
+            self._written.pop(marker, None)
+        else:
+            self._written[marker] = blob
+
+    async def get_user_data(self):
+        """Return the stored user data of every user."""
+        return await asyncio.to_thread(self._load, "user")
+
+    async def get_chat_data(self):
+        """Return the stored chat data of every chat."""
+        return await asyncio.to_thread(self._load, "chat")
+
+    async def get_bot_data(self):
+        """Return the stored bot data."""
+        data = await asyncio.to_thread(self._load, "bot")
+        return data.get(SINGLETON_KEY, {})
+
+    async def get_callback_data(self):
+        """Return the stored callback data, or None."""
+        data = await asyncio.to_thread(self._load, "callback")
+        return data.get(SINGLETON_KEY)
+
+    async def get_conversations(self, name):
+        """Return the stored states of one conversation handler."""
+        def load():
+            with self._db_lock:
+                rows = self._db.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+            result = {}
+            for key, state in rows:
+                self._written[("conversations", name, key)] = state
+                result[self._decode_key(key)] = pickle.loads(state)
+            return result
+        return await asyncio.to_thread(load)
+
+    async def update_conversation(self, name, key, new_state):
+        """Store one conversation key's state; None ends the conversation."""
+        await self._write_async("conversations", name, key, new_state)
+
+    async def update_user_data(self, user_id, data):
+        """Store one user's data."""
+        await self._write_async("data", "user", user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        """Store one chat's data."""
+        await self._write_async("data", "chat", chat_id, data)
+
+    async def update_bot_data(self, data):
+        """Store the bot data."""
+        await self._write_async("data", "bot", SINGLETON_KEY, data)
+
+    async def update_callback_data(self, data):
+        """Store the callback data."""
+        await self._write_async("data", "callback", SINGLETON_KEY, data)
+
+    async def drop_user_data(self, user_id):
+        """Delete one user's data."""
+        await self._write_async("data", "user", user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        """Delete one chat's data."""
+        await self._write_async("data", "chat", chat_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        """Nothing to do; this process is the only writer."""
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        """Nothing to do; this process is the only writer."""
+
+    async def refresh_bot_data(self, bot_data):
+        """Nothing to do; this process is the only writer."""
+
+    async def flush(self):
+        """Close the database; every write is already committed."""
+        with self._db_lock:
+            self._db.close()
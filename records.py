@@ -0,0 +1,253 @@
+from array import array
+from datetime import datetime
+from report_engine import parse_amount, parse_payment_date
+
+def parse_id(value):
+    """Parse a student or Telegram user ID cell.
+
+    Returns:
+        The ID as an int, the stripped text if it is not a plain number, or
+        None if the cell is empty
+    """
+    text = str(value).strip()
+    if not text:
+        return None
+    if text.isascii() and text.isdigit():
+        return int(text)
+    return text
+
+def normalize_id(value):
+    """Return the text a student ID cell is matched by, '' if it is empty.
+
+    Plain numbers are written without leading zeros, as :func:`parse_id`
+    reads them, so "007" and "7" name the same student in every backend.
+    """
+    parsed = parse_id(value)
+    return "" if parsed is None else str(parsed)
+
+def parse_timestamp(value):
+    """Parse a row timestamp written as ``YYYY-MM-DD HH:MM:SS``, None if it is not one."""
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+class Record:
+    """Base of the typed worksheet rows.
+
+    ``FIELDS`` lists ``(attribute, header, parser)`` in the worksheet's
+    column order; one header may feed two attributes, e.g. the raw and the
+    parsed payment date. Values are parsed once, when the row is loaded.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    @classmethod
+    def positions(cls, header=None):
+        """Resolve each field's column in ``header``, None where it has no column.
+
+        Args:
+            header (list): The worksheet's header row, the known column order when omitted
+        """
+        if header is None:
+            header = cls.columns()
+        index = {column: position for position, column in enumerate(header)}
+        return [index.get(column) for _, column, _ in cls.FIELDS]
+
+    @classmethod
+    def columns(cls):
+        """Return the worksheet's header row in column order."""
+        return list(dict.fromkeys(column for _, column, _ in cls.FIELDS))
+
+    @classmethod
+    def from_row(cls, row, header=None):
+        """Parse one row, in the known column order unless ``header`` is given."""
+        return cls(*(
+            parse(row[position] if position is not None and position < len(row) else "")
+            for (_, _, parse), position in zip(cls.FIELDS, cls.positions(header))
+        ))
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+class StudentRecord(Record):
+    """A row of the students worksheet."""
+
+    __slots__ = ("id", "registered_by", "name", "phone", "subject", "timestamp")
+    FIELDS = (
+        ("id", "ID", parse_id),
+        ("registered_by", "Registered By", parse_id),
+        ("name", "Name", str),
+        ("phone", "Phone", str),
+        ("subject", "Subject", str),
+        ("timestamp", "Timestamp", parse_timestamp),
+    )
+
+    def __init__(self, id, registered_by, name, phone, subject, timestamp):
+        self.id = id
+        self.registered_by = registered_by
+        self.name = name
+        self.phone = phone
+        self.subject = subject
+        self.timestamp = timestamp
+
+class AttendanceRecord(Record):
+    """A row of an attendance shard; ``student_id`` is None for a self check-in."""
+
+    __slots__ = ("user_id", "username", "action", "timestamp", "student_id")
+    FIELDS = (
+        ("user_id", "User ID", parse_id),
+        ("username", "Username", str),
+        ("action", "Action", str),
+        ("timestamp", "Timestamp", parse_timestamp),
+        ("student_id", "Student ID", parse_id),
+    )
+
+    def __init__(self, user_id, username, action, timestamp, student_id):
+        self.user_id = user_id
+        self.username = username
+        self.action = action
+        self.timestamp = timestamp
+        self.student_id = student_id
+
+class PaymentRecord(Record):
+    """A row of a payments shard.
+
+    ``payment_date`` is the date as the teacher typed it and ``paid_on``
+    its parsed form, None if it matches no known format.
+    """
+
+    __slots__ = ("recorded_by", "student_id", "payment_date", "paid_on", "amount", "timestamp")
+    FIELDS = (
+        ("recorded_by", "Recorded By", parse_id),
+        ("student_id", "Student ID", parse_id),
+        ("payment_date", "Payment Date", str),
+        ("paid_on", "Payment Date", parse_payment_date),
+        ("amount", "Amount", parse_amount),
+        ("timestamp", "Timestamp", parse_timestamp),
+    )
+
+    def __init__(self, recorded_by, student_id, payment_date, paid_on, amount, timestamp):
+        self.recorded_by = recorded_by
+        self.student_id = student_id
+        self.payment_date = payment_date
+        self.paid_on = paid_on
+        self.amount = amount
+        self.timestamp = timestamp
+
+class AttendanceRollupRecord(Record):
+    """A row of the attendance rollup: the compacted count of one attendance key."""
+
+    __slots__ = ("key", "count", "month")
+    FIELDS = (
+        ("key", "Key", str),
+        ("count", "Count", parse_amount),
+        ("month", "Month", str),
+    )
+
+    def __init__(self, key, count, month):
+        self.key = key
+        self.count = count
+        self.month = month
+
+class PaymentRollupRecord(Record):
+    """A row of the payments rollup: one student's compacted totals and latest payment."""
+
+    __slots__ = ("student_id", "payments", "total_amount", "payment_date", "paid_on", "amount", "month")
+    FIELDS = (
+        ("student_id", "Student ID", parse_id),
+        ("payments", "Payments", parse_amount),
+        ("total_amount", "Total Amount", parse_amount),
+        ("payment_date", "Payment Date", str),
+        ("paid_on", "Payment Date", parse_payment_date),
+        ("amount", "Amount", parse_amount),
+        ("month", "Month", str),
+    )
+
+    def __init__(self, student_id, payments, total_amount, payment_date, paid_on, amount, month):
+        self.student_id = student_id
+        self.payments = payments
+        self.total_amount = total_amount
+        self.payment_date = payment_date
+        self.paid_on = paid_on
+        self.amount = amount
+        self.month = month
+
+class ColumnStore:
+    """Typed rows of one record type, held column by column.
+
+    Every column is dictionary-encoded: an ``array('I')`` of codes into
+    the list of its distinct parsed values. A cell costs four bytes, and a
+    value repeated across rows, such as a student ID or a lesson's
+    timestamp, is parsed and stored once per load. Indexing and iteration
+    build record objects on demand, so a store can stand in for a list of
+    records.
+    """
+
+    def __init__(self, record_type):
+        """Create an empty store.
+
+        Args:
+            record_type (type): The :class:`Record` subclass of the rows
+        """
+        self.record_type = record_type
+        self._codes = [array("I") for _ in record_type.FIELDS]
+        self._values = [[] for _ in record_type.FIELDS]
+
+    @classmethod
+    def from_values(cls, record_type, values):
+        """Create a store from worksheet values whose first row is the header."""
+        store = cls(record_type)
+        store.load_values(values)
+        return store
+
+    def load_values(self, values):
+        """Append worksheet values whose first row is the header."""
+        if values:
+            self.load(values[1:], values[0])
+
+    def load(self, rows, header=None):
+        """Append rows, resolving the columns from ``header`` once.
+
+        Args:
+            rows (list): Rows as value lists
+            header (list): Header naming the rows' columns, the known column order when omitted
+        """
+        fields = zip(self.record_type.FIELDS, self.record_type.positions(header), self._codes, self._values)
+        for (_, _, parse), position, codes, values in fields:
+            # Distinct cells of this load, each parsed once
+            seen = {}
+            column = []
+            for row in rows:
+                cell = row[position] if position is not None and position < len(row) else ""
+                code = seen.get(cell)
+                if code is None:
+                    code = seen[cell] = len(values)
+                    values.append(parse(cell))
+                column.append(code)
+            codes.fromlist(column)
+
+    def column(self, attribute):
+        """Return one column's parsed values as a list, without building records."""
+        index = self.record_type.__slots__.index(attribute)
+        values = self._values[index]
+        return [values[code] for code in self._codes[index]]
+
+    def __len__(self):
+        return len(self._codes[0])
+
+    def __getitem__(self, index):
+        return self.record_type(*(values[codes[index]] for codes, values in zip(self._codes, self._values)))
+
+    def __iter__(self):
+        make = self.record_type
+        columns = self._values
+        for row in zip(*self._codes):
+            yield make(*[values[code] for values, code in zip(columns, row)])
@@ -0,0 +1,253 @@
+from collections import Counter
+from datetime import datetime
+from itertools import chain
+
+# Formats accepted for the "Payment Date" column, the bot asks for kun.oy.yil
+PAYMENT_DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y")
+
+def parse_payment_date(value):
+    """Parse a payment date typed by a teacher.
+
+    Args:
+        value: The raw cell value
+
+    Returns:
+        datetime: The parsed date, or None if it matches no known format
+    """
+    text = str(value).strip()
+    for date_format in PAYMENT_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    return None
+
+def parse_amount(value):
+    """Parse a payment amount typed by a teacher, ignoring separators and currency.
+
+    Args:
+        value: The raw cell value, e.g. ``"300000"`` or ``"300 000 so'm"``
+
+    Returns:
+        int: The amount in so'm, or None if it contains no digits
+    """
+    digits = "".join(ch for ch in str(value) if ch.isdigit())
+    return int(digits) if digits else None
+
+def format_amount(amount):
+    """Format so'm with spaces between thousands, e.g. ``1 250 000``."""
+    return f"{amount:,}".replace(",", " ")
+
+def attendance_key(record):
+    """Return the key an attendance row is counted under.
+
+    Rows that name a student are counted for that student. Self check-ins
+    written without a student ID are counted under the sender's user ID.
+
+    Args:
+        record (AttendanceRecord): The attendance row
+    """
+    if record.student_id is not None:
+        return str(record.student_id)
+    return f"user:{record.user_id}"
+
+def index_attendance(attendance_data):
+    """Count attendance rows per key in a single pass.
+
+    Args:
+        attendance_data (iterable): Attendance records from the sheet, or a
+            column store of them
+
+    Returns:
+        dict: Attendance count keyed by :func:`attendance_key`
+    """
+    counts = {}
+    column = getattr(attendance_data, "column", None)
+    if column is not None:
+        # A column store: count the distinct (student, user) pairs without building records
+        pairs = Counter(zip(column("student_id"), column("user_id")))
+        for (student_id, user_id), count in pairs.items():
+            key = str(student_id) if student_id is not None else f"user:{user_id}"
+            counts[key] = counts.get(key, 0) + count
+        return counts
+    for record in attendance_data:
+        key = attendance_key(record)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def index_latest_payments(payment_data):
+    """Find the latest payment of every student in a single pass.
+
+    Payments are ordered by their parsed "Payment Date". Rows with an
+    unparseable date sort before every dated row, and row order breaks ties.
+
+    Args:
+        payment_data (iterable): Payment or payment rollup records from the sheet
+
+    Returns:
+        dict: ``(sort_key, amount, payment_date)`` keyed by student ID
+    """
+    latest = {}
+    for row_number, payment in enumerate(payment_data):
+        student_id = "" if payment.student_id is None else str(payment.student_id)
+        sort_key = (payment.paid_on or datetime.min, row_number)
+        current = latest.get(student_id)
+        if current is None or sort_key > current[0]:
+            latest[student_id] = (sort_key, payment.amount, payment.payment_date)
+    return latest
+
+class StudentReportView:
+    """Per-student report aggregates that can be updated row by row.
+
+    The view holds every student, the attendance count per key and the
+    latest payment per student. It is built from whole sheets once and then
+    kept current by applying each newly written row, so producing a report
+    needs no sheet reads. The view itself is not locked; callers serialize
+    updates.
+    """
+
+    def __init__(self):
+        self._students = {}
+        self._attendance_counts = {}
+        self._latest_payments = {}
+        self._payment_rows = 0
+
+    @classmethod
+    def from_records(cls, student_data, attendance_data, payment_data, attendance_totals=None, payment_rollup=()):
+        """Build a view from whole-sheet records in one pass per sheet.
+
+        Args:
+            student_data (iterable): Student records
+            attendance_data (iterable): Attendance records
+            payment_data (list): Payment records, or a column store of them
+            attendance_totals (dict): Attendance counts of rows not in
+                ``attendance_data``, keyed by :func:`attendance_key`
+            payment_rollup (list): Payment rollup records, each carrying a
+                student's latest compacted payment; they count as older than
+                ``payment_data``
+
+        Returns:
+            StudentReportView: The populated view
+        """
+        view = cls()
+        for student in student_data:
+            view.add_student(student)
+        view._attendance_counts = index_attendance(attendance_data)
+        for key, count in (attendance_totals or {}).items():
+            view._attendance_counts[key] = view._attendance_counts.get(key, 0) + count
+        view._latest_payments = index_latest_payments(chain(payment_rollup, payment_data))
+        view._payment_rows = len(payment_rollup) + len(payment_data)
+        return view
+
+    def add_student(self, record):
+        """Apply a newly written student row."""
+        if record.id is None:
+            return
+        self._students[str(record.id)] = record
+
+    def add_attendance(self, record):
+        """Apply a newly written attendance row."""
+        key = attendance_key(record)
+        self._attendance_counts[key] = self._attendance_counts.get(key, 0) + 1
+
+    def add_payment(self, record):
+        """Apply a newly written payment row."""
+        student_id = "" if record.student_id is None else str(record.student_id)
+        sort_key = (record.paid_on or datetime.min, self._payment_rows)
+        self._payment_rows += 1
+        current = self._latest_payments.get(student_id)
+        if current is None or sort_key > current[0]:
+            self._latest_payments[student_id] = (sort_key, record.amount, record.payment_date)
+
+    def report(self):
+        """Return the report rows in registration order.
+
+        Returns:
+            list: A list of dictionaries with student information
+        """
+        report = []
+        for student_id, student in self._students.items():
+            _, latest_payment, payment_date = self._latest_payments.get(student_id, (None, None, "N/A"))
+
+            report.append({
+                'id': student_id,
+                'name': student.name or 'Unknown',
+                'subject': student.subject or 'Unknown',
+                'attendance_count': self._attendance_counts.get(student_id, 0),
+                'last_payment': "N/A" if latest_payment is None else latest_payment,
+                'payment_date': payment_date or "N/A"
+            })
+
+        return report
+
+def build_student_report(student_data, attendance_data, payment_data):
+    """Build the per-student report from the three worksheets.
+
+    Each sheet is read once into a dict index, so the cost grows linearly
+    with the number of rows instead of students × (attendance + payments).
+
+    Args:
+        student_data (iterable): Student records
+        attendance_data (iterable): Attendance records
+        payment_data (list): Payment records
+
+    Returns:
+        list: A list of dictionaries with student information
+    """
+    return StudentReportView.from_records(student_data, attendance_data, payment_data).report()
+
+def rollup_attendance_totals(rollup):
+    """Return the attendance counts of a rollup keyed by :func:`attendance_key`.
+
+    Args:
+        rollup (list): Attendance rollup records
+    """
+    return {record.key: record.count or 0 for record in rollup if record.key}
+
+def rollup_attendance(rollup, attendance_data):
+    """Fold attendance rows into the per-student totals of a rollup.
+
+    Args:
+        rollup (list): Attendance rollup records
+        attendance_data (iterable): Attendance records being compacted
+
+    Returns:
+        list: ``[key, count]`` rows; existing keys keep their position and
+        new keys follow, so the rollup never gets shorter
+    """
+    totals = rollup_attendance_totals(rollup)
+    for key, count in index_attendance(attendance_data).items():
+        totals[key] = totals.get(key, 0) + count
+    return [[key, count] for key, count in totals.items()]
+
+def rollup_payments(rollup, payment_data):
+    """Fold payment rows into the per-student totals of a rollup.
+
+    Rollup records carry the latest payment under the usual ``Payment Date``
+    and ``Amount`` columns and come before the compacted rows, so the
+    latest payment is found exactly as :func:`index_latest_payments` would
+    over the full history.
+
+    Args:
+        rollup (list): Payment rollup records
+        payment_data (iterable): Payment records being compacted
+
+    Returns:
+        list: ``[student_id, payments, total_amount, payment_date, amount]``
+        rows; existing students keep their position and new ones follow
+    """
+    rollup = [record for record in rollup if record.student_id is not None]
+    totals = {}
+    for record in rollup:
+        totals[str(record.student_id)] = [record.payments or 0, record.total_amount or 0]
+    for payment in payment_data:
+        if payment.student_id is None:
+            continue
+        entry = totals.setdefault(str(payment.student_id), [0, 0])
+        entry[0] += 1
+        entry[1] += payment.amount or 0
+    latest = index_latest_payments(chain(rollup, payment_data))
+    return [
+        [student_id, count, total, latest[student_id][2], "" if latest[student_id][1] is None else latest[student_id][1]]
+        for student_id, (count, total) in totals.items()
+    ]
@@ -0,0 +1,98 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+
+# Column titles of the exported report
+EXPORT_HEADER = ["ID", "Ism", "Fan", "Davomatlar soni", "So'ngi to'lov", "To'lov sanasi"]
+
+# Exports larger than this spill from memory to a temporary file on disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+def iter_report_rows(report_data):
+    """Yield the report as spreadsheet rows, header first."""
+    yield EXPORT_HEADER
+    for student in report_data:
+        yield [
+            student['id'],
+            student['name'],
+            student['subject'],
+            student['attendance_count'],
+            student['last_payment'],
+            student['payment_date'],
+        ]
+
+def export_report_csv(report_data):
+    """Stream the report into a CSV file.
+
+    Args:
+        report_data (list): Report rows from ``get_student_report``
+
+    Returns:
+        file: A binary file object positioned at the start
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode="w+b")
+    # utf-8-sig so Excel recognises the Uzbek letters
+    text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    for row in iter_report_rows(report_data):
+        writer.writerow(row)
+    text.flush()
+    text.detach()
+    output.seek(0)
+    return output
+
+def export_report_xlsx(report_data):
+    """Stream the report into an XLSX workbook.
+
+    Uses openpyxl's write-only mode, which writes rows out as they are
+    appended instead of keeping the whole sheet in memory.
+
+    Args:
+        report_data (list): Report rows from ``get_student_report``
+
+    Returns:
+        file: A binary file object positioned at the start
+
+    Raises:
+        ImportError: If openpyxl is not installed
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Hisobot")
+    for row in iter_report_rows(report_data):
+        worksheet.append(row)
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode="w+b")
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+EXPORTERS = {
+    "csv": export_report_csv,
+    "xlsx": export_report_xlsx,
+}
+
+def export_report_file(file_format, report_data):
+    """Write the report to a temporary file and return its path.
+
+    Unlike the exporters above this can run in a worker process, since
+    only the path travels back. The caller deletes the file.
+
+    Args:
+        file_format (str): ``"csv"`` or ``"xlsx"``
+        report_data (list): Report rows from ``get_student_report``
+
+    Returns:
+        str: Path of the written file
+    """
+    fd, path = tempfile.mkstemp(suffix=f".{file_format}")
+    try:
+        with os.fdopen(fd, "wb") as f, EXPORTERS[file_format](report_data) as document:
+            shutil.copyfileobj(document, f)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
@@ -0,0 +1,233 @@
+import asyncio
+import copy
+import logging
+import time
+from datetime import date, datetime, timedelta
+from config import REPORT_SCHEDULE_HOUR, REPORT_SCHEDULE_CHECK_INTERVAL, REPORT_SCHEDULE_SPACING
+from metrics import observe_job
+from report_engine import format_amount, parse_amount
+from storage import get_storage, is_storage_open
+from tenants import tenant_router
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# bot_data keys of the scheduler state per tenant and of the chats the
+# reports are pushed to, each mapped to its tenant
+STATE_KEY = "report_scheduler"
+SUBSCRIBERS_KEY = "report_subscribers"
+
+# Days of totals kept: the weekly window and the day being filled
+KEEP_DAYS = 8
+
+# Columns of the rows returned by ``rows_since``
+ATTENDANCE_TIMESTAMP, ATTENDANCE_STUDENT_ID = 3, 4
+PAYMENT_AMOUNT, PAYMENT_TIMESTAMP = 3, 4
+
+class ActivityTotals:
+    """Attendance and payment totals per day, folded in as rows arrive.
+
+    Rows are counted on the day of their Timestamp, i.e. when they were
+    recorded. ``cursors`` holds the storage cursor of each worksheet, so
+    every run only reads rows added since the previous one. Only the last
+    KEEP_DAYS days are kept; the state is plain data and pickles into
+    ``bot_data``.
+    """
+
+    def __init__(self):
+        # "YYYY-MM-DD" -> {"attendance", "subjects", "payments", "amount"}
+        self.days = {}
+        self.cursors = {}
+
+    def _day(self, timestamp):
+        day = str(timestamp)[:10]
+        totals = self.days.get(day)
+        if totals is None:
+            totals = self.days[day] = {"attendance": 0, "subjects": {}, "payments": 0, "amount": 0}
+        return totals
+
+    def add_attendance(self, row, subject):
+        """Count one attendance row; ``subject`` is None for a self check-in."""
+        totals = self._day(row[ATTENDANCE_TIMESTAMP])
+        totals["attendance"] += 1
+        if subject is not None:
+            totals["subjects"][subject] = totals["subjects"].get(subject, 0) + 1
+
+    def add_payment(self, row):
+        """Count one payment row."""
+        totals = self._day(row[PAYMENT_TIMESTAMP])
+        totals["payments"] += 1
+        totals["amount"] += parse_amount(row[PAYMENT_AMOUNT]) or 0
+
+    def prune(self, today):
+        """Drop the days that fell out of the kept window."""
+        first = (today - timedelta(days=KEEP_DAYS - 1)).isoformat()
+        self.days = {day: totals for day, totals in self.days.items() if day >= first}
+
+    def summary(self, first, last):
+        """Return the totals of the days from ``first`` to ``last`` inclusive."""
+        result = {"attendance": 0, "subjects": {}, "payments": 0, "amount": 0}
+        for day, totals in self.days.items():
+            if first.isoformat() <= day <= last.isoformat():
+                for key in ("attendance", "payments", "amount"):
+                    result[key] += totals[key]
+                for subject, count in totals["subjects"].items():
+                    result["subjects"][subject] = result["subjects"].get(subject, 0) + count
+        return result
+
+def render_summary(title, summary):
+    """Render one summary as ready-to-send message text."""
+    lines = [title, f"Davomat: {summary['attendance']} ta belgi"]
+    for subject, count in sorted(summary["subjects"].items(), key=lambda item: -item[1]):
+        lines.append(f"  • {subject}: {count}")
+    lines.append(f"To'lovlar: {summary['payments']} ta, {format_amount(summary['amount'])} so'm")
+    return "\n".join(lines)
+
+def render_snapshots(totals, day):
+    """Render the daily report of ``day`` and the weekly report ending on it."""
+    week_start = day - timedelta(days=6)
+    weekly = render_summary(f"🗓 Haftalik hisobot ({week_start} – {day}):", totals.summary(week_start, day))
+    lines = [weekly, "", "Kunlar bo'yicha:"]
+    for offset in range(7):
+        current = week_start + timedelta(days=offset)
+        summary = totals.summary(current, current)
+        lines.append(f"{current}: {summary['attendance']} davomat, {summary['payments']} to'lov "
+                     f"({format_amount(summary['amount'])} so'm)")
+    return {
+        "day": day.isoformat(),
+        "daily": render_summary(f"📅 Kunlik hisobot ({day}):", totals.summary(day, day)),
+        "weekly": "\n".join(lines),
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+def get_snapshot(bot_data, kind, tenant=None):
+    """Return a tenant's latest precomputed ``"daily"`` or ``"weekly"`` report text, None before the first run."""
+    state = bot_data.get(STATE_KEY, {}).get(tenant)
+    if not state:
+        return None
+    snapshots = state["snapshots"]
+    return f"{snapshots[kind]}\n\n⏱ Tayyorlangan: {snapshots['generated_at']}"
+
+class ReportScheduler:
+    """Precomputes the daily and weekly summaries off-peak and pushes them.
+
+    Once a day, at ``hour``, rows added since the previous run are folded
+    into :class:`ActivityTotals` and yesterday's daily report and the
+    weekly report ending yesterday are rendered into ``bot_data``. There
+    they are sent to the subscribed chats and served instantly by
+    ``/hisobot kun`` and ``/hisobot hafta``. Every tenant has its own
+    totals and snapshots, and a chat gets the reports of the tenant it
+    subscribed from. A tenant's first run happens right away and is not
+    pushed. Run time and outcome show up in the ``bot_job_*`` metrics.
+
+    Only the default tenant, tenants whose storage is already open and
+    tenants with subscribers are precomputed, so the scheduler neither opens
+    every configured tenant nor churns the tenant pool, and consecutive
+    runs are ``spacing`` seconds apart to spread their Sheets reads.
+    """
+
+    def __init__(self, hour=REPORT_SCHEDULE_HOUR, check_interval=REPORT_SCHEDULE_CHECK_INTERVAL,
+                 spacing=REPORT_SCHEDULE_SPACING):
+        """Create the scheduler.
+
+        Args:
+            hour (int): Hour of the day the reports are precomputed and pushed
+            check_interval (float): Seconds between checks whether a run is due
+            spacing (float): Seconds between the runs of two tenants
+        """
+        self._hour = hour
+        self._check_interval = check_interval
+        self._spacing = spacing
+        # Failed runs are retried after this many checks instead of every check
+        self._retry_checks = 10
+
+    def precompute(self, totals, today, tenant=None):
+        """Fold a tenant's rows added since the previous run into ``totals`` and render the snapshots.
+
+        Blocking; runs in a worker thread on a private copy of the totals.
+        """
+        storage = get_storage(tenant)
+        # The first run reads back over the whole kept window, last month included
+        since = today - timedelta(days=KEEP_DAYS - 1)
+        rows, totals.cursors["attendance"] = storage.rows_since("attendance", totals.cursors.get("attendance"), since)
+        for row in rows:
+            student_id = str(row[ATTENDANCE_STUDENT_ID]).strip() if len(row) > ATTENDANCE_STUDENT_ID else ""
+            student = storage.get_student(student_id) if student_id else None
+            totals.add_attendance(row, student["subject"] if student else None)
+        payments, totals.cursors["payments"] = storage.rows_since("payments", totals.cursors.get("payments"), since)
+        for row in payments:
+            totals.add_payment(row)
+        totals.prune(today)
+        logger.info(f"Folded {len(rows)} attendance and {len(payments)} payment rows into the report totals")
+        return render_snapshots(totals, today - timedelta(days=1))
+
+    async def run_once(self, application, tenant=None, deliver=True):
+        """Precompute a tenant's snapshots now and, if ``deliver``, push them to its subscribers.
+
+        Returns:
+            bool: True if the snapshots were precomputed
+        """
+        states = application.bot_data.setdefault(STATE_KEY, {})
+        state = states.get(tenant)
+        # bot_data may be pickled by the persistence while the thread works
+        totals = copy.deepcopy(state["totals"]) if state else ActivityTotals()
+        started = time.perf_counter()
+        try:
+            snapshots = await asyncio.to_thread(self.precompute, totals, date.today(), tenant)
+        except Exception as e:
+            observe_job("report_precompute", time.perf_counter() - started, "error")
+            logger.error(f"Failed to precompute reports of tenant {tenant}: {e}")
+            return False
+        observe_job("report_precompute", time.perf_counter() - started, "ok")
+        states[tenant] = {"totals": totals, "snapshots": snapshots}
+        if deliver:
+            await self.deliver(application, snapshots, tenant)
+        return True
+
+    async def deliver(self, application, snapshots, tenant=None):
+        """Send the daily and weekly report to every chat subscribed to a tenant's reports."""
+        started = time.perf_counter()
+        failed = 0
+        subscribers = [
+            chat_id for chat_id, subscribed in application.bot_data.get(SUBSCRIBERS_KEY, {}).items()
+            if subscribed == tenant
+        ]
+        for chat_id in subscribers:
+            try:
+                await application.bot.send_message(chat_id, snapshots["daily"])
+                await application.bot.send_message(chat_id, snapshots["weekly"])
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to send the scheduled report to chat {chat_id}: {e}")
+        observe_job("report_delivery", time.perf_counter() - started, "error" if failed else "ok")
+        logger.info(f"Sent scheduled reports to {len(subscribers) - failed} of {len(subscribers)} chats")
+
+    def due_tenants(self, application):
+        """Return the tenants worth precomputing: the default one, open ones and subscribed ones."""
+        subscribed = set(application.bot_data.get(SUBSCRIBERS_KEY, {}).values())
+        return [None] + [
+            tenant for tenant in tenant_router.tenants
+            if tenant in subscribed or is_storage_open(tenant)
+        ]
+
+    async def run(self, application):
+        """Run forever as a task on the bot's event loop, one tenant after another."""
+        skip = {}
+        while True:
+            ran = False
+            for tenant in self.due_tenants(application):
+                if skip.get(tenant):
+                    skip[tenant] -= 1
+                    continue
+                state = application.bot_data.get(STATE_KEY, {}).get(tenant)
+                now = datetime.now()
+                yesterday = (now.date() - timedelta(days=1)).isoformat()
+                if state is None or (state["snapshots"]["day"] != yesterday and now.hour >= self._hour):
+                    if ran:
+                        await asyncio.sleep(self._spacing)
+                    ran = True
+                    if not await self.run_once(application, tenant, deliver=state is not None):
+                        skip[tenant] = self._retry_checks
+            await asyncio.sleep(self._check_interval)
+
+report_scheduler = ReportScheduler()
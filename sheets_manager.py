@@ -1,25 +1,891 @@
 import os
 import json
+import fcntl
 import logging
-import tempfile
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from config import GOOGLE_SHEETS_URL, GOOGLE_SHEETS_CREDENTIALS
+import requests
+from google.auth.transport.requests import Request as AuthRequest
+from google.oauth2.service_account import Credentials
+from config import (
+    GOOGLE_SHEETS_URL,
+    GOOGLE_SHEETS_CREDENTIALS,
+    SHEETS_MAX_WORKERS,
+    SHEETS_CALL_TIMEOUT,
+    SHEETS_JOURNAL_PATH,
+    SHEETS_BATCH_SIZE,
+    SHEETS_FLUSH_INTERVAL,
+    STUDENT_ID_SEQUENCE_PATH,
+    REPORT_RECONCILE_INTERVAL,
+    SHEETS_CACHE_TTL,
+    SHEETS_CACHE_MAX_CELLS,
+    SHEETS_QUOTA_PER_MINUTE,
+    SHEETS_QUOTA_BURST,
+    SHEETS_MAX_RETRIES,
+    SHEETS_BREAKER_THRESHOLD,
+    SHEETS_BREAKER_COOLDOWN,
+    SHEETS_TOKEN_REFRESH_MARGIN,
+)
+from idempotency import attendance_dedup_key, payment_dedup_key
+from metrics import observe_recovery, observe_sheets_call
+from records import (
+    AttendanceRecord,
+    AttendanceRollupRecord,
+    ColumnStore,
+    PaymentRecord,
+    PaymentRollupRecord,
+    StudentRecord,
+    normalize_id,
+)
+from report_engine import StudentReportView, rollup_attendance, rollup_attendance_totals, rollup_payments
+from storage import DuplicateSubmissionError, StorageBackend, StorageUnavailableError
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-class GoogleSheetsManager:
-    """Manager for Google Sheets operations."""
+# Header row of each worksheet; new columns are only ever added at the end
+HEADERS = {
+    "attendance": ["User ID", "Username", "Action", "Timestamp", "Student ID"],
+    "students": ["ID", "Registered By", "Name", "Phone", "Subject", "Timestamp"],
+    "payments": ["Recorded By", "Student ID", "Payment Date", "Amount", "Timestamp"],
+}
+
+# Worksheets written to one shard per month, e.g. attendance_2026_10
+PARTITIONED = ("attendance", "payments")
+SHARD_PATTERN = re.compile(r"^(attendance|payments)_(\d{4}_\d{2})$")
+
+# Header row of the rollup every closed shard of a worksheet is compacted into
+ROLLUP_HEADERS = {
+    "attendance_rollup": ["Key", "Count", "Month"],
+    "payments_rollup": ["Student ID", "Payments", "Total Amount", "Payment Date", "Amount", "Month"],
+}
+
+# How the rows of closed shards are folded into each rollup
+ROLLUP_BUILDERS = {
+    "attendance": rollup_attendance,
+    "payments": rollup_payments,
+}
+
+def month_key(when=None):
+    """Return the ``YYYY_MM`` shard suffix of a date, the current month by default."""
+    return (when or datetime.now()).strftime("%Y_%m")
+
+def shard_name(name, month=None):
+    """Return the worksheet holding the rows of ``name`` written in ``month``."""
+    return f"{name}_{month or month_key()}"
+
+def rollup_name(name):
+    """Return the worksheet holding the compacted totals of ``name``."""
+    return f"{name}_rollup"
+
+def sheet_headers(title):
+    """Return the header row of a worksheet, shards and rollups included."""
+    match = SHARD_PATTERN.match(title)
+    if match:
+        return HEADERS[match.group(1)]
+    return HEADERS.get(title) or ROLLUP_HEADERS.get(title)
+
+# Typed record of each worksheet's rows
+RECORD_TYPES = {
+    "attendance": AttendanceRecord,
+    "students": StudentRecord,
+    "payments": PaymentRecord,
+    "attendance_rollup": AttendanceRollupRecord,
+    "payments_rollup": PaymentRollupRecord,
+}
+
+def record_type(title):
+    """Return the record class of a worksheet, shards and rollups included."""
+    match = SHARD_PATTERN.match(title)
+    return RECORD_TYPES[match.group(1) if match else title]
+
+# Priority classes of Sheets calls, lower runs first
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+PRIORITY_BACKGROUND = 2
+
+# HTTP statuses worth retrying: quota exceeded and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def is_retryable(error):
+    """Return True for quota, transient server and network errors."""
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in RETRYABLE_STATUSES
+    return isinstance(error, requests.exceptions.RequestException)
+
+# Server errors after which a request may or may not have been applied
+AMBIGUOUS_STATUSES = {500, 502, 503, 504}
+
+def is_ambiguous(error):
+    """Return True if a failed call may still have been applied by Google.
+    
+    A 429 is rejected before any work is done and a connect timeout never
+    reached the server, but a server error, a read timeout or a dropped
+    connection can follow a request that was carried out.
+    """
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in AMBIGUOUS_STATUSES
+    return (isinstance(error, requests.exceptions.RequestException)
+            and not isinstance(error, requests.exceptions.ConnectTimeout))
+
+def same_cells(row, values):
+    """Return True if a row we sent reads back as ``values`` from the sheet."""
+    cells = ["" if value is None else str(value) for value in row]
+    values = list(values) + [""] * (len(cells) - len(values))
+    return cells == values[:len(cells)] and not any(values[len(cells):])
+
+class SheetsScheduler:
+    """Central gate every Google Sheets API call goes through.
+    
+    Calls draw from a token bucket refilled at ``rate_per_minute``, matched to
+    the per-minute Sheets quota, and a call only gets a token when no call
+    of a higher priority class is waiting, so user-facing writes go before
+    /hisobot reads and reads before background reconciliation. Within a
+    priority class, tenants sharing the scheduler take turns: the tenant
+    served last goes behind every other tenant waiting, so one busy
+    learning center cannot starve the rest. Quota (429)
+    and transient errors are retried with jittered exponential backoff;
+    calls that are not idempotent, such as appends, are not retried after
+    an error that may have followed a successful request. After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast with :class:`StorageUnavailableError` for ``cooldown``
+    seconds, after which a trial call is let through.
+    """
+    
+    def __init__(self, rate_per_minute=SHEETS_QUOTA_PER_MINUTE, burst=SHEETS_QUOTA_BURST,
+                 max_retries=SHEETS_MAX_RETRIES, failure_threshold=SHEETS_BREAKER_THRESHOLD,
+                 cooldown=SHEETS_BREAKER_COOLDOWN, base_delay=1.0, max_delay=32.0):
+        """Create the scheduler.
+        
+        Args:
+            rate_per_minute (float): Sustained number of calls allowed per minute
+            burst (int): Calls that may be made back to back after an idle period
+            max_retries (int): Retries of a call that hit a quota or transient error
+            failure_threshold (int): Consecutive failures that open the circuit
+            cooldown (float): Seconds the circuit stays open
+            base_delay (float): First backoff delay in seconds
+            max_delay (float): Upper bound of a single backoff delay
+        """
+        self._rate = rate_per_minute / 60.0
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        # Per priority class: tenant -> calls waiting, in turn order
+        self._waiting = [OrderedDict(), OrderedDict(), OrderedDict()]
+        self._cond = threading.Condition()
+        self._max_retries = max_retries
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._failures = 0
+        self._opened_at = None
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+    
+    def _acquire(self, priority, tenant):
+        """Block until a token is free, no higher priority call is waiting and it is ``tenant``'s turn."""
+        with self._cond:
+            queue = self._waiting[priority]
+            queue[tenant] = queue.get(tenant, 0) + 1
+            try:
+                while True:
+                    self._refill()
+                    if self._tokens >= 1 and not any(self._waiting[:priority]) and next(iter(queue)) == tenant:
+                        self._tokens -= 1
+                        queue.move_to_end(tenant)
+                        return
+                    self._cond.wait(max((1 - self._tokens) / self._rate, 0.01))
+            finally:
+                queue[tenant] -= 1
+                if not queue[tenant]:
+                    del queue[tenant]
+                self._cond.notify_all()
+    
+    def _check_circuit(self):
+        with self._cond:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self._cooldown:
+                raise StorageUnavailableError(
+                    "Google Sheets is unavailable after repeated errors, calls are paused"
+                )
+            # Half-open: let this call through as a trial
+            self._opened_at = None
+            self._failures = self._failure_threshold - 1
+    
+    def _record(self, success):
+        with self._cond:
+            if success:
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._failures >= self._failure_threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                logger.error(f"Opening Sheets circuit for {self._cooldown}s after {self._failures} failures")
+    
+    def call(self, priority, func, *args, idempotent=True, **kwargs):
+        """Run one Sheets API call under the quota, retrying transient errors.
+        
+        Args:
+            priority (int): One of the PRIORITY_* classes
+            func (callable): The gspread call
+            idempotent (bool): False for calls that must not be repeated
+                blindly; they are only retried after errors that prove the
+                call was not applied, see :func:`is_ambiguous`
+            *args, **kwargs: Passed on to ``func``
+        
+        Returns:
+            The result of ``func``
+        """
+        return self.call_for(None, priority, func, *args, idempotent=idempotent, **kwargs)
+    
+    def call_for(self, tenant, priority, func, *args, idempotent=True, **kwargs):
+        """Run one Sheets API call on behalf of ``tenant``; see :meth:`call`."""
+        operation = getattr(func, "__name__", "call")
+        for attempt in range(self._max_retries + 1):
+            self._check_circuit()
+            self._acquire(priority, tenant)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                observe_sheets_call(operation, time.perf_counter() - started, "error")
+                if not is_retryable(e):
+                    raise
+                self._record(False)
+                if attempt == self._max_retries or (not idempotent and is_ambiguous(e)):
+                    raise
+                delay = min(self._max_delay, self._base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Sheets call failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                observe_sheets_call(operation, time.perf_counter() - started, "ok")
+                self._record(True)
+                return result
+    
+    def stats(self):
+        """Return the scheduler's queue and circuit state."""
+        with self._cond:
+            self._refill()
+            return {
+                "tokens": self._tokens,
+                "waiting_write": sum(self._waiting[PRIORITY_WRITE].values()),
+                "waiting_read": sum(self._waiting[PRIORITY_READ].values()),
+                "waiting_background": sum(self._waiting[PRIORITY_BACKGROUND].values()),
+                "waiting_tenants": len(set().union(*self._waiting)),
+                "consecutive_failures": self._failures,
+                "circuit_open": self._opened_at is not None,
+            }
+    
+    def for_tenant(self, tenant):
+        """Return a handle that makes every call on behalf of ``tenant``."""
+        return TenantScheduler(self, tenant)
+
+class TenantScheduler:
+    """One tenant's view of a shared :class:`SheetsScheduler`.
+    
+    Has the scheduler's ``call`` and ``stats``, so a manager uses it
+    without knowing it shares the quota with other tenants.
+    """
+    
+    def __init__(self, scheduler, tenant):
+        self._scheduler = scheduler
+        self._tenant = tenant
+    
+    def call(self, priority, func, *args, idempotent=True, **kwargs):
+        """Run one Sheets API call on behalf of this tenant; see :meth:`SheetsScheduler.call`."""
+        return self._scheduler.call_for(self._tenant, priority, func, *args, idempotent=idempotent, **kwargs)
+    
+    def stats(self):
+        """Return the shared scheduler's queue and circuit state."""
+        return self._scheduler.stats()
+
+# OAuth scopes needed to read and write the spreadsheet
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+class SheetsSession:
+    """Service account credentials and one authorized gspread client.
     
-    def __init__(self):
-        """Initialize the Google Sheets connection."""
+    The credentials are parsed once, in memory, and the client keeps a single
+    keep-alive HTTP session that every manager sharing this object reuses.
+    The access token is refreshed ahead of its expiry instead of on a failed
+    call.
+    """
+    
+    def __init__(self, credentials_json=GOOGLE_SHEETS_CREDENTIALS, credentials_path="credentials.json",
+                 refresh_margin=SHEETS_TOKEN_REFRESH_MARGIN):
+        """Create the session; nothing is loaded until first use.
+        
+        Args:
+            credentials_json (str): Service account key as a JSON string
+            credentials_path (str): Key file used when no JSON string is given
+            refresh_margin (float): Seconds before expiry at which the token is refreshed
+        """
+        self._credentials_json = credentials_json
+        self._credentials_path = credentials_path
+        self._refresh_margin = timedelta(seconds=refresh_margin)
+        self._credentials = None
         self._client = None
+        self._lock = threading.Lock()
+    
+    def _load_credentials(self):
+        if self._credentials_json:
+            logger.info("Found Google Sheets credentials in environment variables")
+            try:
+                info = json.loads(self._credentials_json)
+            except ValueError:
+                raise ValueError("Google Sheets credentials format issue - must be a valid JSON string")
+            return Credentials.from_service_account_info(info, scopes=SCOPES)
+        
+        logger.info("Using credentials.json file as fallback")
+        if not os.path.exists(self._credentials_path):
+            raise ValueError("No valid credentials found. Please provide GOOGLE_SHEETS_CREDENTIALS or ensure credentials.json exists.")
+        return Credentials.from_service_account_file(self._credentials_path, scopes=SCOPES)
+    
+    def client(self):
+        """Return the shared gspread client, creating it on first use."""
+        with self._lock:
+            if self._client is None:
+                if self._credentials is None:
+                    self._credentials = self._load_credentials()
+                self._client = gspread.authorize(self._credentials)
+            return self._client
+    
+    def ensure_fresh(self):
+        """Refresh the access token if it expires within the refresh margin."""
+        credentials = self._credentials
+        if credentials is None:
+            return
+        expiry = credentials.expiry
+        # google-auth keeps expiry as a naive UTC datetime
+        if credentials.token is None or (expiry and expiry - datetime.utcnow() < self._refresh_margin):
+            self.refresh_token()
+    
+    def refresh_token(self):
+        """Fetch a new access token for the parsed credentials."""
+        with self._lock:
+            if self._credentials is not None:
+                self._credentials.refresh(AuthRequest())
+                logger.info("Refreshed Google Sheets access token")
+    
+    def reset_connections(self):
+        """Drop pooled HTTP connections; the session reconnects on next use."""
+        with self._lock:
+            if self._client is None:
+                return
+            http_client = getattr(self._client, "http_client", self._client)
+            http_client.session.close()
+            logger.info("Reset Google Sheets HTTP connections")
+
+class WriteBehindBuffer:
+    """Collects rows per worksheet and appends them to Google Sheets in batches.
+    
+    Every row is first written to a local append-only journal and fsynced,
+    so a row accepted by :meth:`append` survives a crash and is replayed the
+    next time the buffer is created. A background thread flushes each
+    worksheet with a single ``append_rows`` call once ``batch_size`` rows are
+    waiting or every ``flush_interval`` seconds. Delivery is at-least-once: a
+    crash between a successful flush and its journal acknowledgement will
+    send that batch again on replay.
+    """
+    
+    def __init__(self, journal_path, flush_func, batch_size=SHEETS_BATCH_SIZE,
+                 flush_interval=SHEETS_FLUSH_INTERVAL):
+        """Open the journal and start the flush thread.
+        
+        Args:
+            journal_path (str): Path of the append-only journal file
+            flush_func (callable): Called as ``flush_func(name, rows)`` to write a batch
+            batch_size (int): Number of waiting rows that triggers an early flush
+            flush_interval (float): Maximum seconds a row waits before being flushed
+        """
+        self._journal_path = journal_path
+        self._flush_func = flush_func
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        
+        directory = os.path.dirname(journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._replay()
+        self._journal = open(journal_path, "a", encoding="utf-8")
+        
+        self._thread = threading.Thread(target=self._run, name="sheets-flush", daemon=True)
+        self._thread.start()
+        if self._pending:
+            self._wakeup.set()
+    
+    def _replay(self):
+        """Load rows from the journal that were never acknowledged."""
+        if not os.path.exists(self._journal_path):
+            return
+        
+        entries = []
+        acked = {}
+        with open(self._journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write was never confirmed
+                    logger.warning("Skipping corrupt journal line")
+                    continue
+                if "ack" in entry:
+                    acked[entry["sheet"]] = max(acked.get(entry["sheet"], 0), entry["ack"])
+                else:
+                    entries.append(entry)
+        
+        for entry in entries:
+            self._seq = max(self._seq, entry["seq"])
+            if entry["seq"] > acked.get(entry["sheet"], 0):
+                self._pending.setdefault(entry["sheet"], []).append((entry["seq"], entry["row"]))
+        
+        replayed = sum(len(rows) for rows in self._pending.values())
+        if replayed:
+            logger.info(f"Replaying {replayed} queued rows from {self._journal_path}")
+    
+    def _write_journal(self, *entries):
+        self._journal.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+    
+    def append(self, name, row):
+        """Durably queue a row for the named worksheet.
+        
+        Args:
+            name (str): The worksheet name
+            row (list): The row values
+        """
+        self.extend(name, [row])
+    
+    def extend(self, name, rows):
+        """Durably queue several rows for the named worksheet with one fsync.
+        
+        The rows are queued together, so they always reach the sheet in the
+        same ``append_rows`` call.
+        
+        Args:
+            name (str): The worksheet name
+            rows (list): The rows, each a list of values
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write-behind buffer is closed")
+            entries = []
+            for row in rows:
+                self._seq += 1
+                entries.append({"seq": self._seq, "sheet": name, "row": row})
+            self._write_journal(*entries)
+            pending = self._pending.setdefault(name, [])
+            pending.extend((entry["seq"], entry["row"]) for entry in entries)
+            if len(pending) >= self._batch_size:
+                self._wakeup.set()
+    
+    def pending_count(self, name):
+        """Return the number of rows queued for a worksheet but not yet written."""
+        with self._lock:
+            return len(self._pending.get(name, ()))
+    
+    def paused(self):
+        """Return a context manager that holds off flushes while it is entered."""
+        return self._flush_lock
+    
+    def pending_rows(self, name):
+        """Return a copy of the rows queued for a worksheet but not yet written."""
+        with self._lock:
+            return [row for _, row in self._pending.get(name, ())]
+    
+    def flush(self):
+        """Write every queued row to Google Sheets, one batch per worksheet.
+        
+        Worksheets whose batch fails keep their rows for the next attempt.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batches = {name: list(rows) for name, rows in self._pending.items() if rows}
+            
+            for name, batch in batches.items():
+                try:
+                    self._flush_func(name, [row for _, row in batch])
+                except Exception as e:
+                    logger.error(f"Failed to flush {len(batch)} rows to {name}: {e}")
+                    continue
+                
+                with self._lock:
+                    # Rows appended during the flush stay queued behind this batch
+                    del self._pending[name][:len(batch)]
+                    self._write_journal({"ack": batch[-1][0], "sheet": name})
+                logger.info(f"Flushed {len(batch)} rows to {name}")
+            
+            self._compact()
+    
+    def _compact(self):
+        """Truncate the journal once every row in it has been acknowledged."""
+        with self._lock:
+            if any(self._pending.values()):
+                return
+            self._journal.truncate(0)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+    
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            self.flush()
+    
+    def close(self):
+        """Flush the remaining rows and stop the background thread."""
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._journal.close()
+        self._wakeup.set()
+
+class WriteThrough:
+    """Stand-in for :class:`WriteBehindBuffer` that writes rows straight away.
+    
+    Rows go to Google in the calling thread with one ``append_rows`` call;
+    nothing is journaled and no flush thread is started. For managers that
+    only mirror another system of record, which keeps its own queue.
+    """
+    
+    def __init__(self, flush_func):
+        """Create the writer.
+        
+        Args:
+            flush_func (callable): Called as ``flush_func(name, rows)`` to write a batch
+        """
+        self._flush_func = flush_func
+        self._flush_lock = threading.Lock()
+    
+    def append(self, name, row):
+        """Write a row to the named worksheet."""
+        self.extend(name, [row])
+    
+    def extend(self, name, rows):
+        """Write several rows to the named worksheet with one call."""
+        with self._flush_lock:
+            self._flush_func(name, rows)
+    
+    def pending_count(self, name):
+        """Return 0: no row ever waits."""
+        return 0
+    
+    def paused(self):
+        """Return a context manager that holds off writes while it is entered."""
+        return self._flush_lock
+    
+    def pending_rows(self, name):
+        """Return an empty list: no row ever waits."""
+        return []
+    
+    def flush(self):
+        """Do nothing: every row is already written."""
+    
+    def close(self):
+        """Do nothing: there is no thread or journal to close."""
+
+class IdSequence:
+    """Persistent, atomic counter used to allocate student IDs.
+    
+    The last issued ID lives in a small local file. It is seeded once by
+    ``seed_func`` and afterwards every allocation is a local read-increment-
+    write under an exclusive file lock, so IDs stay unique across threads
+    and processes without reading the sheet again.
+    """
+    
+    def __init__(self, path, seed_func):
+        """Create the sequence.
+        
+        Args:
+            path (str): File holding the last issued ID
+            seed_func (callable): Returns the highest ID already in use
+        """
+        self._path = path
+        self._seed_func = seed_func
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    def _read(self):
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def _write(self, value):
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(str(value))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path)
+    
+    def _read_or_seed(self):
+        current = self._read()
+        if current is None:
+            current = self._seed_func()
+            self._write(current)
+            logger.info(f"Seeded student ID sequence at {current}")
+        return current
+    
+    def seed(self):
+        """Seed the sequence now if it has never been seeded."""
+        with self._lock, open(f"{self._path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._read_or_seed()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def next(self):
+        """Allocate and return the next ID as a string."""
+        with self._lock, open(f"{self._path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                current = self._read_or_seed()
+                value = current + 1
+                self._write(value)
+                return str(value)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class WorksheetRowCache:
+    """Read-through cache of worksheet values with cheap staleness checks.
+    
+    An entry younger than ``ttl`` seconds is served as is. An older entry is
+    revalidated by comparing the spreadsheet revision returned by ``probe``
+    (a single small metadata call) and is only fetched again when the
+    revision has changed. Entries are evicted least recently used first once
+    the cached cells exceed ``max_cells``.
+    """
+    
+    # Revision of an entry patched with this process's own write; the next
+    # probe tells its new revision
+    OWN_WRITE = object()
+    
+    def __init__(self, probe, ttl=SHEETS_CACHE_TTL, max_cells=SHEETS_CACHE_MAX_CELLS):
+        """Create an empty cache.
+        
+        Args:
+            probe (callable): Returns the current revision of the spreadsheet
+            ttl (float): Seconds an entry is trusted without a revision check
+            max_cells (int): Upper bound on the number of cached cells
+        """
+        self._probe = probe
+        self._ttl = ttl
+        self._max_cells = max_cells
+        self._entries = OrderedDict()
+        self._cells = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+    
+    def get(self, name, fetch, refresh=False, probe=None):
+        """Return the values of a worksheet, fetching them only when needed.
+        
+        Args:
+            name (str): The worksheet name
+            fetch (callable): Reads every value of the worksheet
+            refresh (bool): Skip the cache and always fetch
+            probe (callable): Revision check to use instead of the default one
+        
+        Returns:
+            list: The worksheet values, header row included
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and not refresh and now - entry["checked_at"] < self._ttl:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return entry["values"]
+        
+        revision = (probe or self._probe)()
+        if entry is not None and not refresh and entry["revision"] is self.OWN_WRITE:
+            with self._lock:
+                entry["revision"] = revision
+        if entry is not None and not refresh and revision == entry["revision"]:
+            with self._lock:
+                entry["checked_at"] = now
+                self.hits += 1
+                self.revalidations += 1
+            return entry["values"]
+        
+        # The revision is read before the values, so a change made between the
+        # two calls is noticed by the next check
+        values = fetch()
+        with self._lock:
+            self.misses += 1
+            self._store(name, values, revision, now)
+        return values
+    
+    def _store(self, name, values, revision, now):
+        self._discard(name)
+        cells = sum(len(row) for row in values)
+        if cells > self._max_cells:
+            self.evictions += 1
+            return
+        self._entries[name] = {"values": values, "revision": revision, "checked_at": now, "cells": cells}
+        self._cells += cells
+        while self._cells > self._max_cells:
+            _, evicted = self._entries.popitem(last=False)
+            self._cells -= evicted["cells"]
+            self.evictions += 1
+    
+    def _discard(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self._cells -= entry["cells"]
+    
+    def patch(self, name, rows):
+        """Apply rows this process appended to the cached values.
+        
+        Only the written worksheet's entry is patched, and only if it was
+        checked within ``ttl``: it adopts whatever revision the next check
+        observes, so our own writes neither force a refetch of it nor cost a
+        metadata call each. A manual edit to that worksheet between its last
+        check and the next one is therefore seen at the next forced refresh.
+        Every other entry keeps its revision and notices any change, ours
+        included, at its next check. An entry older than ``ttl`` is dropped
+        instead and fetched again when next read.
+        
+        Args:
+            name (str): The worksheet that was appended to
+            rows (list): The appended rows
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return
+            if time.monotonic() - entry["checked_at"] >= self._ttl:
+                self._discard(name)
+                return
+            values = entry["values"] + [list(row) for row in rows]
+            self._store(name, values, self.OWN_WRITE, entry["checked_at"])
+    
+    def invalidate(self, name=None):
+        """Drop one worksheet, or every worksheet, from the cache."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                self._cells = 0
+            else:
+                self._discard(name)
+    
+    def stats(self):
+        """Return the cache counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "revalidations": self.revalidations,
+                "entries": len(self._entries),
+                "cells": self._cells,
+            }
+
+def values_to_records(name, values):
+    """Parse worksheet values into a column store of typed records.
+    
+    Columns are resolved from the values' own header row once, so a sheet
+    whose columns were moved by hand still parses.
+    """
+    return ColumnStore.from_values(record_type(name), values)
+
+# How a newly written row of each worksheet updates the report view
+VIEW_APPLIERS = {
+    "attendance": StudentReportView.add_attendance,
+    "students": StudentReportView.add_student,
+    "payments": StudentReportView.add_payment,
+}
+
+class GoogleSheetsManager(StorageBackend):
+    """Manager for Google Sheets operations."""
+    
+    def __init__(self, max_workers=SHEETS_MAX_WORKERS, call_timeout=SHEETS_CALL_TIMEOUT,
+                 journal_path=SHEETS_JOURNAL_PATH, id_sequence_path=STUDENT_ID_SEQUENCE_PATH,
+                 reconcile_interval=REPORT_RECONCILE_INTERVAL, scheduler=None, session=None,
+                 sheets_url=GOOGLE_SHEETS_URL, executor=None, cache_max_cells=SHEETS_CACHE_MAX_CELLS):
+        """Initialize the Google Sheets connection.
+        
+        Args:
+            max_workers (int): Size of the thread pool used by the async API
+            call_timeout (float): Seconds an async call may take before it times out
+            journal_path (str): Journal file backing the write-behind buffer,
+                None to write rows straight away without a journal or flush thread
+            id_sequence_path (str): File holding the last issued student ID
+            reconcile_interval (float): Seconds between rebuilds of the report view
+                from the sheet, 0 disables the background rebuild
+            scheduler (SheetsScheduler): Quota scheduler, a private one when omitted
+            session (SheetsSession): Credentials and HTTP session, a private one when omitted
+            sheets_url (str): URL of the spreadsheet
+            executor (ThreadPoolExecutor): Thread pool behind the async API, a private one when omitted
+            cache_max_cells (int): Most cells the row cache holds
+        """
+        super().__init__(max_workers, call_timeout, executor)
+        self._sheets_url = sheets_url
+        self._session = session or SheetsSession()
         self._spreadsheet = None
         self._worksheets = {}
+        # Titles of every worksheet in the spreadsheet, listed on first use
+        self._titles = None
+        # Guards the connection and the worksheet cache across pool threads
+        self._lock = threading.RLock()
+        # Every API call is paced by the quota scheduler
+        self._scheduler = scheduler or SheetsScheduler()
+        # Appends are journaled locally and written to Google in batches,
+        # unless this manager only mirrors a store with a queue of its own
+        if journal_path is None:
+            self._buffer = WriteThrough(self.append_rows)
+        else:
+            self._buffer = WriteBehindBuffer(journal_path, self.append_rows)
+        # Worksheet -> (title, rows) of an append that failed after possibly being applied
+        self._unconfirmed = {}
+        self._student_ids = IdSequence(id_sequence_path, self._highest_student_id)
+        # Worksheet values, shared by every read path
+        self._cache = WorksheetRowCache(self._spreadsheet_revision, max_cells=cache_max_cells)
+        # Report aggregates, updated by every write and rebuilt from the sheet
+        # periodically to pick up manual edits
+        self._view = None
+        self._view_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # Partitioned worksheet -> (rows, rows_since cursor) kept for the analytics
+        self._exported = {}
+        self._export_lock = threading.Lock()
+        self._reconcile_interval = reconcile_interval
+        self._closed = threading.Event()
+        if reconcile_interval:
+            threading.Thread(target=self._reconcile_loop, name="sheets-reconcile", daemon=True).start()
         
     def _get_worksheet(self, name, create_if_missing=True):
         """Get a specific worksheet by name, creating it if it doesn't exist."""
+        with self._lock:
+            return self._get_worksheet_locked(name, create_if_missing)
+    
+    def _get_worksheet_locked(self, name, create_if_missing):
         # Connect to sheets if not already connected
         if not self._spreadsheet:
             self._connect_to_sheets()
@@ -30,258 +896,729 @@ class GoogleSheetsManager:
             
         # Try to find the worksheet
         try:
-            worksheet = self._spreadsheet.worksheet(name)
+            worksheet = self._call(PRIORITY_WRITE, self._spreadsheet.worksheet, name)
+            self._upgrade_headers(name, worksheet)
             self._worksheets[name] = worksheet
+            if self._titles is not None:
+                self._titles.add(name)
             return worksheet
         except gspread.exceptions.WorksheetNotFound:
             if create_if_missing:
                 # Create a new worksheet
-                worksheet = self._spreadsheet.add_worksheet(title=name, rows=100, cols=20)
+                worksheet = self._call(
+                    PRIORITY_WRITE, self._spreadsheet.add_worksheet, title=name, rows=100, cols=20,
+                    idempotent=False,
+                )
                 
-                # Add headers based on worksheet type
-                if name == "attendance":
-                    worksheet.append_row(["User ID", "Username", "Action", "Timestamp"])
-                elif name == "students":
-                    worksheet.append_row(["ID", "Registered By", "Name", "Phone", "Subject", "Timestamp"])
-                elif name == "payments":
-                    worksheet.append_row(["Recorded By", "Student ID", "Payment Date", "Amount", "Timestamp"])
+                # Add headers based on worksheet type; the new sheet is empty, so
+                # writing them at A1 is safe to repeat
+                headers = sheet_headers(name)
+                if headers:
+                    self._call(PRIORITY_WRITE, worksheet.update, range_name="A1", values=[headers])
                 
                 self._worksheets[name] = worksheet
+                if self._titles is not None:
+                    self._titles.add(name)
                 logger.info(f"Created new worksheet: {name}")
                 return worksheet
             else:
                 raise
     
+    def _upgrade_headers(self, name, worksheet):
+        """Add header cells for columns introduced after the sheet was created."""
+        expected = sheet_headers(name)
+        if not expected:
+            return
+        header = self._call(PRIORITY_WRITE, worksheet.row_values, 1)
+        if header and header == expected[:len(header)] and len(header) < len(expected):
+            for column in range(len(header), len(expected)):
+                self._call(PRIORITY_WRITE, worksheet.update_cell, 1, column + 1, expected[column])
+            logger.info(f"Added columns {expected[len(header):]} to worksheet {name}")
+    
+    def _worksheet_titles(self, refresh=False):
+        """Return the titles of every worksheet, listed once and kept current by this process.
+        
+        Args:
+            refresh (bool): List the worksheets again, e.g. to see shards added elsewhere
+        """
+        with self._lock:
+            if not self._spreadsheet:
+                self._connect_to_sheets()
+            if self._titles is None or refresh:
+                worksheets = self._call(PRIORITY_READ, self._spreadsheet.worksheets)
+                self._titles = {worksheet.title for worksheet in worksheets}
+            return set(self._titles)
+    
+    def _forget_worksheet(self, name):
+        """Drop a worksheet handle that no longer resolves."""
+        with self._lock:
+            self._worksheets.pop(name, None)
+            if self._titles is not None:
+                self._titles.discard(name)
+    
+    def _call(self, priority, func, *args, **kwargs):
+        """Make one Sheets API call through the scheduler with a fresh token."""
+        self._session.ensure_fresh()
+        return self._scheduler.call(priority, func, *args, **kwargs)
+    
     def _connect_to_sheets(self):
-        """Connect to Google Sheets using service account credentials."""
-        try:
-            # Define the scope
-            scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-            
-            # Check if we have credentials in environment variable
-            temp_creds_path = None
-            use_temp_file = False
-            
-            # Try to use environment variable first
-            if GOOGLE_SHEETS_CREDENTIALS:
-                logger.info("Found Google Sheets credentials in environment variables")
-                
-                # Create a temporary file with the credentials JSON string
-                try:
-                    with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as f:
-                        try:
-                            f.write(GOOGLE_SHEETS_CREDENTIALS)
-                            temp_creds_path = f.name
-                            use_temp_file = True
-                        except TypeError:
-                            logger.error("Google Sheets credentials format issue - must be a valid JSON string")
-                except Exception as e:
-                    logger.error(f"Error creating temp file for credentials: {e}")
-            
-            # Fall back to credentials.json file if environment variable didn't work
-            if not use_temp_file:
-                logger.info("Using credentials.json file as fallback")
-                temp_creds_path = "credentials.json"
-                if not os.path.exists(temp_creds_path):
-                    raise ValueError("No valid credentials found. Please provide GOOGLE_SHEETS_CREDENTIALS or ensure credentials.json exists.")
-                
+        """Open the spreadsheet with the shared, already authorized client.
+        
+        Worksheet handles are kept: they stay valid for the same spreadsheet.
+        """
+        with self._lock:
             try:
-                # Get credentials from the temporary file
-                creds = ServiceAccountCredentials.from_json_keyfile_name(
-                    temp_creds_path, scope
-                )
-                
-                # Authorize with Google
-                self._client = gspread.authorize(creds)
-                
-                # Open the spreadsheet by URL
-                self._spreadsheet = self._client.open_by_url(GOOGLE_SHEETS_URL)
-                
-                # Reset worksheets cache
-                self._worksheets = {}
-                
+                client = self._session.client()
+                self._spreadsheet = self._call(PRIORITY_WRITE, client.open_by_url, self._sheets_url)
                 logger.info("Successfully connected to Google Sheets")
-            finally:
-                # Delete the temporary file to keep credentials secure
-                if use_temp_file and os.path.exists(temp_creds_path):
-                    os.unlink(temp_creds_path)
-                    
+            except Exception as e:
+                logger.error(f"Failed to connect to Google Sheets: {e}")
+                raise
+    
+    def _recover(self, error, name=None):
+        """Re-establish only the part of the connection that failed.
+        
+        Args:
+            error (Exception): The error raised by a Sheets call
+            name (str): The worksheet the call used, if any
+        
+        Returns:
+            bool: True if something was re-established and the call may be retried
+        """
+        if isinstance(error, StorageUnavailableError):
+            # Google is struggling, more requests would only add load
+            return False
+        if isinstance(error, gspread.exceptions.WorksheetNotFound):
+            observe_recovery("worksheet")
+            self._forget_worksheet(name)
+            return True
+        if isinstance(error, requests.exceptions.RequestException):
+            observe_recovery("connection")
+            self._session.reset_connections()
+            return True
+        if isinstance(error, gspread.exceptions.APIError):
+            status = error.response.status_code
+            if status in RETRYABLE_STATUSES:
+                # Already retried with backoff by the scheduler
+                return False
+            if status == 401:
+                observe_recovery("token")
+                self._session.refresh_token()
+                return True
+            if status == 404 and name:
+                # The worksheet was deleted or renamed by hand
+                observe_recovery("worksheet")
+                self._forget_worksheet(name)
+                return True
+        # Unknown failure: reopen the spreadsheet, credentials and session stay
+        observe_recovery("reopen")
+        self._connect_to_sheets()
+        return True
+    
+    def append_rows(self, name, rows):
+        """Append a batch of rows to a worksheet with a single API call.
+        
+        Rows of a partitioned worksheet go to the shard of the month they
+        are written in, so a shard only receives rows until its month ends.
+        
+        An append is never repeated blindly: if it fails in a way that may
+        have followed a successful write, the rows are remembered and the
+        next append of the same rows first looks for them in the sheet, so
+        a write Google applied but did not confirm is not made twice.
+        
+        Args:
+            name (str): The worksheet name
+            rows (list): The rows to append
+        """
+        title = shard_name(name) if name in PARTITIONED else name
+        unconfirmed = self._unconfirmed.pop(name, None)
+        if unconfirmed is not None:
+            rows = self._skip_written_rows(name, unconfirmed, rows)
+            if not rows:
+                return
+        try:
+            self._append_once(name, title, rows)
+        except Exception as e:
+            logger.error(f"Failed to append rows to {title}: {e}")
+            if is_ambiguous(e) or not self._recover(e, title):
+                raise
+            self._append_once(name, title, rows)
+            logger.info(f"Successfully appended rows to {title} after recovery")
+        
+        self._cache.patch(title, rows)
+    
+    def _append_once(self, name, title, rows):
+        """Make one append call, remembering the rows if its outcome is unknown."""
+        worksheet = self._get_worksheet(title)
+        try:
+            self._call(PRIORITY_WRITE, worksheet.append_rows, rows, idempotent=False)
         except Exception as e:
-            logger.error(f"Failed to connect to Google Sheets: {e}")
+            if is_ambiguous(e):
+                self._unconfirmed[name] = (title, rows)
             raise
     
-    def record_attendance(self, user_id, username, action, timestamp):
-        """Record attendance in the Google Sheet.
+    def _skip_written_rows(self, name, unconfirmed, rows):
+        """Drop the rows of an unconfirmed append that reached the sheet.
         
         Args:
-            user_id (str): The Telegram user ID
-            username (str): The Telegram username or first name
-            action (str): The action taken (e.g., "Davomat")
-            timestamp (str): The timestamp of the action
+            name (str): The worksheet name
+            unconfirmed (tuple): ``(title, rows)`` of the unconfirmed append
+            rows (list): The rows about to be appended
+        
+        Returns:
+            list: The rows still to append
         """
+        title, sent = unconfirmed
+        if [list(row) for row in rows[:len(sent)]] != [list(row) for row in sent]:
+            # The caller no longer retries those rows, so there is nothing to check
+            return rows
         try:
-            # Get the attendance worksheet
-            worksheet = self._get_worksheet("attendance")
-            
-            # Append a new row to the sheet
-            worksheet.append_row([user_id, username, action, timestamp])
-            logger.info(f"Recorded attendance for user {user_id} ({username})")
-        except Exception as e:
-            logger.error(f"Failed to record attendance: {e}")
-            # Attempt to reconnect and try again
+            values = self.read_values(title, refresh=True, priority=PRIORITY_WRITE)
+        except Exception:
+            self._unconfirmed[name] = unconfirmed
+            raise
+        # Other writers may have appended after our rows, so look beyond the last row
+        for start in range(len(values) - len(sent), 0, -1):
+            if all(same_cells(row, value) for row, value in zip(sent, values[start:start + len(sent)])):
+                logger.info(f"{len(sent)} rows of an unconfirmed append to {title} were written, not sending them again")
+                return rows[len(sent):]
+        return rows
+    
+    def _spreadsheet_revision(self, priority=PRIORITY_READ):
+        """Return the spreadsheet's last modification time from Drive metadata."""
+        if not self._spreadsheet:
             self._connect_to_sheets()
+        if hasattr(self._spreadsheet, "get_lastUpdateTime"):
+            return self._call(priority, self._spreadsheet.get_lastUpdateTime)
+        return self._call(priority, getattr, self._spreadsheet, "lastUpdateTime")
+    
+    def read_values(self, name, refresh=False, priority=PRIORITY_READ):
+        """Read every value of a worksheet through the row cache.
+        
+        Args:
+            name (str): The worksheet name
+            refresh (bool): Bypass the cache and fetch from Google
+            priority (int): Scheduler priority class of the read
+        
+        Returns:
+            list: The worksheet values, header row included
+        """
+        def fetch():
+            return self._call(priority, self._get_worksheet(name).get_all_values)
+        
+        def probe():
+            return self._spreadsheet_revision(priority)
+        
+        try:
+            return self._cache.get(name, fetch, refresh, probe)
+        except Exception as e:
+            logger.error(f"Failed to read worksheet {name}: {e}")
+            if not self._recover(e, name):
+                raise
             try:
-                worksheet = self._get_worksheet("attendance")
-                worksheet.append_row([user_id, username, action, timestamp])
-                logger.info(f"Successfully recorded attendance after reconnection for user {user_id}")
+                return self._cache.get(name, fetch, refresh, probe)
             except Exception as e:
-                logger.error(f"Failed to record attendance after reconnection: {e}")
+                logger.error(f"Failed to read worksheet {name} after recovery: {e}")
+                raise
+    
+    def _uncompacted_titles(self, name, through, refresh=False):
+        """Return the worksheets of ``name`` holding rows newer than ``through``, oldest first.
+        
+        The unsharded worksheet of older versions counts as older than every
+        shard and is only returned until it has been compacted once.
+        """
+        titles = self._worksheet_titles(refresh)
+        months = sorted(
+            match.group(2) for match in map(SHARD_PATTERN.match, titles)
+            if match and match.group(1) == name
+        )
+        legacy = [name] if through is None and name in titles else []
+        return legacy + [shard_name(name, month) for month in months if through is None or month > through]
+    
+    def _read_rollup(self, name, refresh=False, priority=PRIORITY_READ):
+        """Return the rollup records of ``name`` and the last month they include, None if empty."""
+        rollup_title = rollup_name(name)
+        rollup = values_to_records(rollup_title, self.read_values(rollup_title, refresh, priority))
+        return rollup, max(rollup.column("month"), default=None)
+    
+    def read_partition(self, name, refresh=False, priority=PRIORITY_READ):
+        """Read the rollup of a partitioned worksheet and every row not compacted into it.
+        
+        Normally that is the rollup plus the current month's shard, so a read
+        stays about the same size however many years of history are kept.
+        
+        Args:
+            name (str): A worksheet in PARTITIONED
+            refresh (bool): Bypass the cache and fetch from Google
+            priority (int): Scheduler priority class of the reads
+        
+        Returns:
+            tuple: Column stores of the rollup records and of the records of
+            the uncompacted shards, oldest first
+        """
+        rollup, through = self._read_rollup(name, refresh, priority)
+        records = ColumnStore(record_type(name))
+        for title in self._uncompacted_titles(name, through, refresh):
+            records.load_values(self.read_values(title, refresh, priority))
+        return rollup, records
+    
+    def read_history(self, name, priority=PRIORITY_READ):
+        """Read every row ever written to a worksheet, across all of its shards.
+        
+        Only needed to mirror the whole history elsewhere; reports use
+        :meth:`read_partition`. Every worksheet is read from Google, past the
+        row cache, so manual edits are seen and closed months do not evict
+        the worksheets updates need.
+        
+        Returns:
+            list: The values, header row included
+        """
+        if name not in PARTITIONED:
+            return self._fetch_values(name, priority)
+        values = [HEADERS[name]]
+        for title in self._uncompacted_titles(name, None, refresh=True):
+            values += self._fetch_values(title, priority)[1:]
+        return values
+    
+    def export_rows(self, name):
+        """Return every row flushed to a worksheet across its shards, for the analytics.
+        
+        The history of a partitioned worksheet is kept between calls: the
+        first call reads every shard once, past the row cache so closed
+        months do not evict the worksheets updates need, and later calls
+        only add the rows :meth:`rows_since` finds after the kept cursor.
+        Flushes are not held off, so rows still in the buffer are left out
+        until they are flushed. The kept history is dropped at every
+        reconcile, which picks up manual edits.
+        
+        Returns:
+            list: Rows as value lists in sheet column order, oldest first
+        """
+        if name not in PARTITIONED:
+            return self.read_values(name)[1:]
+        with self._export_lock:
+            rows, cursor = self._exported.get(name, (None, None))
+            if rows is None:
+                rows, cursor = self._read_history_uncached(name)
+            else:
+                new_rows, cursor = self.rows_since(name, cursor, priority=PRIORITY_READ)
+                # A new list, so a caller still holding the previous one never sees it change
+                rows = rows + new_rows
+            self._exported[name] = (rows, cursor)
+            return rows
+    
+    def _read_history_uncached(self, name):
+        """Read every shard of a partitioned worksheet without filling the row cache.
+        
+        Returns:
+            tuple: The rows, oldest first, and a :meth:`rows_since` cursor
+            just past them
+        """
+        _, through = self._read_rollup(name)
+        current = self._uncompacted_titles(name, through)
+        rows = []
+        cursor = {}
+        for title in self._uncompacted_titles(name, None):
+            values = self._fetch_values(title)[1:]
+            rows += values
+            if title in current:
+                cursor[title] = len(values)
+        return rows, cursor
+    
+    def _fetch_values(self, name, priority=PRIORITY_READ):
+        """Read every value of a worksheet from Google, leaving the row cache as it is."""
+        try:
+            return self._call(priority, self._get_worksheet(name).get_all_values)
+        except Exception as e:
+            logger.error(f"Failed to read worksheet {name}: {e}")
+            if not self._recover(e, name):
+                raise
+            return self._call(priority, self._get_worksheet(name).get_all_values)
+    
+    def rows_since(self, name, cursor=None, since=None, priority=PRIORITY_BACKGROUND):
+        """Return the rows flushed to a partitioned worksheet after ``cursor``.
+        
+        The cursor maps each uncompacted shard to the rows already returned
+        from it, so a call reads only the current shard, normally through the
+        row cache. A shard compacted since the previous call is read one last
+        time for its remaining rows. On the first call, shards already
+        compacted are read too from the month of ``since`` on, so a window
+        reaching into last month is complete early in this one. Rows still
+        in the buffer are returned once they have been flushed.
+        
+        Args:
+            name (str): A worksheet in PARTITIONED
+            cursor (dict): The cursor returned by the previous call, None the first time
+            since (date): Oldest day needed on the first call
+            priority (int): Scheduler priority class of the reads
+        
+        Returns:
+            tuple: The new rows, oldest first, and the cursor to pass next
+        """
+        cursor = cursor or {}
+        _, through = self._read_rollup(name, priority=priority)
+        current = self._uncompacted_titles(name, through)
+        existing = self._worksheet_titles()
+        titles = set(current) | (set(cursor) & existing)
+        if not cursor and since is not None:
+            # Compacted shards keep their rows, they are just no longer read by default
+            first = shard_name(name, month_key(since))
+            titles |= {title for title in self._uncompacted_titles(name, None) if title >= first}
+        rows = []
+        next_cursor = {}
+        for title in sorted(titles):
+            values = self.read_values(title, priority=priority)[1:]
+            rows += values[cursor.get(title, 0):]
+            if title in current:
+                next_cursor[title] = len(values)
+        return rows, next_cursor
+    
+    def compact_partitions(self, priority=PRIORITY_BACKGROUND):
+        """Fold the shards of every closed month into their worksheet's rollup.
+        
+        The rollup is cumulative, one row of totals per student up to the end
+        of last month, and its Month column names the last month included.
+        Closed shards stay in the spreadsheet but are no longer read. The new
+        rollup only ever gains rows, so it is written over the old one with a
+        single update and readers never see it half written. Flushes are held
+        off meanwhile, so no append lands in a shard being compacted.
+        """
+        first_of_month = datetime.now().replace(day=1)
+        closed = month_key(first_of_month - timedelta(days=1))
+        current_shard = {name: shard_name(name) for name in PARTITIONED}
+        with self._buffer.paused():
+            for name in PARTITIONED:
+                rollup_title = rollup_name(name)
+                rollup, through = self._read_rollup(name, True, priority)
+                titles = [
+                    title for title in self._uncompacted_titles(name, through, refresh=True)
+                    if title < current_shard[name]
+                ]
+                if not titles:
+                    continue
+                
+                records = ColumnStore(record_type(name))
+                for title in titles:
+                    records.load_values(self.read_values(title, True, priority))
+                header = ROLLUP_HEADERS[rollup_title]
+                # A placeholder row keeps the Month of a rollup with no students yet
+                rows = ROLLUP_BUILDERS[name](rollup, records) or [[""] * (len(header) - 1)]
+                values = [header] + [row + [closed] for row in rows]
+                
+                worksheet = self._get_worksheet(rollup_title)
+                if len(values) > worksheet.row_count:
+                    self._call(priority, worksheet.resize, rows=len(values))
+                self._call(priority, worksheet.update, range_name="A1", values=values)
+                for title in [rollup_title] + titles:
+                    self._cache.invalidate(title)
+                logger.info(f"Compacted {len(records)} rows of {', '.join(titles)} into {rollup_title}")
+    
+    def cache_stats(self):
+        """Return hit, miss and eviction counters of the row cache."""
+        return self._cache.stats()
+    
+    def scheduler_stats(self):
+        """Return the quota scheduler's queue and circuit state."""
+        return self._scheduler.stats()
+    
+    def _write_row(self, name, row):
+        """Queue a row for the sheet and apply it to the report view."""
+        self._write_rows(name, [row])
+    
+    def _write_rows(self, name, rows):
+        """Queue rows for the sheet as one batch and apply them to the report view.
+        
+        Both happen under the view lock so a concurrent rebuild sees the rows
+        either in the buffer or through the view, never twice.
+        """
+        with self._view_lock:
+            self._buffer.extend(name, rows)
+            if self._view is not None:
+                for row in rows:
+                    VIEW_APPLIERS[name](self._view, RECORD_TYPES[name].from_row(row))
+            if name == "students":
+                for row in rows:
+                    self._students.add(row[0], row[2], row[4])
+    
+    def _write_unique_rows(self, name, rows, keys):
+        """Write the rows whose keys are not in the idempotency index.
+        
+        Repeats are dropped locally, without any Sheets call. If the write
+        fails the keys are released so a retry is not taken for a repeat.
+        
+        Returns:
+            list: The rows that were written
+        """
+        fresh = [(row, key) for row, key in zip(rows, keys) if self._dedup.add(key)]
+        if fresh:
+            try:
+                self._write_rows(name, [row for row, _ in fresh])
+            except Exception:
+                for _, key in fresh:
+                    self._dedup.discard(key)
                 raise
+        return [row for row, _ in fresh]
+    
+    def _rebuild_dedup_index(self):
+        """Load today's attendance and payments into the idempotency index."""
+        today = datetime.now().date()
+        for name, key_func, attributes in (
+            ("attendance", attendance_dedup_key, ("user_id", "student_id", "timestamp")),
+            ("payments", payment_dedup_key, ("student_id", "payment_date", "amount")),
+        ):
+            # Today's rows are all in the current shard or still in the buffer
+            _, records = self.read_partition(name)
+            records.load(self._buffer.pending_rows(name))
+            for record in records:
+                if record.timestamp is not None and record.timestamp.date() == today:
+                    self._dedup.add(key_func(*(getattr(record, attribute) for attribute in attributes)))
+        logger.info(f"Loaded {len(self._dedup)} of today's submissions into the idempotency index")
+    
+    def record_attendance(self, user_id, username, action, timestamp, student_id=""):
+        """Record attendance in the Google Sheet.
+        
+        The row is journaled locally and written to the sheet by the next
+        batch flush.
+        
+        Args:
+            user_id (str): The Telegram user ID
+            username (str): The Telegram username or first name
+            action (str): The action taken (e.g., "Davomat")
+            timestamp (str): The timestamp of the action
+            student_id (str): The student marked present, empty for a self check-in
+        
+        Raises:
+            DuplicateSubmissionError: If the same person was already marked that day
+        """
+        student_id = normalize_id(student_id)
+        row = [user_id, username, action, timestamp, student_id]
+        if not self._write_unique_rows("attendance", [row], [attendance_dedup_key(user_id, student_id, timestamp)]):
+            raise DuplicateSubmissionError(f"Attendance of {student_id or user_id} is already recorded today")
+        logger.info(f"Recorded attendance for user {user_id} ({username})")
+    
+    def record_group_attendance(self, user_id, username, action, timestamp, student_ids):
+        """Record attendance for a whole group of students.
+        
+        The rows are journaled together and reach the sheet in a single
+        ``append_rows`` call.
+        
+        Args:
+            user_id (str): The Telegram user ID of the teacher
+            username (str): The teacher's username or first name
+            action (str): The action taken (e.g., "Davomat")
+            timestamp (str): The timestamp of the lesson
+            student_ids (list): IDs of the students marked present
+        
+        Returns:
+            list: The IDs recorded; students already marked that day are skipped
+        """
+        student_ids = [normalize_id(student_id) for student_id in student_ids]
+        rows = self._write_unique_rows(
+            "attendance",
+            [[user_id, username, action, timestamp, student_id] for student_id in student_ids],
+            [attendance_dedup_key(user_id, student_id, timestamp) for student_id in student_ids],
+        )
+        logger.info(f"Recorded group attendance of {len(rows)} students for user {user_id} ({username})")
+        return [row[4] for row in rows]
                 
+    def _highest_student_id(self):
+        """Return the highest numeric student ID in the sheet or the buffer.
+        
+        Only used to seed the ID sequence.
+        """
+        ids = [row[0] for row in self.read_values("students")[1:] if row]
+        ids += [row[0] for row in self._buffer.pending_rows("students")]
+        return max((int(i) for i in ids if str(i).isdigit()), default=0)
+    
     def record_student(self, registered_by, name, phone, subject, timestamp):
         """Record a new student in the Google Sheet.
         
+        The ID comes from the local sequence and the row is journaled for the
+        next batch flush, so no Sheets call is made once the sequence is seeded.
+        
         Args:
             registered_by (str): The Telegram user ID who registered the student
             name (str): The student's full name
             phone (str): The student's phone number
             subject (str): The subject the student is studying
             timestamp (str): The timestamp of registration
+        
+        Returns:
+            str: The ID assigned to the student
         """
-        try:
-            # Get the students worksheet
-            worksheet = self._get_worksheet("students")
-            
-            # Generate a unique ID for the student
-            all_values = worksheet.get_all_values()
-            rows = len(all_values)
-            
-            # Skip the header row when counting
-            if rows > 0:
-                student_id = str(rows)  # Simple sequential ID
-            else:
-                student_id = "1"  # First student
-                
-            # Append a new row to the sheet
-            worksheet.append_row([student_id, registered_by, name, phone, subject, timestamp])
-            logger.info(f"Recorded new student: {name} with ID {student_id}")
-            
-        except Exception as e:
-            logger.error(f"Failed to record student: {e}")
-            # Attempt to reconnect and try again
-            self._connect_to_sheets()
-            try:
-                worksheet = self._get_worksheet("students")
-                
-                # Re-generate the student ID
-                all_values = worksheet.get_all_values()
-                rows = len(all_values)
-                
-                if rows > 0:
-                    student_id = str(rows)
-                else:
-                    student_id = "1"
-                    
-                worksheet.append_row([student_id, registered_by, name, phone, subject, timestamp])
-                logger.info(f"Successfully recorded student after reconnection: {name}")
-            except Exception as e:
-                logger.error(f"Failed to record student after reconnection: {e}")
-                raise
+        student_id = self._student_ids.next()
+        self._write_row("students", [student_id, registered_by, name, phone, subject, timestamp])
+        logger.info(f"Recorded new student: {name} with ID {student_id}")
+        return student_id
     
     def record_payment(self, recorded_by, student_id, payment_date, amount, timestamp):
         """Record a payment for a student.
         
+        The row is journaled locally and written to the sheet by the next
+        batch flush.
+        
         Args:
             recorded_by (str): The Telegram user ID who recorded the payment
             student_id (str): The student ID
             payment_date (str): The date of the payment
             amount (str): The payment amount
             timestamp (str): The timestamp when the payment was recorded
+        
+        Raises:
+            DuplicateSubmissionError: If the same payment was recorded recently
         """
-        try:
-            # Get the payments worksheet
-            worksheet = self._get_worksheet("payments")
-            
-            # Append a new row to the sheet
-            worksheet.append_row([recorded_by, student_id, payment_date, amount, timestamp])
-            logger.info(f"Recorded payment for student ID {student_id}: {amount}")
-            
-        except Exception as e:
-            logger.error(f"Failed to record payment: {e}")
-            # Attempt to reconnect and try again
-            self._connect_to_sheets()
+        student_id = normalize_id(student_id)
+        row = [recorded_by, student_id, payment_date, amount, timestamp]
+        if not self._write_unique_rows("payments", [row], [payment_dedup_key(student_id, payment_date, amount)]):
+            raise DuplicateSubmissionError(f"Payment of {amount} for student {student_id} is already recorded")
+        logger.info(f"Recorded payment for student ID {student_id}: {amount}")
+    
+    def rebuild_report_view(self, refresh=False, priority=PRIORITY_READ):
+        """Rebuild the report view from the sheet plus rows still in the buffer.
+        
+        Attendance and payments are read from their rollups and uncompacted
+        shards only. Flushes are held off while the sheet is read, so every
+        row is either already in the sheet or still pending in the buffer.
+        
+        Args:
+            refresh (bool): Read the sheets from Google instead of the row cache
+            priority (int): Scheduler priority class of the reads
+        """
+        with self._rebuild_lock:
+            self._build_report_view(refresh, priority)
+    
+    def _build_report_view(self, refresh, priority):
+        """Read the sheets and replace the report view; call with ``_rebuild_lock`` held."""
+        with self._buffer.paused():
+            student_data = values_to_records("students", self.read_values("students", refresh, priority))
+            attendance_rollup, attendance_data = self.read_partition("attendance", refresh, priority)
+            payment_rollup, payment_data = self.read_partition("payments", refresh, priority)
+            with self._view_lock:
+                for name, records in (("students", student_data), ("attendance", attendance_data),
+                                      ("payments", payment_data)):
+                    records.load(self._buffer.pending_rows(name))
+                # Rollup rows carry each student's latest compacted payment and
+                # come first, as the compacted rows did
+                self._view = StudentReportView.from_records(
+                    student_data, attendance_data, payment_data,
+                    rollup_attendance_totals(attendance_rollup), payment_rollup,
+                )
+                self._students.sync(
+                    ("" if student.id is None else student.id, student.name, student.subject)
+                    for student in student_data
+                )
+        logger.info(f"Rebuilt report view with {len(student_data)} students")
+    
+    def _reconcile_loop(self):
+        """Build the report view at startup and rebuild it periodically.
+        
+        Closed months are compacted first. Later rebuilds bypass the row
+        cache and drop the history kept by :meth:`export_rows`, so manual
+        edits are picked up.
+        """
+        refresh = False
+        while True:
             try:
-                worksheet = self._get_worksheet("payments")
-                worksheet.append_row([recorded_by, student_id, payment_date, amount, timestamp])
-                logger.info(f"Successfully recorded payment after reconnection for student ID {student_id}")
+                self.compact_partitions()
             except Exception as e:
-                logger.error(f"Failed to record payment after reconnection: {e}")
-                raise
+                logger.error(f"Failed to compact closed months: {e}")
+            try:
+                # Skip the startup build if the warm-up already did it
+                if refresh or self._view is None:
+                    self.rebuild_report_view(refresh, PRIORITY_BACKGROUND)
+                if refresh:
+                    with self._export_lock:
+                        self._exported.clear()
+                refresh = True
+            except Exception as e:
+                logger.error(f"Failed to reconcile report view: {e}")
+            if self._closed.wait(self._reconcile_interval):
+                return
+    
+    def _ensure_view(self):
+        """Build the report view unless it already exists."""
+        if self._view is None:
+            with self._rebuild_lock:
+                # Callers that queued behind the first build find the view ready
+                if self._view is None:
+                    self._build_report_view(False, PRIORITY_READ)
+    
+    def warm_up(self):
+        """Open every worksheet, seed the ID sequence, build the report view and load the idempotency index.
+        
+        Run in the background at startup so the first update does not pay
+        for authentication and worksheet lookups.
+        """
+        self._get_worksheet("students")
+        for name in PARTITIONED:
+            self._get_worksheet(shard_name(name))
+            self._get_worksheet(rollup_name(name))
+        self._student_ids.seed()
+        self._ensure_view()
+        self._rebuild_dedup_index()
+    
+    def tenant_manager(self, tenant, sheets_url, directory, cache_max_cells=SHEETS_CACHE_MAX_CELLS):
+        """Create the manager of another tenant's spreadsheet.
+        
+        The new manager shares this one's credentials and HTTP session, its
+        thread pool and its quota scheduler, where it takes turns with the
+        other tenants; it has its own journal, ID sequence, caches and
+        report view.
+        
+        Args:
+            tenant (str): The tenant ID
+            sheets_url (str): URL of the tenant's spreadsheet
+            directory (str): Directory for the tenant's journal and ID sequence
+            cache_max_cells (int): Most cells the tenant's row cache holds
+        
+        Returns:
+            GoogleSheetsManager: The tenant's manager; :meth:`close` it when done
+        """
+        return GoogleSheetsManager(
+            call_timeout=self._call_timeout,
+            journal_path=os.path.join(directory, "sheets_journal.jsonl"),
+            id_sequence_path=os.path.join(directory, "student_id.seq"),
+            reconcile_interval=self._reconcile_interval,
+            scheduler=self._scheduler.for_tenant(tenant),
+            session=self._session,
+            sheets_url=sheets_url,
+            executor=self._executor,
+            cache_max_cells=cache_max_cells,
+        )
+    
+    def close(self):
+        """Flush queued rows and stop the background threads.
+        
+        The manager must not be used afterwards.
+        """
+        self._closed.set()
+        self._buffer.close()
+        super().close()
+    
+    def get_student(self, student_id):
+        """Look up a student by exact ID; the roster is loaded with the report view."""
+        self._ensure_view()
+        return super().get_student(student_id)
+    
+    def search_students(self, query, limit=10):
+        """Search students by ID or name; the roster is loaded with the report view."""
+        self._ensure_view()
+        return super().search_students(query, limit)
     
     def get_student_report(self):
         """Get a report of all students with their attendance and payment info.
         
+        The report is served from the in-process view, which is built from
+        the sheet on first use and then kept current by the write methods.
+        
         Returns:
             list: A list of dictionaries with student information
         """
-        try:
-            # Get all worksheets
-            students_worksheet = self._get_worksheet("students")
-            attendance_worksheet = self._get_worksheet("attendance")
-            payments_worksheet = self._get_worksheet("payments")
-            
-            # Get all data
-            student_data = students_worksheet.get_all_records()
-            attendance_data = attendance_worksheet.get_all_records()
-            payment_data = payments_worksheet.get_all_records()
-            
-            if not student_data:
-                logger.warning("No student data found for report")
-                return []
-                
-            # Prepare report
-            report = []
-            
-            for student in student_data:
-                # Count attendance records for this student
-                student_id = student.get('ID')
-                if not student_id:
-                    continue
-                    
-                attendance_count = 0
-                for record in attendance_data:
-                    if record.get('User ID') == student.get('Registered By'):
-                        attendance_count += 1
-                
-                # Get latest payment
-                latest_payment = None
-                payment_date = "N/A"
-                
-                for payment in payment_data:
-                    if payment.get('Student ID') == student_id:
-                        latest_payment = payment.get('Amount')
-                        payment_date = payment.get('Payment Date')
-                
-                # Create report entry
-                report_entry = {
-                    'id': student_id,
-                    'name': student.get('Name', 'Unknown'),
-                    'subject': student.get('Subject', 'Unknown'),
-                    'attendance_count': attendance_count,
-                    'last_payment': latest_payment or "N/A",
-                    'payment_date': payment_date
-                }
-                
-                report.append(report_entry)
-            
-            return report
-            
-        except Exception as e:
-            logger.error(f"Failed to generate student report: {e}")
-            # Attempt to reconnect and try again
-            self._connect_to_sheets()
-            try:
-                return self.get_student_report()  # Recursive call after reconnection
-            except Exception as e:
-                logger.error(f"Failed to generate student report after reconnection: {e}")
-                raise
+        self._ensure_view()
+        
+        with self._view_lock:
+            report = self._view.report()
+        
+        if not report:
+            logger.warning("No student data found for report")
+        return report
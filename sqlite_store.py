@@ -0,0 +1,431 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from config import (
+    SQLITE_PATH,
+    SYNC_PUSH_INTERVAL,
+    SYNC_PULL_INTERVAL,
+    SYNC_BATCH_SIZE,
+)
+from idempotency import attendance_dedup_key, payment_dedup_key
+from records import normalize_id
+from report_engine import parse_amount, parse_payment_date
+from sheets_manager import GoogleSheetsManager, PRIORITY_BACKGROUND
+from storage import DuplicateSubmissionError, StorageBackend
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Local tables and the worksheet columns they mirror, in sheet order
+TABLE_COLUMNS = {
+    "attendance": ["user_id", "username", "action", "timestamp", "student_id"],
+    "students": ["id", "registered_by", "name", "phone", "subject", "timestamp"],
+    "payments": ["recorded_by", "student_id", "payment_date", "amount", "timestamp"],
+}
+
+# Position of the student ID in each table's columns
+ID_COLUMNS = {"attendance": 4, "students": 0, "payments": 1}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    row_id INTEGER PRIMARY KEY,
+    user_id TEXT, username TEXT, action TEXT, timestamp TEXT, student_id TEXT,
+    synced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS attendance_student ON attendance (student_id);
+CREATE INDEX IF NOT EXISTS attendance_unsynced ON attendance (synced, row_id);
+CREATE INDEX IF NOT EXISTS attendance_timestamp ON attendance (timestamp);
+
+CREATE TABLE IF NOT EXISTS students (
+    row_id INTEGER PRIMARY KEY,
+    id TEXT, registered_by TEXT, name TEXT, phone TEXT, subject TEXT, timestamp TEXT,
+    synced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS students_id ON students (id);
+CREATE INDEX IF NOT EXISTS students_unsynced ON students (synced, row_id);
+
+CREATE TABLE IF NOT EXISTS payments (
+    row_id INTEGER PRIMARY KEY,
+    recorded_by TEXT, student_id TEXT, payment_date TEXT, amount TEXT, timestamp TEXT,
+    payment_sort TEXT NOT NULL DEFAULT '',
+    synced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS payments_latest ON payments (student_id, payment_sort, row_id);
+CREATE INDEX IF NOT EXISTS payments_unsynced ON payments (synced, row_id);
+CREATE INDEX IF NOT EXISTS payments_timestamp ON payments (timestamp);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+REPORT_QUERY = """
+SELECT s.id, s.name, s.subject,
+       (SELECT COUNT(*) FROM attendance a WHERE a.student_id = s.id) AS attendance_count,
+       p.amount, p.payment_date
+FROM students s
+LEFT JOIN payments p ON p.row_id = (
+    SELECT row_id FROM payments
+    WHERE student_id = s.id
+    ORDER BY payment_sort DESC, row_id DESC
+    LIMIT 1
+)
+WHERE s.id IS NOT NULL AND s.id != ''
+ORDER BY s.row_id
+"""
+
+def payment_sort_key(payment_date):
+    """Return a sortable ISO date for a typed payment date, '' if unparseable."""
+    parsed = parse_payment_date(payment_date)
+    return parsed.strftime("%Y-%m-%d") if parsed else ""
+
+class SQLiteStorage(StorageBackend):
+    """Local SQLite system of record mirrored to Google Sheets.
+
+    Every write and report is served from the local database. A background
+    :class:`SheetsSync` worker appends new rows to the spreadsheet in batches
+    and pulls manual edits back.
+    """
+
+    def __init__(self, path=SQLITE_PATH, sheets=None, sync=True, **kwargs):
+        """Open the database and start the sync worker.
+
+        Args:
+            path (str): Path of the SQLite database file
+            sheets (GoogleSheetsManager): Spreadsheet to mirror, created when omitted
+            sync (bool): Whether to start the background sync worker
+            **kwargs: Passed on to :class:`StorageBackend`
+        """
+        super().__init__(**kwargs)
+        self._path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+        self._rebuild_dedup_index()
+        self._load_student_index()
+
+        self.sync = None
+        if sync:
+            if sheets is None:
+                # Unsynced rows wait in the database, so the mirror needs no journal
+                sheets = GoogleSheetsManager(journal_path=None, reconcile_interval=0)
+            self.sync = SheetsSync(self, sheets)
+            self.sync.start()
+
+    def _conn(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """Return a context manager running its block in one transaction."""
+        return _Transaction(self._conn())
+
+    def get_meta(self, key):
+        """Return a value from the meta table, or None."""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        """Store a value in the meta table."""
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _rebuild_dedup_index(self):
+        """Load today's attendance and payments into the idempotency index."""
+        today = f"{datetime.now():%Y-%m-%d}%"
+        conn = self._conn()
+        for user_id, student_id, timestamp in conn.execute(
+            "SELECT user_id, student_id, timestamp FROM attendance WHERE timestamp LIKE ?", (today,)
+        ):
+            self._dedup.add(attendance_dedup_key(user_id, student_id or "", timestamp))
+        for student_id, payment_date, amount in conn.execute(
+            "SELECT student_id, payment_date, amount FROM payments WHERE timestamp LIKE ?", (today,)
+        ):
+            self._dedup.add(payment_dedup_key(student_id, payment_date, amount))
+
+    def _load_student_index(self):
+        """Bring the in-memory student index in line with the students table."""
+        self._students.sync(self._conn().execute(
+            "SELECT id, name, subject FROM students WHERE id IS NOT NULL AND id != '' ORDER BY row_id"
+        ))
+
+    def _insert_unique(self, sql, rows, keys):
+        """Insert the rows whose keys are not in the idempotency index, in one transaction.
+
+        Returns:
+            list: The rows that were inserted
+        """
+        fresh = [(row, key) for row, key in zip(rows, keys) if self._dedup.add(key)]
+        if fresh:
+            try:
+                with self._transaction() as conn:
+                    conn.executemany(sql, [row for row, _ in fresh])
+            except Exception:
+                for _, key in fresh:
+                    self._dedup.discard(key)
+                raise
+        return [row for row, _ in fresh]
+
+    def record_attendance(self, user_id, username, action, timestamp, student_id=""):
+        """Record an attendance row in the local database."""
+        student_id = normalize_id(student_id)
+        if not self._insert_unique(
+            "INSERT INTO attendance (user_id, username, action, timestamp, student_id) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, username, action, timestamp, student_id)],
+            [attendance_dedup_key(user_id, student_id, timestamp)],
+        ):
+            raise DuplicateSubmissionError(f"Attendance of {student_id or user_id} is already recorded today")
+        logger.info(f"Recorded attendance for user {user_id} ({username})")
+
+    def record_group_attendance(self, user_id, username, action, timestamp, student_ids):
+        """Record attendance for a whole group in one transaction, skipping students already marked today."""
+        student_ids = [normalize_id(student_id) for student_id in student_ids]
+        rows = self._insert_unique(
+            "INSERT INTO attendance (user_id, username, action, timestamp, student_id) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, username, action, timestamp, student_id) for student_id in student_ids],
+            [attendance_dedup_key(user_id, student_id, timestamp) for student_id in student_ids],
+        )
+        logger.info(f"Recorded group attendance of {len(rows)} students for user {user_id} ({username})")
+        return [row[4] for row in rows]
+
+    def record_student(self, registered_by, name, phone, subject, timestamp):
+        """Record a new student in the local database.
+
+        The ID is allocated from a counter in the same transaction as the
+        insert, so concurrent registrations never share an ID. On a fresh
+        database the first pull from the sheet must finish before an ID is
+        issued, so IDs already used in the sheet are not handed out again.
+
+        Returns:
+            str: The ID assigned to the student
+        """
+        if self.sync is not None and not self.sync.seeded.wait(self._call_timeout):
+            raise RuntimeError("Student IDs have not been loaded from Google Sheets yet")
+
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_student_id'").fetchone()
+            student_id = str(int(row[0]) + 1 if row else 1)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_student_id', ?)",
+                (student_id,),
+            )
+            conn.execute(
+                "INSERT INTO students (id, registered_by, name, phone, subject, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                (student_id, registered_by, name, phone, subject, timestamp),
+            )
+        self._students.add(student_id, name, subject)
+        logger.info(f"Recorded new student: {name} with ID {student_id}")
+        return student_id
+
+    def record_payment(self, recorded_by, student_id, payment_date, amount, timestamp):
+        """Record a payment in the local database."""
+        student_id = normalize_id(student_id)
+        if not self._insert_unique(
+            "INSERT INTO payments (recorded_by, student_id, payment_date, amount, timestamp, payment_sort) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(recorded_by, student_id, payment_date, amount, timestamp, payment_sort_key(payment_date))],
+            [payment_dedup_key(student_id, payment_date, amount)],
+        ):
+            raise DuplicateSubmissionError(f"Payment of {amount} for student {student_id} is already recorded")
+        logger.info(f"Recorded payment for student ID {student_id}: {amount}")
+
+    def get_student_report(self):
+        """Build the student report with indexed queries on the local database.
+
+        Returns:
+            list: A list of dictionaries with student information
+        """
+        rows = self._conn().execute(REPORT_QUERY).fetchall()
+
+        if not rows:
+            logger.warning("No student data found for report")
+        report = []
+        for student_id, name, subject, attendance_count, amount, payment_date in rows:
+            # An int like the Sheets backend's report, not the TEXT column
+            last_payment = parse_amount(amount)
+            report.append({
+                'id': student_id,
+                'name': name or 'Unknown',
+                'subject': subject or 'Unknown',
+                'attendance_count': attendance_count,
+                'last_payment': "N/A" if last_payment is None else last_payment,
+                'payment_date': payment_date or "N/A",
+            })
+        return report
+
+    def export_rows(self, name):
+        """Return every row of a table in sheet column order, oldest first."""
+        rows = self._conn().execute(f"SELECT {', '.join(TABLE_COLUMNS[name])} FROM {name} ORDER BY row_id")
+        return [["" if value is None else value for value in row] for row in rows]
+
+    def rows_since(self, name, cursor=None, since=None):
+        """Return the rows whose timestamp is after ``cursor``, and not before ``since``.
+
+        The cursor is the latest timestamp returned, not a row ID: a pull
+        re-inserts mirrored rows under new IDs but keeps their timestamps.
+        Rows of the last few seconds are left for the next call, so a row
+        written during the query with an already returned timestamp is not
+        skipped.
+        """
+        until = f"{datetime.now() - timedelta(seconds=5):%Y-%m-%d %H:%M:%S}"
+        rows = self._conn().execute(
+            f"SELECT {', '.join(TABLE_COLUMNS[name])} FROM {name} "
+            "WHERE timestamp > ? AND timestamp <= ? ORDER BY timestamp, row_id",
+            (max(cursor or "", since.isoformat() if since else ""), until),
+        ).fetchall()
+        return [["" if value is None else value for value in row] for row in rows], max(cursor or "", until)
+
+    def unsynced_rows(self, table, limit):
+        """Return up to ``limit`` rows not yet mirrored to the sheet.
+
+        Returns:
+            list: ``(row_id, values)`` pairs in insertion order
+        """
+        columns = ", ".join(TABLE_COLUMNS[table])
+        rows = self._conn().execute(
+            f"SELECT row_id, {columns} FROM {table} WHERE synced = 0 ORDER BY row_id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [(row[0], ["" if value is None else value for value in row[1:]]) for row in rows]
+
+    def mark_synced(self, table, row_ids):
+        """Flag rows as mirrored to the sheet."""
+        with self._transaction() as conn:
+            conn.executemany(f"UPDATE {table} SET synced = 1 WHERE row_id = ?", [(row_id,) for row_id in row_ids])
+
+    def replace_synced(self, table, values):
+        """Replace every mirrored row of a table with the sheet's current rows.
+
+        Rows still waiting to be pushed are kept, so a pull never loses
+        local writes.
+
+        Args:
+            table (str): The table to refresh
+            values (list): Worksheet rows without the header
+        """
+        columns = TABLE_COLUMNS[table]
+        width = len(columns)
+        rows = [(list(row) + [""] * width)[:width] for row in values]
+        # IDs typed into the sheet by hand are matched like the ones written here
+        position = ID_COLUMNS[table]
+        for row in rows:
+            row[position] = normalize_id(row[position])
+        if table == "payments":
+            columns = columns + ["payment_sort"]
+            rows = [row + [payment_sort_key(row[2])] for row in rows]
+        placeholders = ", ".join("?" for _ in columns)
+
+        with self._transaction() as conn:
+            conn.execute(f"DELETE FROM {table} WHERE synced = 1")
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}, synced) VALUES ({placeholders}, 1)",
+                rows,
+            )
+            if table == "students":
+                # Keep the ID counter ahead of IDs typed into the sheet by hand
+                conn.execute(
+                    "INSERT INTO meta (key, value) "
+                    "SELECT 'last_student_id', MAX(CAST(id AS INTEGER)) FROM students WHERE id GLOB '[0-9]*' "
+                    "HAVING MAX(CAST(id AS INTEGER)) IS NOT NULL "
+                    "ON CONFLICT (key) DO UPDATE SET value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))"
+                )
+        if table == "students":
+            # Pick up students added or renamed in the sheet by hand
+            self._load_student_index()
+
+class _Transaction:
+    """Context manager running a block in one immediate SQLite transaction."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+class SheetsSync:
+    """Background worker mirroring the SQLite store to Google Sheets.
+
+    New local rows are appended to their worksheet in batches of
+    ``batch_size`` every ``push_interval`` seconds. Every ``pull_interval``
+    seconds the worksheets are read back and replace the local mirrored rows,
+    which brings in rows added or edited by hand. Push and pull run on the
+    same thread, so a pull always sees everything pushed before it.
+    Delivery is at-least-once: a crash between an append and marking its
+    rows synced sends them again.
+    """
+
+    def __init__(self, store, sheets, push_interval=SYNC_PUSH_INTERVAL,
+                 pull_interval=SYNC_PULL_INTERVAL, batch_size=SYNC_BATCH_SIZE):
+        self._store = store
+        self._sheets = sheets
+        self._push_interval = push_interval
+        self._pull_interval = pull_interval
+        self._batch_size = batch_size
+        self._stop = threading.Event()
+        self._last_pull = None
+        # Set once the local store has been loaded from the sheet at least once
+        self.seeded = threading.Event()
+        if store.get_meta("last_pull"):
+            self.seeded.set()
+        self._thread = threading.Thread(target=self._run, name="sheets-sync", daemon=True)
+
+    def start(self):
+        """Start the worker thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Ask the worker to stop after its current step."""
+        self._stop.set()
+
+    def push(self):
+        """Append every unsynced local row to the spreadsheet."""
+        for table in TABLE_COLUMNS:
+            while True:
+                batch = self._store.unsynced_rows(table, self._batch_size)
+                if not batch:
+                    break
+                self._sheets.append_rows(table, [values for _, values in batch])
+                self._store.mark_synced(table, [row_id for row_id, _ in batch])
+                logger.info(f"Synced {len(batch)} rows to {table}")
+
+    def pull(self):
+        """Replace the local mirrored rows with the spreadsheet's contents.
+
+        Closed months are compacted into the rollups first; the local store
+        keeps every row, so it is refreshed from all the shards.
+        """
+        self._sheets.compact_partitions()
+        for table in TABLE_COLUMNS:
+            values = self._sheets.read_history(table, priority=PRIORITY_BACKGROUND)
+            self._store.replace_synced(table, values[1:])
+        self._last_pull = time.monotonic()
+        self._store.set_meta("last_pull", str(time.time()))
+        self.seeded.set()
+        logger.info("Pulled spreadsheet changes into the local store")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.push()
+                if self._last_pull is None or time.monotonic() - self._last_pull >= self._pull_interval:
+                    self.pull()
+            except Exception as e:
+                logger.error(f"Sheets sync failed: {e}")
+            self._stop.wait(self._push_interval)
@@ -0,0 +1,350 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    STORAGE_BACKEND,
+    SHEETS_MAX_WORKERS,
+    SHEETS_CALL_TIMEOUT,
+    SHEETS_CACHE_MAX_CELLS,
+    TENANT_POOL_SIZE,
+    WARM_UP_RETRY_INTERVAL,
+)
+from idempotency import IdempotencyIndex
+from metrics import observe_startup
+from student_index import StudentIndex
+from tenants import TenantPool, tenant_directory, tenant_router
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+class StorageUnavailableError(Exception):
+    """Raised without contacting the backend while it is known to be down."""
+
+class DuplicateSubmissionError(Exception):
+    """Raised without writing anything when a submission repeats a recent one."""
+
+class StorageBackend:
+    """Interface the bot uses to store attendance, students and payments.
+
+    Subclasses implement the blocking methods. The ``*_async`` versions run
+    them in a bounded thread pool so handlers never block the event loop.
+    """
+
+    def __init__(self, max_workers=SHEETS_MAX_WORKERS, call_timeout=SHEETS_CALL_TIMEOUT, executor=None):
+        """Create the thread pool behind the async API.
+
+        Args:
+            max_workers (int): Size of the thread pool used by the async API
+            call_timeout (float): Seconds an async call may take before it times out
+            executor (ThreadPoolExecutor): Thread pool shared with other backends,
+                a private one of ``max_workers`` threads when omitted
+        """
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self._call_timeout = call_timeout
+        # Recent attendance and payments, to reject repeats before any write
+        self._dedup = IdempotencyIndex()
+        # Roster for ID lookups and name search, kept current by the backend
+        self._students = StudentIndex()
+
+    def record_attendance(self, user_id, username, action, timestamp, student_id=""):
+        """Record an attendance row.
+
+        Args:
+            user_id (str): The Telegram user ID
+            username (str): The Telegram username or first name
+            action (str): The action taken (e.g., "Davomat")
+            timestamp (str): The timestamp of the action
+            student_id (str): The student marked present, empty for a self check-in
+
+        Raises:
+            DuplicateSubmissionError: If the same person was already marked that day
+        """
+        raise NotImplementedError
+
+    def record_group_attendance(self, user_id, username, action, timestamp, student_ids):
+        """Record attendance for several students with one write.
+
+        Args:
+            user_id (str): The Telegram user ID of the teacher
+            username (str): The teacher's username or first name
+            action (str): The action taken (e.g., "Davomat")
+            timestamp (str): The timestamp of the lesson
+            student_ids (list): IDs of the students marked present
+
+        Returns:
+            list: The IDs recorded; students already marked that day are skipped
+        """
+        raise NotImplementedError
+
+    def record_student(self, registered_by, name, phone, subject, timestamp):
+        """Record a new student.
+
+        Args:
+            registered_by (str): The Telegram user ID who registered the student
+            name (str): The student's full name
+            phone (str): The student's phone number
+            subject (str): The subject the student is studying
+            timestamp (str): The timestamp of registration
+
+        Returns:
+            str: The ID assigned to the student
+        """
+        raise NotImplementedError
+
+    def record_payment(self, recorded_by, student_id, payment_date, amount, timestamp):
+        """Record a payment for a student.
+
+        Args:
+            recorded_by (str): The Telegram user ID who recorded the payment
+            student_id (str): The student ID
+            payment_date (str): The date of the payment
+            amount (str): The payment amount
+            timestamp (str): The timestamp when the payment was recorded
+
+        Raises:
+            DuplicateSubmissionError: If the same payment was recorded recently
+        """
+        raise NotImplementedError
+
+    def get_student_report(self):
+        """Get a report of all students with their attendance and payment info.
+
+        Returns:
+            list: A list of dictionaries with student information
+        """
+        raise NotImplementedError
+
+    def export_rows(self, name):
+        """Return every row ever written to a worksheet, for whole-history analytics.
+
+        Rows written in the last few seconds may be left out.
+
+        Args:
+            name (str): ``"students"``, ``"attendance"`` or ``"payments"``
+
+        Returns:
+            list: Rows as value lists in sheet column order, oldest first
+        """
+        raise NotImplementedError
+
+    def rows_since(self, name, cursor=None, since=None):
+        """Return the attendance or payment rows added after ``cursor``.
+
+        Args:
+            name (str): ``"attendance"`` or ``"payments"``
+            cursor: The cursor returned by the previous call, None the first time
+            since (date): Oldest day the caller needs; rows recorded before it
+                may be left out, rows on or after it must not be
+
+        Returns:
+            tuple: The new rows in sheet column order and the cursor to pass next
+        """
+        raise NotImplementedError
+
+    def get_student(self, student_id):
+        """Look up a student by exact ID in memory.
+
+        Returns:
+            dict: ``id``, ``name`` and ``subject``, or None if there is no such student
+        """
+        return self._students.get(student_id)
+
+    def search_students(self, query, limit=10):
+        """Search students by ID or name in memory, tolerating typos.
+
+        Args:
+            query (str): An ID or (part of) a name
+            limit (int): Most results returned
+
+        Returns:
+            list: Dicts with ``id``, ``name`` and ``subject``, best match first
+        """
+        return self._students.search(query, limit)
+
+    def warm_up(self):
+        """Open connections and load caches ahead of the first update.
+
+        The default does nothing; backends with expensive first calls override it.
+        """
+
+    def close(self):
+        """Release the backend's threads; it must not be used afterwards."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def _run_async(self, func, *args):
+        """Run a blocking backend method in the thread pool.
+
+        The event loop keeps serving other updates while the backend waits.
+        The call is abandoned after ``call_timeout`` seconds; the worker
+        thread itself cannot be interrupted and finishes in the background.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args))
+        return await asyncio.wait_for(future, timeout=self._call_timeout)
+
+    async def record_attendance_async(self, user_id, username, action, timestamp, student_id=""):
+        """Awaitable version of :meth:`record_attendance`."""
+        return await self._run_async(self.record_attendance, user_id, username, action, timestamp, student_id)
+
+    async def record_group_attendance_async(self, user_id, username, action, timestamp, student_ids):
+        """Awaitable version of :meth:`record_group_attendance`."""
+        return await self._run_async(self.record_group_attendance, user_id, username, action, timestamp, student_ids)
+
+    async def record_student_async(self, registered_by, name, phone, subject, timestamp):
+        """Awaitable version of :meth:`record_student`."""
+        return await self._run_async(self.record_student, registered_by, name, phone, subject, timestamp)
+
+    async def record_payment_async(self, recorded_by, student_id, payment_date, amount, timestamp):
+        """Awaitable version of :meth:`record_payment`."""
+        return await self._run_async(self.record_payment, recorded_by, student_id, payment_date, amount, timestamp)
+
+    async def export_rows_async(self, name):
+        """Awaitable version of :meth:`export_rows`."""
+        return await self._run_async(self.export_rows, name)
+
+    async def rows_since_async(self, name, cursor=None, since=None):
+        """Awaitable version of :meth:`rows_since`."""
+        return await self._run_async(self.rows_since, name, cursor, since)
+
+    async def get_student_async(self, student_id):
+        """Awaitable version of :meth:`get_student`."""
+        return await self._run_async(self.get_student, student_id)
+
+    async def search_students_async(self, query, limit=10):
+        """Awaitable version of :meth:`search_students`."""
+        return await self._run_async(self.search_students, query, limit)
+
+    async def get_student_report_async(self):
+        """Awaitable version of :meth:`get_student_report`."""
+        return await self._run_async(self.get_student_report)
+
+def create_storage(backend=STORAGE_BACKEND):
+    """Create the storage backend selected in the configuration.
+
+    Args:
+        backend (str): ``"sheets"`` for Google Sheets only, ``"sqlite"`` for a
+            local SQLite store mirrored to Google Sheets
+
+    Returns:
+        StorageBackend: The backend instance
+    """
+    logger.info(f"Using {backend} storage backend")
+    if backend == "sheets":
+        from sheets_manager import GoogleSheetsManager
+        return GoogleSheetsManager()
+    if backend == "sqlite":
+        from sqlite_store import SQLiteStorage
+        return SQLiteStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def create_tenant_storage(tenant):
+    """Create the backend of a configured tenant.
+
+    Tenants share the default backend's credentials, HTTP session, thread
+    pool and quota scheduler. Their row caches split SHEETS_CACHE_MAX_CELLS
+    between the tenants the pool keeps open.
+    """
+    if STORAGE_BACKEND != "sheets":
+        raise ValueError("Multiple tenants are only supported with STORAGE_BACKEND=sheets")
+    return get_storage().tenant_manager(
+        tenant, tenant_router.sheets_url(tenant), tenant_directory(tenant),
+        cache_max_cells=SHEETS_CACHE_MAX_CELLS // TENANT_POOL_SIZE,
+    )
+
+_tenant_pool = TenantPool(create_tenant_storage)
+
+def get_storage(tenant=None):
+    """Return the storage backend of a tenant, creating it on first use.
+
+    Creating the backend imports its client libraries, so this is deferred
+    until the warm-up thread or the first update needs it.
+
+    Args:
+        tenant (str): A tenant from :data:`tenants.tenant_router`, None for the
+            default tenant, which is the process-wide backend
+    """
+    if tenant is not None:
+        return _tenant_pool.get(tenant)
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+def is_storage_open(tenant=None):
+    """Return True if a tenant's backend is open; the default backend always counts as open."""
+    return tenant is None or _tenant_pool.is_open(tenant)
+
+def set_storage(backend):
+    """Use ``backend`` as the process-wide storage backend."""
+    global _storage
+    with _storage_lock:
+        _storage = backend
+
+class StorageWarmUp:
+    """Creates and warms up the storage backend in a background thread.
+
+    :attr:`ready` is set once the backend is connected and its caches are
+    loaded; until then the readiness probe keeps traffic away. A failed
+    warm-up is retried every ``retry_interval`` seconds.
+    """
+
+    def __init__(self, retry_interval=WARM_UP_RETRY_INTERVAL):
+        self.ready = threading.Event()
+        self.timings = {}
+        self.error = None
+        self._retry_interval = retry_interval
+        self._thread = None
+
+    def start(self):
+        """Start warming up unless it is already running or done."""
+        with _storage_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="storage-warm-up", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # Phases are timed from the start of the warm-up, which the entry
+        # points start right after their imports
+        started = time.perf_counter()
+        while True:
+            try:
+                backend = get_storage()
+                self.timings["create"] = time.perf_counter() - started
+                backend.warm_up()
+                break
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"Storage warm-up failed, retrying in {self._retry_interval}s: {e}")
+                time.sleep(self._retry_interval)
+        self.timings["ready"] = time.perf_counter() - started
+        self.error = None
+        self.ready.set()
+        for phase, seconds in self.timings.items():
+            observe_startup(f"storage_{phase}", seconds)
+        logger.info(f"Storage ready in {self.timings['ready']:.2f}s (backend created in {self.timings['create']:.2f}s)")
+
+    def status(self):
+        """Return the readiness state and warm-up timings in seconds.
+
+        A process that never started the warm-up does not consume updates
+        and counts as ready.
+        """
+        return {
+            "ready": self._thread is None or self.ready.is_set(),
+            "consumer": self._thread is not None,
+            "timings": dict(self.timings),
+            "error": self.error,
+        }
+
+# Started by the entry points as soon as the process starts
+storage_warm_up = StorageWarmUp()
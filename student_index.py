@@ -0,0 +1,255 @@
+import bisect
+import heapq
+import threading
+from collections import Counter
+from itertools import islice
+from records import normalize_id
+
+# Apostrophe variants used in Uzbek Latin (o‘, g‘, tutuq belgisi ʼ)
+APOSTROPHES = str.maketrans({"‘": "'", "’": "'", "ʻ": "'", "ʼ": "'", "`": "'", "´": "'"})
+
+# Share of trigrams two words must have in common to count as a fuzzy match
+FUZZY_THRESHOLD = 0.3
+
+# Most similar name words followed up per query word in fuzzy search
+FUZZY_WORDS_LIMIT = 20
+
+def normalize_name(text):
+    """Fold case, apostrophe variants and whitespace for matching."""
+    return " ".join(str(text).translate(APOSTROPHES).casefold().split())
+
+def trigrams(word):
+    """Return the set of trigrams of a normalized word.
+
+    The word is padded like PostgreSQL's pg_trgm, so short words and word
+    starts still produce trigrams.
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class StudentIndex:
+    """In-memory student lookup by ID, name prefix and fuzzy name match.
+
+    IDs map straight to their entry. Full names and distinct name words are
+    kept in sorted lists for prefix search with :mod:`bisect`, and each
+    distinct word's trigrams have posting sets for typo-tolerant search.
+    Rosters repeat first and last names a lot, so the word structures stay
+    far smaller than the roster. Single changes update the index in place;
+    :meth:`sync` applies a whole roster and re-sorts once. No Sheets call is
+    ever made from here.
+    """
+
+    def __init__(self):
+        # student ID -> (name, subject, normalized name)
+        self._students = {}
+        # sorted (normalized name, student ID) pairs
+        self._names = []
+        # name word -> set of student IDs
+        self._word_students = {}
+        # sorted distinct name words
+        self._words = []
+        # trigram -> set of name words
+        self._postings = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._students)
+
+    def add(self, student_id, name, subject=""):
+        """Add a student, or update it if the ID is already indexed."""
+        with self._lock:
+            self._add_locked(normalize_id(student_id), name, subject, keep_sorted=True)
+
+    def _add_locked(self, student_id, name, subject, keep_sorted):
+        """Index a student; returns True if the index changed."""
+        if not student_id:
+            return False
+        current = self._students.get(student_id)
+        if current is not None:
+            if current[0] == name and current[1] == subject:
+                return False
+            self._remove_locked(student_id, keep_sorted)
+        normalized = normalize_name(name)
+        self._students[student_id] = (name, subject, normalized)
+        if keep_sorted:
+            bisect.insort(self._names, (normalized, student_id))
+        for word in set(normalized.split()):
+            students = self._word_students.get(word)
+            if students is None:
+                students = self._word_students[word] = set()
+                if keep_sorted:
+                    bisect.insort(self._words, word)
+                for gram in trigrams(word):
+                    self._postings.setdefault(gram, set()).add(word)
+            students.add(student_id)
+        return True
+
+    def remove(self, student_id):
+        """Drop a student from the index."""
+        with self._lock:
+            self._remove_locked(normalize_id(student_id), keep_sorted=True)
+
+    def _remove_locked(self, student_id, keep_sorted):
+        entry = self._students.pop(student_id, None)
+        if entry is None:
+            return False
+        normalized = entry[2]
+        if keep_sorted:
+            position = bisect.bisect_left(self._names, (normalized, student_id))
+            if position < len(self._names) and self._names[position] == (normalized, student_id):
+                del self._names[position]
+        for word in set(normalized.split()):
+            students = self._word_students.get(word)
+            if students is None:
+                continue
+            students.discard(student_id)
+            if students:
+                continue
+            del self._word_students[word]
+            if keep_sorted:
+                position = bisect.bisect_left(self._words, word)
+                if position < len(self._words) and self._words[position] == word:
+                    del self._words[position]
+            for gram in trigrams(word):
+                words = self._postings.get(gram)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._postings[gram]
+        return True
+
+    def sync(self, students):
+        """Bring the index in line with the full roster, touching only what changed.
+
+        Args:
+            students (iterable): ``(student_id, name, subject)`` tuples
+        """
+        seen = set()
+        with self._lock:
+            changed = False
+            for student_id, name, subject in students:
+                student_id = normalize_id(student_id)
+                if student_id:
+                    seen.add(student_id)
+                    changed |= self._add_locked(student_id, name, subject, keep_sorted=False)
+            for student_id in [student_id for student_id in self._students if student_id not in seen]:
+                changed |= self._remove_locked(student_id, keep_sorted=False)
+            if changed:
+                # One sort instead of an insertion per changed student
+                self._names = sorted((entry[2], student_id) for student_id, entry in self._students.items())
+                self._words = sorted(self._word_students)
+
+    def _result(self, student_id):
+        name, subject, _ = self._students[student_id]
+        return {"id": student_id, "name": name, "subject": subject}
+
+    def get(self, student_id):
+        """Return the student with this exact ID, or None."""
+        with self._lock:
+            student_id = normalize_id(student_id)
+            if student_id not in self._students:
+                return None
+            return self._result(student_id)
+
+    def _words_with_prefix(self, prefix):
+        """Distinct name words starting with ``prefix``, in order."""
+        position = bisect.bisect_left(self._words, prefix)
+        while position < len(self._words) and self._words[position].startswith(prefix):
+            yield self._words[position]
+            position += 1
+
+    def _name_prefix_matches(self, normalized, limit):
+        """IDs of the first ``limit`` students whose full name starts with the query."""
+        position = bisect.bisect_left(self._names, (normalized, ""))
+        matches = []
+        while len(matches) < limit and position < len(self._names):
+            name, student_id = self._names[position]
+            if not name.startswith(normalized):
+                break
+            matches.append(student_id)
+            position += 1
+        return matches
+
+    def _word_prefix_matches(self, words, limit):
+        """IDs of up to ``limit`` students having, for every query word, a name word starting with it."""
+        if len(words) == 1:
+            matches = []
+            for word in self._words_with_prefix(words[0]):
+                matches.extend(islice(self._word_students[word], limit - len(matches)))
+                if len(matches) >= limit:
+                    break
+            return matches
+        matches = None
+        for query_word in sorted(set(words), key=len, reverse=True):
+            students = set()
+            for word in self._words_with_prefix(query_word):
+                students |= self._word_students[word]
+            matches = students if matches is None else matches & students
+            if not matches:
+                return []
+        return list(islice(matches, limit))
+
+    def _similar_words(self, query_word):
+        """Name words sharing enough trigrams with ``query_word``, as {word: similarity}."""
+        grams = trigrams(query_word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = {}
+        for word, count in shared.items():
+            # Padding adds two trigrams per word on top of one per letter
+            similarity = count / (len(grams) + len(word) + 1 - count)
+            if similarity >= FUZZY_THRESHOLD:
+                scored[word] = similarity
+        return dict(heapq.nlargest(FUZZY_WORDS_LIMIT, scored.items(), key=lambda item: item[1]))
+
+    def _fuzzy_matches(self, words, limit):
+        """IDs of up to ``limit`` students whose name words are close to every query word, best first."""
+        scores = None
+        for query_word in set(words):
+            word_scores = {}
+            for word, similarity in self._similar_words(query_word).items():
+                for student_id in self._word_students[word]:
+                    if similarity > word_scores.get(student_id, 0):
+                        word_scores[student_id] = similarity
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {student_id: score + word_scores[student_id]
+                          for student_id, score in scores.items() if student_id in word_scores}
+            if not scores:
+                return []
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [student_id for student_id, _ in best]
+
+    def search(self, query, limit=10):
+        """Find students by ID or name.
+
+        An exact ID comes first, then names starting with the query, then
+        names with a word starting with each query word, then names close
+        to it by trigram similarity. An empty query returns the most
+        recently added students.
+
+        Args:
+            query (str): An ID or (part of) a name, typos allowed
+            limit (int): Most results returned
+
+        Returns:
+            list: Dicts with ``id``, ``name`` and ``subject``
+        """
+        normalized = normalize_name(query)
+        with self._lock:
+            if not normalized:
+                return [self._result(student_id) for student_id in islice(reversed(self._students), limit)]
+
+            words = normalized.split()
+            student_id = normalize_id(query)
+            found = dict.fromkeys([student_id] if student_id in self._students else [])
+            found.update(dict.fromkeys(self._name_prefix_matches(normalized, limit)))
+            if len(found) < limit:
+                word_matches = self._word_prefix_matches(words, limit)
+                word_matches.sort(key=lambda student_id: self._students[student_id][2])
+                found.update(dict.fromkeys(word_matches))
+            if len(found) < limit:
+                found.update(dict.fromkeys(self._fuzzy_matches(words, limit)))
+            return [self._result(student_id) for student_id in islice(found, limit)]
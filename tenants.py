@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import DATA_DIR, SHEETS_CALL_TIMEOUT, TENANTS_PATH, TENANT_POOL_SIZE, TENANT_IDLE_TTL
+from metrics import observe_tenant_pool
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Tenant IDs name directories, so they are kept to safe characters
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+def tenant_directory(tenant):
+    """Return the directory holding a tenant's journal and ID sequence."""
+    return os.path.join(DATA_DIR, "tenants", tenant)
+
+class TenantRouter:
+    """Maps Telegram chats and users to the learning center they belong to.
+
+    The mapping is a JSON object keyed by tenant ID::
+
+        {"chilonzor": {"sheets_url": "https://...", "chats": [-1001234], "users": [5678]}}
+
+    A chat mapping wins over a user mapping, so a teacher working at two
+    centers writes to the center of the group they post in. Chats and
+    users listed nowhere belong to the default tenant, None, whose
+    spreadsheet is GOOGLE_SHEETS_URL.
+    """
+
+    def __init__(self, tenants=None):
+        """Build the lookup tables.
+
+        Args:
+            tenants (dict): Tenant ID -> ``sheets_url``, ``chats`` and ``users``
+
+        Raises:
+            ValueError: If a tenant ID is unsafe or a chat or user is listed twice
+        """
+        self._urls = {}
+        self._chats = {}
+        self._users = {}
+        for tenant, entry in (tenants or {}).items():
+            if not TENANT_ID_PATTERN.match(tenant):
+                raise ValueError(f"Invalid tenant ID: {tenant!r}")
+            self._urls[tenant] = entry["sheets_url"]
+            for key, table in (("chats", self._chats), ("users", self._users)):
+                for member in entry.get(key, ()):
+                    if table.setdefault(int(member), tenant) != tenant:
+                        raise ValueError(f"{key[:-1].capitalize()} {member} belongs to two tenants")
+
+    @classmethod
+    def from_file(cls, path):
+        """Load the mapping from a JSON file; without the file there is only the default tenant."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            tenants = json.load(f)
+        logger.info(f"Loaded {len(tenants)} tenants from {path}")
+        return cls(tenants)
+
+    @property
+    def tenants(self):
+        """IDs of the configured tenants, not including the default one."""
+        return list(self._urls)
+
+    def sheets_url(self, tenant):
+        """Return the spreadsheet URL of a configured tenant."""
+        return self._urls[tenant]
+
+    def resolve(self, chat_id=None, user_id=None):
+        """Return the tenant of a chat or user, None for the default tenant."""
+        if chat_id in self._chats:
+            return self._chats[chat_id]
+        return self._users.get(user_id)
+
+class TenantPool:
+    """Per-tenant storage backends, created on first use and closed when idle.
+
+    Once more than ``max_size`` backends are open, the least recently used
+    ones are closed, and any backend unused for ``idle_ttl`` seconds is
+    closed too. A backend used within the last ``grace`` seconds is never
+    closed, so a handler still holding it can finish its call; the pool
+    may briefly hold more than ``max_size`` backends until the next check.
+    Closing flushes the tenant's queued rows in the background, and a
+    tenant asked for meanwhile waits for that to finish, so its journal is
+    never open twice.
+    """
+
+    def __init__(self, factory, max_size=TENANT_POOL_SIZE, idle_ttl=TENANT_IDLE_TTL,
+                 grace=2 * SHEETS_CALL_TIMEOUT):
+        """Create the pool; no backend is created until asked for.
+
+        Args:
+            factory (callable): Called as ``factory(tenant)`` to create a backend
+            max_size (int): Backends kept open before the least recently used is closed
+            idle_ttl (float): Seconds without use after which a backend is closed
+            grace (float): Seconds after its last use during which a backend is kept
+        """
+        self._factory = factory
+        self._max_size = max_size
+        self._idle_ttl = idle_ttl
+        self._grace = grace
+        # tenant -> [backend, last used], least recently used first
+        self._backends = OrderedDict()
+        # tenant -> Event set once its backend is closed
+        self._closing = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def get(self, tenant):
+        """Return the backend of ``tenant``, creating it on first use."""
+        while True:
+            with self._lock:
+                entry = self._backends.get(tenant)
+                if entry is not None:
+                    entry[1] = time.monotonic()
+                    self._backends.move_to_end(tenant)
+                    return entry[0]
+                closing = self._closing.get(tenant)
+                if closing is None:
+                    # Creating a backend only opens local files; the network is touched later
+                    backend = self._factory(tenant)
+                    self._backends[tenant] = [backend, time.monotonic()]
+                    logger.info(f"Opened storage of tenant {tenant}")
+                    victims = self._take_victims()
+                    if self._reaper is None:
+                        self._reaper = threading.Thread(target=self._reap, name="tenant-reaper", daemon=True)
+                        self._reaper.start()
+                    break
+            closing.wait()
+        self._close(victims)
+        return backend
+
+    def _take_victims(self):
+        """Remove the backends to close from the pool; call with the lock held."""
+        now = time.monotonic()
+        victims = []
+        for tenant, (backend, used) in list(self._backends.items()):
+            idle = now - used
+            if idle >= self._grace and (len(self._backends) > self._max_size or idle >= self._idle_ttl):
+                del self._backends[tenant]
+                self._closing[tenant] = threading.Event()
+                victims.append((tenant, backend))
+        observe_tenant_pool(len(self._backends), len(victims))
+        return victims
+
+    def _close(self, victims):
+        for tenant, backend in victims:
+            threading.Thread(
+                target=self._close_backend, args=(tenant, backend), name="tenant-close", daemon=True
+            ).start()
+
+    def _close_backend(self, tenant, backend):
+        try:
+            backend.close()
+            logger.info(f"Closed storage of idle tenant {tenant}")
+        except Exception as e:
+            logger.error(f"Failed to close storage of tenant {tenant}: {e}")
+        finally:
+            with self._lock:
+                self._closing.pop(tenant).set()
+
+    def _reap(self):
+        while True:
+            time.sleep(min(self._idle_ttl, 60))
+            with self._lock:
+                victims = self._take_victims()
+            self._close(victims)
+
+    def is_open(self, tenant):
+        """Return True if ``tenant``'s backend is open, without opening it or marking it used."""
+        with self._lock:
+            return tenant in self._backends
+
+    def stats(self):
+        """Return the number of open and closing backends."""
+        with self._lock:
+            return {"open": len(self._backends), "closing": len(self._closing), "max_size": self._max_size}
+
+# Loaded once at import; the file is small
+tenant_router = TenantRouter.from_file(TENANTS_PATH)
@@ -0,0 +1,53 @@
+"""The analytics read the history once and then only what is new.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_sheets import FakeBackend
+from sheets_manager import HEADERS, GoogleSheetsManager, SheetsScheduler, shard_name
+
+OLD_SHARD = shard_name("attendance", "2020_01")
+
+def attendance_row(student_id):
+    return ["1000", "teacher", "Davomat", "2025-01-01 09:00:00", student_id]
+
+def make_manager(tmp_path, backend):
+    return GoogleSheetsManager(
+        journal_path=str(tmp_path / "journal.jsonl"),
+        id_sequence_path=str(tmp_path / "student_id.seq"),
+        reconcile_interval=0,
+        scheduler=SheetsScheduler(rate_per_minute=10 ** 9, burst=10 ** 6),
+        session=backend.session(),
+    )
+
+def test_export_rows_reads_closed_shards_once(tmp_path):
+    backend = FakeBackend()
+    backend.spreadsheet.load(OLD_SHARD, [HEADERS["attendance"], attendance_row("1")])
+    backend.spreadsheet.load(shard_name("attendance"), [HEADERS["attendance"], attendance_row("2")])
+    manager = make_manager(tmp_path, backend)
+    try:
+        assert [row[4] for row in manager.export_rows("attendance")] == ["1", "2"]
+        # The history did not go through the row cache
+        assert OLD_SHARD not in manager._cache._entries
+
+        backend.spreadsheet.load(OLD_SHARD, [HEADERS["attendance"], attendance_row("changed")])
+        backend.spreadsheet.load(shard_name("attendance"),
+                                 [HEADERS["attendance"], attendance_row("2"), attendance_row("3")])
+        # Only the current shard is read again
+        assert [row[4] for row in manager.export_rows("attendance")] == ["1", "2", "3"]
+    finally:
+        manager.close()
+
+def test_export_rows_does_not_hold_off_flushes(tmp_path):
+    backend = FakeBackend()
+    backend.spreadsheet.load(shard_name("attendance"), [HEADERS["attendance"], attendance_row("1")])
+    manager = make_manager(tmp_path, backend)
+    try:
+        with ThreadPoolExecutor(1) as pool, manager._buffer.paused():
+            # Would wait for the pause to end if the export took the flush lock
+            assert len(pool.submit(manager.export_rows, "attendance").result(timeout=5)) == 1
+    finally:
+        manager.close()
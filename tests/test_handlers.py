@@ -0,0 +1,135 @@
+"""The bot's handlers against an in-process Bot API and a fake storage backend.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+import asyncio
+import contextlib
+import time
+from types import SimpleNamespace
+
+from benchmarks.bench_bot import FakeBotApi, make_update
+
+from telegram.ext import Application, CommandHandler
+
+import attendance_bot
+from storage import StorageBackend, StorageUnavailableError, set_storage
+from update_processor import ChatOrderedUpdateProcessor
+
+LATENCY = 0.2
+CHATS = 8
+
+class RecordingBotApi(FakeBotApi):
+    """Bot API transport that keeps the text of every message sent."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if url.endswith("/sendMessage"):
+            self.sent.append(request_data.parameters["text"])
+        return await super().do_request(url, method, request_data, **kwargs)
+
+class UnavailableStorage(StorageBackend):
+    """A backend whose every call fails fast, as a degraded Sheets backend does."""
+
+    def get_student(self, student_id):
+        raise StorageUnavailableError("degraded")
+
+    def record_attendance(self, user_id, username, action, timestamp, student_id=""):
+        raise StorageUnavailableError("degraded")
+
+    def record_payment(self, recorded_by, student_id, payment_date, amount, timestamp):
+        raise StorageUnavailableError("degraded")
+
+class SlowStorage(StorageBackend):
+    """A backend whose every call takes LATENCY seconds, like a Sheets round trip."""
+
+    def __init__(self):
+        super().__init__(max_workers=CHATS)
+        self.recorded = []
+
+    def get_student(self, student_id):
+        time.sleep(LATENCY)
+        return {"id": student_id, "name": "Ali", "subject": "Matematika"}
+
+    def record_attendance(self, user_id, username, action, timestamp, student_id=""):
+        time.sleep(LATENCY)
+        self.recorded.append((user_id, student_id))
+
+@contextlib.asynccontextmanager
+async def running_bot(storage, concurrency=8):
+    """Run an Application with the bot's /davomat handler on the fake transport."""
+    set_storage(storage)
+    bot_api = RecordingBotApi()
+    application = (
+        Application.builder()
+        .token("123456:test")
+        .request(bot_api)
+        .concurrent_updates(ChatOrderedUpdateProcessor(concurrency))
+        .build()
+    )
+    application.add_handler(CommandHandler("davomat", attendance_bot.attendance_command))
+    await application.initialize()
+    await application.start()
+    try:
+        yield application, bot_api
+    finally:
+        await application.stop()
+        await application.shutdown()
+        set_storage(None)
+        storage.close()
+
+async def wait_for_messages(bot_api, count, timeout=5):
+    async with asyncio.timeout(timeout):
+        while len(bot_api.sent) < count:
+            await asyncio.sleep(0.01)
+
+def test_attendance_reports_unavailable_storage():
+    async def scenario():
+        async with running_bot(UnavailableStorage()) as (application, bot_api):
+            await application.update_queue.put(make_update(1, 1001, "/davomat 7", application.bot))
+            await application.update_queue.put(make_update(2, 1002, "/davomat", application.bot))
+            await wait_for_messages(bot_api, 2)
+            assert bot_api.sent == [attendance_bot.UNAVAILABLE_MESSAGE] * 2
+
+    asyncio.run(scenario())
+
+def test_payment_reports_unavailable_storage():
+    async def scenario():
+        async with running_bot(UnavailableStorage()) as (application, bot_api):
+            update = make_update(1, 1001, "300000", application.bot)
+            context = SimpleNamespace(user_data={"student_id": "7", "date": "2025-05-15"})
+            await attendance_bot.get_payment_amount(update, context)
+            assert bot_api.sent == [attendance_bot.UNAVAILABLE_MESSAGE]
+            assert context.user_data == {}
+
+    asyncio.run(scenario())
+
+def test_updates_from_different_chats_do_not_serialize():
+    async def scenario():
+        storage = SlowStorage()
+        async with running_bot(storage, concurrency=CHATS) as (application, bot_api):
+            started = time.perf_counter()
+            for chat in range(CHATS):
+                await application.update_queue.put(make_update(chat + 1, 1001 + chat, "/davomat 7", application.bot))
+            await wait_for_messages(bot_api, CHATS)
+            elapsed = time.perf_counter() - started
+        # Each handler makes two storage calls; serialized, all would take CHATS times as long
+        assert elapsed < 2 * 2 * LATENCY, f"{CHATS} chats took {elapsed:.2f}s"
+        assert len(storage.recorded) == CHATS
+
+    asyncio.run(scenario())
+
+def test_updates_from_one_chat_stay_in_order():
+    async def scenario():
+        storage = SlowStorage()
+        async with running_bot(storage, concurrency=CHATS) as (application, bot_api):
+            for update_id, student_id in enumerate(("1", "2", "3"), start=1):
+                await application.update_queue.put(make_update(update_id, 1001, f"/davomat {student_id}", application.bot))
+            await wait_for_messages(bot_api, 3)
+        assert [student_id for _, student_id in storage.recorded] == ["1", "2", "3"]
+
+    asyncio.run(scenario())
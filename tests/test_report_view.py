@@ -0,0 +1,41 @@
+"""The report view is built once however many callers ask for it first.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_sheets import FakeBackend
+from sheets_manager import HEADERS, GoogleSheetsManager, SheetsScheduler, shard_name
+
+CALLERS = 8
+
+def test_concurrent_callers_build_view_once(tmp_path):
+    backend = FakeBackend()
+    backend.spreadsheet.load("students", [HEADERS["students"], ["1", "1000", "Ali", "998901234567", "Matematika", "2025-01-01 09:00:00"]])
+    backend.spreadsheet.load(shard_name("attendance"), [HEADERS["attendance"]])
+    manager = GoogleSheetsManager(
+        journal_path=str(tmp_path / "journal.jsonl"),
+        id_sequence_path=str(tmp_path / "student_id.seq"),
+        reconcile_interval=0,
+        scheduler=SheetsScheduler(rate_per_minute=10 ** 9, burst=10 ** 6),
+        session=backend.session(),
+    )
+    builds = []
+    build = manager._build_report_view
+
+    def counting_build(refresh, priority):
+        builds.append(refresh)
+        build(refresh, priority)
+
+    manager._build_report_view = counting_build
+    try:
+        # Slow enough that every caller arrives while the first build runs
+        backend.latency = 0.05
+        with ThreadPoolExecutor(CALLERS) as pool:
+            reports = list(pool.map(lambda _: manager.get_student_report(), range(CALLERS)))
+        assert len(builds) == 1
+        assert all(len(report) == 1 for report in reports)
+    finally:
+        manager.close()
@@ -0,0 +1,61 @@
+"""Own writes must not hide other changes from the row cache.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+import time
+
+from sheets_manager import WorksheetRowCache
+
+TTL = 0.05
+
+class FakeSpreadsheet:
+    """Worksheet values and a revision bumped by every change."""
+
+    def __init__(self, *names):
+        self.revision = 1
+        self.values = {name: [["header"]] for name in names}
+        self.fetches = 0
+
+    def append(self, name, row):
+        self.values[name].append(row)
+        self.revision += 1
+
+    def fetcher(self, name):
+        def fetch():
+            self.fetches += 1
+            return [list(row) for row in self.values[name]]
+        return fetch
+
+def test_patch_leaves_other_entries_checking():
+    sheet = FakeSpreadsheet("attendance", "students")
+    cache = WorksheetRowCache(lambda: sheet.revision, ttl=TTL)
+    cache.get("attendance", sheet.fetcher("attendance"))
+    cache.get("students", sheet.fetcher("students"))
+
+    # Our own append, then a manual edit of another worksheet
+    sheet.append("attendance", ["1"])
+    cache.patch("attendance", [["1"]])
+    sheet.append("students", ["7"])
+    time.sleep(TTL * 1.5)
+
+    assert cache.get("students", sheet.fetcher("students")) == [["header"], ["7"]]
+    fetches = sheet.fetches
+    # The patched entry adopts the revision its next check observes
+    assert cache.get("attendance", sheet.fetcher("attendance")) == [["header"], ["1"]]
+    assert sheet.fetches == fetches
+
+def test_patch_drops_entry_older_than_ttl():
+    sheet = FakeSpreadsheet("attendance")
+    cache = WorksheetRowCache(lambda: sheet.revision, ttl=TTL)
+    cache.get("attendance", sheet.fetcher("attendance"))
+    time.sleep(TTL * 1.5)
+
+    # A manual edit lands before our own append on a stale entry
+    sheet.append("attendance", ["manual"])
+    sheet.append("attendance", ["1"])
+    cache.patch("attendance", [["1"]])
+
+    assert cache.get("attendance", sheet.fetcher("attendance")) == [["header"], ["manual"], ["1"]]
+    assert sheet.fetches == 2
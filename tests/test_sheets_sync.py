@@ -0,0 +1,41 @@
+"""The SQLite store's mirror reads the spreadsheet as it is now.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+import threading
+
+from benchmarks.fake_sheets import FakeBackend
+from sheets_manager import HEADERS, GoogleSheetsManager, SheetsScheduler
+from sqlite_store import SheetsSync, SQLiteStorage
+
+def student_row(student_id, name):
+    return [student_id, "1000", name, "998901234567", "Matematika", "2025-01-01 09:00:00"]
+
+def test_pull_sees_manual_edits_without_a_journal(tmp_path):
+    backend = FakeBackend()
+    backend.spreadsheet.load("students", [HEADERS["students"], student_row("1", "Ali")])
+    flush_threads = {thread for thread in threading.enumerate() if thread.name == "sheets-flush"}
+    sheets = GoogleSheetsManager(
+        journal_path=None,
+        id_sequence_path=str(tmp_path / "student_id.seq"),
+        reconcile_interval=0,
+        scheduler=SheetsScheduler(rate_per_minute=10 ** 9, burst=10 ** 6),
+        session=backend.session(),
+    )
+    store = SQLiteStorage(str(tmp_path / "bot.sqlite3"), sync=False)
+    sync = SheetsSync(store, sheets)
+    try:
+        # The mirror neither journals nor flushes in the background
+        assert {thread for thread in threading.enumerate() if thread.name == "sheets-flush"} == flush_threads
+        assert not any(path.suffix == ".jsonl" for path in tmp_path.iterdir())
+
+        sync.pull()
+        assert store.get_student("1")["name"] == "Ali"
+        backend.spreadsheet.load("students", [HEADERS["students"], student_row("1", "Vali")])
+        sync.pull()
+        assert store.get_student("1")["name"] == "Vali"
+    finally:
+        sheets.close()
+        store.close()
@@ -0,0 +1,67 @@
+"""Concurrent updates must not serialize behind a slow Sheets backend.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+import asyncio
+import time
+
+from benchmarks.fake_sheets import FakeBackend
+from sheets_manager import HEADERS, GoogleSheetsManager, SheetsScheduler, shard_name
+
+LATENCY = 0.2
+HANDLERS = 8
+
+def make_manager(tmp_path, backend):
+    """A manager on the fake whose every read goes to the backend."""
+    row = ["1000", "teacher", "Davomat", "2025-01-01 09:00:00", "1"]
+    backend.spreadsheet.load(shard_name("attendance"), [HEADERS["attendance"], row])
+    return GoogleSheetsManager(
+        max_workers=HANDLERS,
+        journal_path=str(tmp_path / "journal.jsonl"),
+        id_sequence_path=str(tmp_path / "student_id.seq"),
+        reconcile_interval=0,
+        scheduler=SheetsScheduler(rate_per_minute=10 ** 9, burst=10 ** 6),
+        session=backend.session(),
+        # Nothing fits in the row cache, so every read goes to the backend
+        cache_max_cells=0,
+    )
+
+async def handle_updates(manager):
+    """Run HANDLERS handlers at once; return their wall time and the loop's longest stall."""
+    stalls = []
+
+    async def heartbeat():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append(time.perf_counter() - started - 0.01)
+
+    ticker = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(manager.rows_since_async("attendance") for _ in range(HANDLERS)))
+    elapsed = time.perf_counter() - started
+    ticker.cancel()
+    assert all(len(rows) == 1 for rows, _ in results)
+    return elapsed, max(stalls)
+
+def test_concurrent_updates_do_not_serialize(tmp_path):
+    backend = FakeBackend()
+    manager = make_manager(tmp_path, backend)
+    try:
+        # Connect and open the worksheets before the backend turns slow
+        manager.rows_since("attendance")
+        backend.latency = LATENCY
+        started = time.perf_counter()
+        manager.rows_since("attendance")
+        round_trip = time.perf_counter() - started
+
+        elapsed, longest_stall = asyncio.run(handle_updates(manager))
+
+        # Serialized, the handlers would take HANDLERS round trips
+        assert elapsed < 2 * round_trip, f"{HANDLERS} handlers took {elapsed:.2f}s"
+        # The event loop kept running while the backend was slow
+        assert longest_stall < LATENCY / 2, f"event loop stalled for {longest_stall:.2f}s"
+    finally:
+        manager.close()
@@ -0,0 +1,60 @@
+"""Both backends match student IDs and report amounts the same way.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+from benchmarks.fake_sheets import FakeBackend
+from sheets_manager import HEADERS, GoogleSheetsManager, SheetsScheduler, shard_name
+from sqlite_store import SQLiteStorage
+from student_index import StudentIndex
+
+TIMESTAMP = "2025-05-15 09:00:00"
+
+def student_row(student_id):
+    return [student_id, "1000", "Ali Valiyev", "998901234567", "Matematika", TIMESTAMP]
+
+def test_index_matches_ids_with_leading_zeros():
+    index = StudentIndex()
+    index.add("007", "Ali Valiyev", "Matematika")
+    assert index.get("7")["id"] == "7"
+    assert index.get(" 007 ")["id"] == "7"
+    assert [student["id"] for student in index.search("0007")] == ["7"]
+
+def test_sqlite_report_matches_ids_and_keeps_zero_amounts(tmp_path):
+    store = SQLiteStorage(str(tmp_path / "bot.sqlite3"), sync=False)
+    try:
+        # Typed into the sheet by hand, then pulled
+        store.replace_synced("students", [student_row("007")])
+        assert store.get_student("7") is not None
+        store.record_attendance("1000", "teacher", "Davomat", TIMESTAMP, "07")
+        store.record_payment("1000", "7", "15.05.2025", "0", TIMESTAMP)
+        [student] = store.get_student_report()
+        assert student["id"] == "7"
+        assert student["attendance_count"] == 1
+        assert student["last_payment"] == 0
+    finally:
+        store.close()
+
+def test_sheets_report_matches_ids_and_keeps_zero_amounts(tmp_path):
+    backend = FakeBackend()
+    backend.spreadsheet.load("students", [HEADERS["students"], student_row("007")])
+    backend.spreadsheet.load(shard_name("attendance"), [HEADERS["attendance"]])
+    backend.spreadsheet.load(shard_name("payments"), [HEADERS["payments"]])
+    manager = GoogleSheetsManager(
+        journal_path=str(tmp_path / "journal.jsonl"),
+        id_sequence_path=str(tmp_path / "student_id.seq"),
+        reconcile_interval=0,
+        scheduler=SheetsScheduler(rate_per_minute=10 ** 9, burst=10 ** 6),
+        session=backend.session(),
+    )
+    try:
+        assert manager.get_student("007")["id"] == "7"
+        manager.record_attendance("1000", "teacher", "Davomat", TIMESTAMP, "07")
+        manager.record_payment("1000", "7", "15.05.2025", "0", TIMESTAMP)
+        [student] = manager.get_student_report()
+        assert student["id"] == "7"
+        assert student["attendance_count"] == 1
+        assert student["last_payment"] == 0
+    finally:
+        manager.close()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from telegram.ext import BaseUpdateProcessor
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently across chats but in order within a chat.
+
+    Updates that share a (chat, user) key, the same key ConversationHandler
+    uses, wait for each other in arrival order, so the /royxat and /tolov
+    steps of one teacher are never applied out of order. Updates with
+    different keys run in parallel, at most ``max_concurrent_updates`` at a
+    time. Only the oldest update of each key takes a concurrency slot, so a
+    burst from one chat cannot hold every slot while it waits on itself.
+    """
+
+    def __init__(self, max_concurrent_updates, max_pending_updates=10000):
+        """Create the processor.
+
+        Args:
+            max_concurrent_updates (int): Updates whose handlers may run at once
+            max_pending_updates (int): Updates admitted and not yet finished,
+                running or waiting
+        """
+        super().__init__(max_pending_updates)
+        self._limit = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # key -> [lock, number of updates holding or waiting for the lock]
+        self._chains = {}
+        # Updates inside do_process_update, whether waiting for their chain or a slot, or running
+        self.pending = 0
+        self.waiting = 0
+        self.running = 0
+        self.processed = 0
+
+    @staticmethod
+    def update_key(update):
+        """Return the ordering key of an update, or None if it has no chat or user."""
+        chat = getattr(update, "effective_chat", None)
+        user = getattr(update, "effective_user", None)
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    async def do_process_update(self, update, coroutine):
+        """Run the update once every earlier update with the same key is done."""
+        self.pending += 1
+        try:
+            await self._process_in_order(update, coroutine)
+        finally:
+            self.pending -= 1
+
+    async def _process_in_order(self, update, coroutine):
+        key = self.update_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = self._chains[key] = [asyncio.Lock(), 0]
+        chain[1] += 1
+        try:
+            async with chain[0]:
+                await self._run(coroutine)
+        finally:
+            chain[1] -= 1
+            if chain[1] == 0:
+                del self._chains[key]
+
+    async def _run(self, coroutine):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            await coroutine
+        finally:
+            self.running -= 1
+            self.processed += 1
+            self._slots.release()
+
+    def metrics(self):
+        """Return the queue-depth counters of the processor."""
+        return {
+            "concurrency_limit": self._limit,
+            "pending": self.pending,
+            "waiting": self.waiting,
+            "running": self.running,
+            "active_chats": len(self._chains),
+            "processed": self.processed,
+        }
+
+    async def initialize(self):
+        """Nothing to set up; required by :class:`BaseUpdateProcessor`."""
+
+    async def shutdown(self):
+        """Nothing to release; required by :class:`BaseUpdateProcessor`."""
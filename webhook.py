@@ -0,0 +1,101 @@
+import contextlib
+import logging
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from attendance_bot import setup_bot, start_monitoring, start_scheduled_jobs
+from metrics import render_metrics
+from storage import storage_warm_up
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    WEBHOOK_QUEUE_SIZE,
+    PORT,
+)
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# One Application shared by every request; run a single server process.
+# Its update processor runs updates concurrently while keeping each chat in order.
+bot_app = setup_bot()
+
+def pending_updates():
+    """Number of accepted updates that have not been fully processed."""
+    return bot_app.update_queue.qsize() + bot_app.update_processor.pending
+
+async def index(request: Request) -> Response:
+    """Report that the webhook server is up."""
+    return PlainTextResponse("O'quv Davomat Bot webhook serveri ishlayapti")
+
+async def telegram_webhook(request: Request) -> Response:
+    """Accept an update from Telegram and acknowledge it immediately."""
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        logger.warning("Rejected webhook call with a wrong secret token")
+        return Response(status_code=403)
+
+    try:
+        update = Update.de_json(await request.json(), bot_app.bot)
+    except Exception as e:
+        logger.error(f"Invalid update payload: {e}")
+        return Response(status_code=400)
+
+    # Back-pressure: past the limit Telegram gets a 503 and redelivers later
+    if pending_updates() >= WEBHOOK_QUEUE_SIZE:
+        logger.warning("Too many pending updates, asking Telegram to retry")
+        return Response(status_code=503)
+
+    await bot_app.update_queue.put(update)
+    return Response()
+
+async def ready(request: Request) -> Response:
+    """Readiness probe: 200 once storage is warmed up, 503 before."""
+    status = storage_warm_up.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+async def metrics(request: Request) -> Response:
+    """Expose the bot's metrics in Prometheus text format."""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Start the bot with the server and stop it after the server."""
+    storage_warm_up.start()
+    await bot_app.initialize()
+    await bot_app.start()
+    await start_monitoring(bot_app)
+    await start_scheduled_jobs(bot_app)
+    if WEBHOOK_URL:
+        await bot_app.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}/webhook",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=100,
+        )
+    logger.info("Bot started in webhook mode")
+    try:
+        yield
+    finally:
+        await bot_app.stop()
+        await bot_app.shutdown()
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/webhook", telegram_webhook, methods=["POST"]),
+        Route("/ready", ready),
+        Route("/metrics", metrics),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=PORT)
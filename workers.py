@@ -0,0 +1,52 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import WORKER_PROCESSES
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """Return the shared process pool, or None when it is disabled.
+
+    The pool is created on first use with the ``spawn`` start method:
+    forking the consumer would copy its running threads' locks into the
+    children.
+    """
+    global _pool
+    if not WORKER_PROCESSES:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKER_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Started {WORKER_PROCESSES} worker processes")
+        return _pool
+
+async def run_cpu_bound(func, *args):
+    """Run CPU-heavy work off the event loop.
+
+    The work goes to the process pool when ``WORKER_PROCESSES`` is set, so it
+    does not hold the consumer's GIL, and to a thread otherwise. ``func``
+    and its arguments must be picklable.
+    """
+    pool = get_process_pool()
+    if pool is None:
+        return await asyncio.to_thread(func, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(func, *args))
+
+def shutdown_process_pool():
+    """Stop the worker processes, if any were started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None